@@ -0,0 +1,77 @@
+"""Benchmark the per-call overhead of command dispatch.
+
+Compares calling the echo handler directly with dispatching it through the
+command registry (sync and async) and through DoAnythingConnection, and
+with the previous dispatch pattern that inserted into sys.path and re-ran
+the commands import on every call.
+
+Usage:
+    python benchmarks/bench_dispatch.py [--calls N]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+# Add the project root to the path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.do_anything_mcp.commands import registry
+from src.do_anything_mcp.commands.builtin import echo
+from src.do_anything_mcp.connection import DoAnythingConnection
+
+
+def legacy_dispatch(connection, command_type, params):
+    """The previous DoAnythingConnection.execute_command body, minus logging"""
+    sys.path.insert(0, PROJECT_ROOT)
+    from src.do_anything_mcp.commands import execute_command
+    return execute_command(connection, command_type, params)
+
+
+def measure(label: str, func, calls: int, baseline: float = None) -> float:
+    """Time func over calls iterations and print ns per call"""
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        func()
+    per_call = (time.perf_counter_ns() - start) / calls
+    overhead = "" if baseline is None else f"  (+{per_call - baseline:.0f} ns)"
+    print(f"{label:<36} {per_call:>10.0f} ns/call{overhead}")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command dispatch benchmark")
+    parser.add_argument("--calls", type=int, default=200000, help="Calls per measurement")
+    args = parser.parse_args()
+
+    # Logging is measured separately from dispatch itself
+    logging.disable(logging.CRITICAL)
+
+    connection = DoAnythingConnection()
+    params = {"message": "hi"}
+    registry.execute(connection, "echo", params)  # import the handler up front
+
+    baseline = measure("direct handler call", lambda: echo(connection, params), args.calls)
+    measure("registry.execute", lambda: registry.execute(connection, "echo", params), args.calls, baseline)
+    measure("connection.execute_command", lambda: connection.execute_command("echo", params), args.calls, baseline)
+
+    async def run_async():
+        start = time.perf_counter_ns()
+        for _ in range(args.calls):
+            await registry.execute_async(connection, "echo", params)
+        per_call = (time.perf_counter_ns() - start) / args.calls
+        print(f"{'registry.execute_async':<36} {per_call:>10.0f} ns/call  (+{per_call - baseline:.0f} ns)")
+
+    asyncio.run(run_async())
+
+    path_length = len(sys.path)
+    measure("legacy sys.path + import dispatch", lambda: legacy_dispatch(connection, "echo", params),
+            args.calls // 10, baseline)
+    print(f"sys.path grew by {len(sys.path) - path_length} entries during the legacy run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark the budget-aware image encoder against the legacy resize path.
+
+The legacy path is the one FLUX_1_schnell_infer used before the encoder:
+guess a scale from sqrt(750000 / len(base64)), LANCZOS resize, and save an
+optimized PNG. Both are run on synthetic photo-like images of several sizes
+and the encode time, output size and whether the output fits are reported.
+
+Usage:
+    python benchmarks/bench_image_encoder.py [--repeat N] [--budget BYTES]
+"""
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+from PIL import Image as PILImage
+from PIL import ImageDraw, ImageFilter
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.do_anything_mcp.image_encoder import BudgetImageEncoder
+
+LEGACY_BASE64_BUDGET = 750000
+
+
+def make_image(width: int, height: int) -> bytes:
+    """Build a photo-like PNG: smooth gradients, shapes and sensor-like noise"""
+    gradient = PILImage.linear_gradient("L").resize((width, height))
+    radial = PILImage.radial_gradient("L").resize((width, height))
+    noise = PILImage.effect_noise((width, height), 40).filter(ImageFilter.GaussianBlur(1))
+    img = PILImage.merge("RGB", (gradient, radial, noise))
+
+    draw = ImageDraw.Draw(img)
+    for i in range(12):
+        x, y = (i * 97) % width, (i * 61) % height
+        draw.ellipse((x, y, x + width // 5, y + height // 6), fill=(i * 20 % 255, 90, 200 - i * 10))
+    img = img.filter(ImageFilter.SMOOTH)
+
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def legacy_encode(image_bytes: bytes) -> bytes:
+    """The previous resize branch of FLUX_1_schnell_infer"""
+    base64_data = base64.b64encode(image_bytes).decode("utf-8")
+    if len(base64_data) <= LEGACY_BASE64_BUDGET:
+        return image_bytes
+    img = PILImage.open(BytesIO(base64.b64decode(base64_data)))
+    resize_factor = (LEGACY_BASE64_BUDGET / len(base64_data)) ** 0.5
+    img = img.resize((int(img.width * resize_factor), int(img.height * resize_factor)), PILImage.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def time_call(func, repeat: int):
+    """Run func repeat times and return (median seconds, last result)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image encoder benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (median is reported)")
+    parser.add_argument("--budget", type=int, default=LEGACY_BASE64_BUDGET * 3 // 4,
+                        help="Byte budget for the encoded image")
+    args = parser.parse_args()
+
+    encoders = {
+        "legacy-png": None,
+        "budget-webp": BudgetImageEncoder(formats=("webp", "jpeg", "png")),
+        "budget-jpeg": BudgetImageEncoder(formats=("jpeg",)),
+        "budget-png": BudgetImageEncoder(formats=("png",)),
+    }
+
+    print(f"budget: {args.budget} bytes, repeat: {args.repeat}")
+    print(f"{'image':>11} {'source':>10} {'encoder':>12} {'ms':>9} {'bytes':>10} {'fits':>5} {'size':>11}")
+
+    for width, height in ((768, 768), (1024, 1024), (1440, 1440)):
+        source = make_image(width, height)
+        for name, encoder in encoders.items():
+            if encoder is None:
+                seconds, data = time_call(lambda: legacy_encode(source), args.repeat)
+            else:
+                seconds, encoded = time_call(lambda: encoder.encode(source, args.budget), args.repeat)
+                data = encoded.data
+            with PILImage.open(BytesIO(data)) as out:
+                out_size = f"{out.width}x{out.height}"
+            print(f"{width:>5}x{height:<5} {len(source):>10} {name:>12} {seconds * 1000:>9.1f} "
+                  f"{len(data):>10} {str(len(data) <= args.budget):>5} {out_size:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Benchmark the MCP server end to end.
+
+Spawns the real server from server.py over stdio, points its inference
+calls at the local stub server (stub_server.py) through HF_API_BASE_URL,
+and drives FLUX_1_schnell_infer at several concurrency levels. For each
+level it reports:
+  - p50/p95/p99 latency and throughput of the tool calls
+  - the error rate seen by the client
+  - peak RSS of the server process
+  - bytes moved per request, by phase, from the server's own metrics
+
+Usage:
+    python benchmarks/bench_server.py [--concurrency 1,4,16] [--requests N]
+        [--latency S] [--error-rate R] [--size PX] [--format JPEG] [--json FILE] 2>/dev/null
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+# Add the project root to the path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+TOOL = "FLUX_1_schnell_infer"
+
+
+def free_port() -> int:
+    """Find a free local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(args) -> tuple:
+    """Run the stub inference server in its own process so it doesn't share our GIL"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.do_anything_mcp.stub_server", "--port", str(port),
+         "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+         "--format", args.format, "--seed", str(args.seed)],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}/models"
+
+    # Wait until it accepts connections
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+        except urllib.error.HTTPError:
+            return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Stub inference server did not start")
+
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+async def system_info(session: ClientSession) -> dict:
+    """Fetch the server's get_system_info report"""
+    result = await session.call_tool("get_system_info", {})
+    return json.loads(result.content[0].text)
+
+
+def phase_bytes(info: dict) -> dict:
+    """Sum the bytes counted per phase across all commands"""
+    totals = {}
+    for command in info.get("metrics", {}).get("commands", {}).values():
+        for phase, value in command.get("bytes", {}).items():
+            totals[phase] = totals.get(phase, 0) + value
+    return totals
+
+
+async def run_level(session: ClientSession, concurrency: int, requests: int, size: int) -> dict:
+    """Issue requests tool calls with at most concurrency in flight"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in remaining:
+            start = time.perf_counter()
+            result = await session.call_tool(TOOL, {
+                "prompt": f"benchmark image {index}",
+                "width": size,
+                "height": size,
+                "randomize_seed": True,
+            })
+            latencies.append(time.perf_counter() - start)
+            # Failures come back as text content rather than an image
+            if result.isError or not result.content or result.content[0].type != "image":
+                errors += 1
+
+    before = phase_bytes(await system_info(session))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    info = await system_info(session)
+    after = phase_bytes(info)
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_per_second": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": (info.get("peak_rss_bytes") or 0) / 2 ** 20,
+        "bytes_per_request": {
+            phase: (after.get(phase, 0) - before.get(phase, 0)) / requests for phase in sorted(after)
+        },
+    }
+
+
+async def run(args, env: dict) -> list:
+    """Spawn the server and run every concurrency level against it"""
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-m", "src.do_anything_mcp.server", "--work-dir", env["MCP_WORK_DIR"]],
+        env=env,
+    )
+    # Older mcp releases always forward the server's stderr
+    with open(os.devnull, "w") as devnull:
+        extra = {"errlog": devnull} if "errlog" in inspect.signature(stdio_client).parameters else {}
+        async with stdio_client(params, **extra) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+
+                # One untimed call loads the command modules and opens the pool
+                await run_level(session, 1, 1, args.size)
+
+                results = []
+                for concurrency in args.concurrency:
+                    results.append(await run_level(session, concurrency, args.requests, args.size))
+                return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end server benchmark")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        type=lambda value: [int(level) for level in value.split(",")],
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="Tool calls per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated inference latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls that fail")
+    parser.add_argument("--size", type=int, default=1024, help="Width and height of generated images")
+    parser.add_argument("--format", default="JPEG", help="Image format the stub returns")
+    parser.add_argument("--upstream-concurrency", type=int, default=None,
+                        help="MCP_MAX_UPSTREAM_CONCURRENCY for the server")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the stub's simulated failures")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    stub, base_url = start_stub(args)
+    try:
+        env = dict(os.environ)
+        env["MCP_WORK_DIR"] = tempfile.mkdtemp(prefix="bench_server_")
+        env["PYTHONPATH"] = PROJECT_ROOT
+        env["HF_API_BASE_URL"] = base_url
+        env.setdefault("HF_TOKEN", "benchmark")
+        if args.upstream_concurrency:
+            env["MCP_MAX_UPSTREAM_CONCURRENCY"] = str(args.upstream_concurrency)
+
+        results = asyncio.run(run(args, env))
+    finally:
+        stub.kill()
+
+    print(f"{args.requests} calls of {TOOL} per level, {args.size}x{args.size} {args.format}, "
+          f"upstream latency {args.latency * 1000:.0f} ms, error rate {args.error_rate:.0%}\n")
+    print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'peak RSS':>10}")
+    for row in results:
+        print(f"{row['concurrency']:>5} {row['throughput_per_second']:>8.2f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['errors']:>7} {row['peak_rss_mb']:>8.1f}MB")
+
+    print("\nbytes moved per request, by phase:")
+    for row in results:
+        phases = "  ".join(f"{phase} {value / 1024:.0f} KiB" for phase, value in row["bytes_per_request"].items())
+        print(f"  conc {row['concurrency']:>3}: {phases}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark server cold start.
+
+Reports, over several fresh interpreter launches:
+  - import time of the server module (and of its largest dependencies)
+  - time from spawning the server over stdio to the first list_tools response
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--warmup] 2>/dev/null
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the project root to the path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); "
+    "import src.do_anything_mcp.server; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_import(env: dict) -> float:
+    """Import the server module in a fresh interpreter and return seconds"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def top_imports(env: dict, count: int = 8) -> list:
+    """Get the slowest cumulative imports reported by -X importtime"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.do_anything_mcp.server"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        # Only top-level packages, which is where the user-visible cost is
+        if not name.startswith(" ") and "." not in name.strip():
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+async def measure_first_list_tools(env: dict, args: list) -> float:
+    """Spawn the server over stdio and time the first list_tools response"""
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-m", "src.do_anything_mcp.server", *args],
+        env=env,
+    )
+    # Older mcp releases always forward the server's stderr
+    with open(os.devnull, "w") as devnull:
+        extra = {"errlog": devnull} if "errlog" in inspect.signature(stdio_client).parameters else {}
+        start = time.perf_counter()
+        async with stdio_client(params, **extra) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await session.list_tools()
+                return time.perf_counter() - start
+
+
+def summarize(label: str, samples: list) -> None:
+    """Print median and spread of a list of seconds"""
+    print(f"{label:<32} median {statistics.median(samples) * 1000:8.1f} ms"
+          f"   min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server startup benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh launches per measurement")
+    parser.add_argument("--warmup", action="store_true", help="Start the server with --warmup")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["MCP_WORK_DIR"] = tempfile.mkdtemp(prefix="bench_startup_")
+    env["PYTHONPATH"] = PROJECT_ROOT
+
+    summarize("import server module", [measure_import(env) for _ in range(args.runs)])
+
+    server_args = ["--work-dir", env["MCP_WORK_DIR"]] + (["--warmup"] if args.warmup else [])
+    samples = [asyncio.run(measure_first_list_tools(env, server_args)) for _ in range(args.runs)]
+    summarize("spawn to first list_tools", samples)
+
+    print("\nslowest top-level imports (cumulative):")
+    for cumulative, name in top_imports(env):
+        print(f"  {name:<24} {cumulative / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,50 @@
 Individual command modules for Do Anything MCP operations.
 
 This package contains modular commands for operating with the Do Anything MCP system.
+Commands are registered by name in the command registry and their modules are
+imported the first time they are executed.
 """
 
 # Use relative imports to avoid circular dependencies
-from .command_executor import execute_command
-from .flux_schnell import flux_schnell_command
+from .registry import CommandRegistry, CommandNotFoundError, registry, register_command
+from .command_executor import execute_command, execute_command_async
 
-__all__ = ["execute_command", "flux_schnell_command"]
+# Built-in commands, imported on first use
+register_command("echo", ".builtin:echo")
+register_command("system_info", ".builtin:system_info", blocking=True)
+register_command("flux_get_image", ".builtin:flux_get_image", blocking=True)
+register_command("image_thumbnail", ".builtin:image_thumbnail", blocking=True)
+register_command("flux_generate_image", ".flux_schnell:flux_generate_image")
+register_command("flux_generate_batch", ".flux_schnell:flux_generate_batch")
+register_command("execute_python", ".python_sandbox:execute_python")
+register_command("job_submit", ".jobs:job_submit")
+register_command("job_status", ".jobs:job_status", blocking=True)
+register_command("job_result", ".jobs:job_result", blocking=True)
+register_command("upload_begin", ".uploads:upload_begin", blocking=True)
+register_command("upload_chunk", ".uploads:upload_chunk", blocking=True)
+register_command("upload_finish", ".uploads:upload_finish", blocking=True)
+register_command("upload_abort", ".uploads:upload_abort", blocking=True)
+register_command("file_info", ".uploads:file_info", blocking=True)
+register_command("image_resize", ".image_tools:image_resize", blocking=True)
+register_command("image_crop", ".image_tools:image_crop", blocking=True)
+register_command("image_convert", ".image_tools:image_convert", blocking=True)
+register_command("image_composite", ".image_tools:image_composite", blocking=True)
+
+
+def __getattr__(name):
+    """Load the FLUX command singleton only when it is asked for"""
+    if name == "flux_schnell_command":
+        from .flux_schnell import get_flux_schnell_command
+        return get_flux_schnell_command()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "CommandRegistry",
+    "CommandNotFoundError",
+    "registry",
+    "register_command",
+    "execute_command",
+    "execute_command_async",
+    "flux_schnell_command"
+]
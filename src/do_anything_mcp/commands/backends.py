@@ -0,0 +1,239 @@
+"""
+Inference backends for image generation.
+
+A backend knows how to turn generation parameters into an HTTP request for
+one provider and how to read the generated image out of its response:
+
+- ``huggingface``: the Hugging Face inference API (``POST <url>/<model>``
+  with ``inputs`` and ``parameters``, image bytes in the response)
+- ``openai``: any OpenAI-style ``POST <url>/images/generations`` endpoint,
+  as served by many self-hosted diffusion servers (``b64_json`` or ``url``)
+- ``stub``: the local stub server (stub_server.py), Hugging Face protocol
+
+Backends are configured with MCP_BACKENDS, a JSON list (or the path of a
+JSON file holding one) of objects with ``type`` and optionally ``name``,
+``url``, ``model`` and ``token_env`` (the environment variable holding the
+token; tokens are never read from the list itself). Backends without a
+``token_env`` draw tokens from the Hugging Face token pool (credentials.py)
+when they are Hugging Face backends or set ``"token_pool": true``. Without
+MCP_BACKENDS, a single Hugging Face backend is built from HF_API_BASE_URL
+and the token pool.
+"""
+
+import os
+import json
+import base64
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .credentials import Credential, CredentialPool
+
+# Configure logging
+logger = logging.getLogger("InferenceBackends")
+
+# Constants
+DEFAULT_MODEL = "black-forest-labs/FLUX.1-schnell"
+DEFAULT_HF_URL = "https://api-inference.huggingface.co/models"
+DEFAULT_STUB_URL = "http://127.0.0.1:8910/models"
+DEFAULT_OPENAI_MODEL = "flux-schnell"
+CHUNK_SIZE = 64 * 1024
+# JSON bodies carry the image base64 encoded
+MAX_JSON_BYTES = 96 * 1024 * 1024
+
+# Streams a body to the store: see FluxSchnellCommand._download
+Downloader = Callable[[AsyncIterator[bytes]], Awaitable[Dict[str, Any]]]
+
+
+class BackendConfigError(ValueError):
+    """Raised when MCP_BACKENDS cannot be parsed"""
+
+
+class InferenceBackend:
+    """Hugging Face inference API protocol; the base for other backends"""
+
+    kind = "huggingface"
+
+    def __init__(self, name: str, url: str, model: str = None, token: str = None,
+                 credentials: CredentialPool = None):
+        """Initialize the backend.
+
+        Args:
+            name: Name the backend is reported and routed by
+            url: Base URL of the API
+            model: Model to call (default: FLUX.1-schnell)
+            token: Bearer token, if the API needs one
+            credentials: Pool to borrow a token from for each call, used
+                when there is no token of its own
+        """
+        self.name = name
+        self.url = url.rstrip("/")
+        self.model = model or DEFAULT_MODEL
+        self.token = token
+        self.credentials = credentials if credentials and token is None else None
+
+    def headers(self, credential: Optional[Credential] = None) -> Dict[str, str]:
+        """Request headers, including authorization.
+
+        Args:
+            credential: Token borrowed from the pool for this call, if any
+        """
+        token = credential.token if credential is not None else self.token
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    def available(self) -> bool:
+        """Whether a call could start now without waiting for a pooled token"""
+        return self.credentials is None or self.credentials.ready()
+
+    def request(self, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Build the request for a generation.
+
+        Args:
+            params: prompt, width, height, num_inference_steps and seed (None
+                to let the backend pick)
+
+        Returns:
+            Tuple of (URL, JSON body)
+        """
+        parameters = {
+            "width": params["width"],
+            "height": params["height"],
+            "num_inference_steps": params["num_inference_steps"],
+            "seed": params.get("seed"),
+        }
+        return f"{self.url}/{self.model}", {
+            "inputs": params["prompt"],
+            "parameters": {k: v for k, v in parameters.items() if v is not None}
+        }
+
+    async def read_image(self, client: httpx.AsyncClient, response: httpx.Response, download: Downloader) -> Dict[str, Any]:
+        """Store the image of a successful (200) streaming response.
+
+        Args:
+            client: HTTP client, for follow-up requests
+            response: The open streaming response
+            download: Coroutine function streaming chunks to a temporary file
+
+        Returns:
+            The download (see FluxSchnellCommand._download)
+        """
+        return await download(response.aiter_bytes(CHUNK_SIZE))
+
+    def describe(self) -> Dict[str, Any]:
+        """Get the backend's configuration, without secrets"""
+        description = {"type": self.kind, "url": self.url, "model": self.model,
+                       "authenticated": bool(self.token or self.credentials)}
+        if self.credentials is not None:
+            description["pooled_tokens"] = len(self.credentials)
+        return description
+
+
+class StubBackend(InferenceBackend):
+    """The local stub server, which speaks the Hugging Face protocol"""
+
+    kind = "stub"
+
+
+class OpenAIImagesBackend(InferenceBackend):
+    """OpenAI-style images API (``POST <url>/images/generations``)"""
+
+    kind = "openai"
+
+    def request(self, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        body = {
+            "model": self.model,
+            "prompt": params["prompt"],
+            "n": 1,
+            "size": f"{params['width']}x{params['height']}",
+            "response_format": "b64_json",
+            # Not part of the OpenAI API, but honoured by most diffusion servers
+            "num_inference_steps": params["num_inference_steps"],
+        }
+        if params.get("seed") is not None:
+            body["seed"] = params["seed"]
+        return f"{self.url}/images/generations", body
+
+    async def read_image(self, client: httpx.AsyncClient, response: httpx.Response, download: Downloader) -> Dict[str, Any]:
+        body = bytearray()
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            body += chunk
+            if len(body) > MAX_JSON_BYTES:
+                raise ValueError(f"Response exceeds {MAX_JSON_BYTES} bytes")
+        try:
+            item = json.loads(body)["data"][0]
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise ValueError("Backend returned no image data")
+        del body
+
+        if item.get("b64_json"):
+            data = base64.b64decode(item["b64_json"])
+
+            async def chunks():
+                for start in range(0, len(data), CHUNK_SIZE):
+                    yield data[start:start + CHUNK_SIZE]
+
+            return await download(chunks())
+
+        if item.get("url"):
+            async with client.stream("GET", item["url"]) as image_response:
+                image_response.raise_for_status()
+                return await download(image_response.aiter_bytes(CHUNK_SIZE))
+
+        raise ValueError("Backend returned neither b64_json nor url")
+
+
+BACKEND_TYPES = {cls.kind: cls for cls in (InferenceBackend, StubBackend, OpenAIImagesBackend)}
+DEFAULT_URLS = {"huggingface": DEFAULT_HF_URL, "stub": DEFAULT_STUB_URL}
+
+
+def load_backends(spec: str = None, credentials: CredentialPool = None) -> List[InferenceBackend]:
+    """Build the configured backends.
+
+    Args:
+        spec: JSON list of backend objects, or the path of a file holding one
+            (default: MCP_BACKENDS)
+        credentials: Token pool for backends without a token_env
+
+    Returns:
+        Backends in configuration order
+
+    Raises:
+        BackendConfigError: If the configuration is invalid
+    """
+    spec = spec if spec is not None else os.environ.get("MCP_BACKENDS", "")
+    if not spec.strip():
+        url = os.environ.get("HF_API_BASE_URL", DEFAULT_HF_URL)
+        return [InferenceBackend("huggingface", url, credentials=credentials)]
+
+    try:
+        if not spec.lstrip().startswith("["):
+            with open(spec, encoding="utf-8") as f:
+                spec = f.read()
+        entries = json.loads(spec)
+    except (OSError, ValueError) as e:
+        raise BackendConfigError(f"Invalid MCP_BACKENDS: {str(e)}")
+    if not isinstance(entries, list) or not entries:
+        raise BackendConfigError("MCP_BACKENDS must be a non-empty JSON list")
+
+    backends = []
+    for index, entry in enumerate(entries):
+        kind = entry.get("type", "huggingface") if isinstance(entry, dict) else None
+        if kind not in BACKEND_TYPES:
+            raise BackendConfigError(f"Backend {index}: unknown type {kind!r}, expected one of {sorted(BACKEND_TYPES)}")
+        url = entry.get("url") or DEFAULT_URLS.get(kind)
+        if not url:
+            raise BackendConfigError(f"Backend {index}: {kind} backends need a url")
+        name = entry.get("name") or f"{kind}-{index}"
+        if any(backend.name == name for backend in backends):
+            raise BackendConfigError(f"Backend {index}: duplicate name {name!r}")
+
+        token = os.environ.get(entry["token_env"]) if entry.get("token_env") else None
+        # Pooled Hugging Face tokens are only sent where they are asked for
+        pooled = entry.get("token_pool", kind == "huggingface")
+        model = entry.get("model") or (DEFAULT_OPENAI_MODEL if kind == "openai" else None)
+        backends.append(BACKEND_TYPES[kind](name, url, model=model, token=token,
+                                            credentials=credentials if pooled else None))
+
+    logger.info(f"Configured inference backends: {', '.join(backend.name for backend in backends)}")
+    return backends
@@ -0,0 +1,189 @@
+"""
+Built-in commands for Do Anything MCP.
+
+These handlers are registered lazily in the command registry and imported
+the first time one of them is executed.
+"""
+
+import os
+import logging
+import platform
+from typing import Dict, Any
+
+# Configure logging
+logger = logging.getLogger("DoAnythingCommands")
+
+# Constants
+MIN_THUMBNAIL_SIZE = 16
+MAX_THUMBNAIL_SIZE = 1024
+MAX_THUMBNAIL_BYTES = 256 * 1024
+
+
+def echo(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Echo a message back"""
+    return {"message": params.get("message", "Hello from Do Anything MCP!")}
+
+
+def _peak_rss_bytes():
+    """Peak resident set size of this process, if the platform reports it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def system_info(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Report platform details and command layer statistics"""
+    from .registry import registry
+    from ..storage import get_storage
+    from ..metrics import metrics
+    
+    # Only report storage this process already uses; opening it creates the work dir
+    storage = get_storage()
+    return {
+        "platform": platform.system(),
+        "python_version": platform.python_version(),
+        "machine": platform.machine(),
+        "working_directory": os.environ.get("MCP_WORK_DIR", os.getcwd()),
+        "pid": os.getpid(),
+        "worker": os.environ.get("MCP_WORKER_INDEX"),
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "storage": storage.stats() if storage.opened else None,
+        "metrics": metrics.snapshot(),
+        **registry.collect_stats()
+    }
+
+
+def flux_get_image(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the encoded bytes of a stored image or one of its derivatives.
+    
+    With an image_id, ``variant`` ("thumb", "preview" or "inline") selects a
+    precomputed derivative, and ``max_bytes`` of at least the inline budget
+    serves the "inline" derivative when the original is larger.
+    
+    The image comes back base64 encoded as ``image_data``, so the result
+    stays JSON-serializable. In-process callers can pass ``encoding="bytes"``
+    to get the raw ``image_bytes`` instead and skip the encoding.
+    """
+    from .flux_schnell import sniff_image_format
+    from .derivatives import DERIVATIVES, INLINE_MAX_BYTES, get_derivative_builder
+    from ..metrics import metrics
+    
+    image_id = params.get("image_id")
+    image_path = params.get("image_path")
+    if not image_path and image_id:
+        from ..storage import get_storage
+        image_path = get_storage().get_path(image_id)
+        if image_path is None:
+            return {"success": False, "message": f"Unknown image: {image_id}"}
+    if not image_path:
+        return {"success": False, "message": "Image path or id is required"}
+    
+    variant = params.get("variant")
+    if variant is not None and variant not in DERIVATIVES:
+        return {"success": False, "message": f"Unknown variant: {variant}"}
+    max_bytes = params.get("max_bytes")
+    if variant is None and max_bytes and max_bytes >= INLINE_MAX_BYTES and os.path.getsize(image_path) > max_bytes:
+        variant = "inline"
+    
+    # Serve a derivative from disk instead of decoding and re-encoding the original
+    if variant is not None and image_id:
+        derivative_path = get_derivative_builder().get_path(image_id, variant, source_path=image_path)
+        if derivative_path is not None:
+            image_path = derivative_path
+        else:
+            variant = None
+    elif variant is not None:
+        return {"success": False, "message": "Variants require an image id"}
+    
+    encoding = params.get("encoding", "base64")
+    if encoding not in ("base64", "bytes"):
+        return {"success": False, "message": f"Unknown encoding: {encoding}"}
+    
+    # Serve the stored bytes as-is, without decoding and re-encoding the image
+    try:
+        with open(image_path, "rb") as image_file:
+            image_bytes = image_file.read()
+        metrics.add_bytes("read", len(image_bytes))
+        
+        result = {
+            "success": True,
+            "message": "Image read successfully",
+            "format": sniff_image_format(image_bytes),
+            "variant": variant
+        }
+        
+        if encoding == "bytes":
+            result["image_bytes"] = image_bytes
+        else:
+            import base64
+            with metrics.phase("base64"):
+                result["image_data"] = base64.b64encode(image_bytes).decode("utf-8")
+            metrics.add_bytes("base64", len(result["image_data"]))
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error processing image: {str(e)}")
+        return {"success": False, "message": f"Failed to process image: {str(e)}"}
+
+
+def image_thumbnail(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Get a JPEG thumbnail of a stored image"""
+    from ..storage import get_storage
+    from ..metrics import metrics
+    
+    image_path = params.get("image_path")
+    if not image_path and params.get("image_id"):
+        image_path = get_storage().get_path(params["image_id"])
+        if image_path is None:
+            return {"success": False, "message": f"Unknown image: {params['image_id']}"}
+    if not image_path:
+        return {"success": False, "message": "Image path or id is required"}
+    
+    size = params.get("size", 256)
+    if not isinstance(size, int) or not MIN_THUMBNAIL_SIZE <= size <= MAX_THUMBNAIL_SIZE:
+        return {"success": False, "message": f"Thumbnail size must be between {MIN_THUMBNAIL_SIZE} and {MAX_THUMBNAIL_SIZE}"}
+    max_bytes = params.get("max_bytes", MAX_THUMBNAIL_BYTES)
+    
+    # Common sizes are precomputed after generation
+    if params.get("image_id"):
+        from .derivatives import DERIVATIVES
+        for variant, spec in DERIVATIVES.items():
+            if spec["size"] == size and spec["max_bytes"] <= max_bytes:
+                result = flux_get_image(connection, {
+                    "image_id": params["image_id"],
+                    "variant": variant,
+                    "encoding": "bytes"
+                })
+                if result.get("variant") == variant:
+                    return {
+                        "success": True,
+                        "message": "Thumbnail read successfully",
+                        "image_bytes": result["image_bytes"],
+                        "format": result["format"]
+                    }
+                break
+    
+    try:
+        from .. import image_ops
+        from ..image_pool import get_image_pool
+        
+        # Decoding and resampling run in the image pool, off this process's GIL
+        with metrics.phase("encode"):
+            encoded = get_image_pool().call(image_ops.encode_file, image_path, max_bytes, ("jpeg",), size)
+        metrics.add_bytes("encode", len(encoded.data))
+        
+        return {
+            "success": True,
+            "message": "Thumbnail created successfully",
+            "image_bytes": encoded.data,
+            "format": encoded.format
+        }
+        
+    except Exception as e:
+        logger.error(f"Error creating thumbnail: {str(e)}")
+        return {"success": False, "message": f"Failed to create thumbnail: {str(e)}"}
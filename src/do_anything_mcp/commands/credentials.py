@@ -0,0 +1,338 @@
+"""
+Pool of Hugging Face tokens for upstream calls.
+
+The inference API rate-limits per token, so one token caps the whole
+server however many requests it could otherwise make. With several tokens
+(HF_TOKENS, a comma or whitespace separated list, and/or HF_TOKENS_FILE,
+one token per line; HF_TOKEN is always included) each call borrows the
+token with the most spare capacity:
+
+- Each token has a token bucket of MCP_TOKEN_RATE requests per second
+  (0, the default, leaves pacing to the API) with bursts of up to
+  MCP_TOKEN_BURST requests.
+- A 429 puts the token in cooldown for the Retry-After the API sent, or an
+  exponentially growing delay without one. A 401/403 benches it for longer
+  when there are other tokens to use instead; a lone token is never
+  benched, so its auth failures surface as they happen.
+- When no token is ready the call waits for the first to come back, up to
+  MCP_TOKEN_MAX_WAIT seconds.
+
+Under the multi-worker SSE server each worker process keeps its own pool.
+With at least as many tokens as workers, each worker takes its own share
+of the tokens; otherwise the tokens are shared and every worker paces
+them at its share of MCP_TOKEN_RATE.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger("CredentialPool")
+
+# Constants
+DEFAULT_RATE = 0.0
+DEFAULT_BURST = 5.0
+DEFAULT_COOLDOWN = 5.0
+MAX_COOLDOWN = 300.0
+AUTH_FAILURE_COOLDOWN = 600.0
+DEFAULT_MAX_WAIT = 30.0
+# Window of the per-token request rate in the stats
+USAGE_WINDOW = 60.0
+
+
+class CredentialsExhaustedError(Exception):
+    """Raised when no token becomes usable within the wait limit"""
+
+    def __init__(self, message: str, refused: bool = False):
+        super().__init__(message)
+        # Whether the tokens are out because the API refused them, not throttling
+        self.refused = refused
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average, in bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def level(self, now: float) -> float:
+        """Fraction of the burst currently available"""
+        self._refill(now)
+        return self.tokens / self.capacity
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a request is allowed"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self, now: float) -> bool:
+        """Spend one request if one is allowed"""
+        self._refill(now)
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class Credential:
+    """One token with its pacing, cooldown and usage counters"""
+
+    def __init__(self, name: str, token: str, rate: float = DEFAULT_RATE, burst: float = DEFAULT_BURST):
+        """Initialize the credential.
+
+        Args:
+            name: Name the token is reported by
+            token: The token itself; never logged or reported
+            rate: Requests per second allowed, 0 for no local limit
+            burst: Requests allowed back to back
+        """
+        self.name = name
+        self.token = token
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.cooldown_until = 0.0
+        self.throttle_streak = 0
+        # Whether the current cooldown is a bench after an auth failure
+        self.refused = False
+
+        self.requests = 0
+        self.successes = 0
+        self.throttled = 0
+        self.auth_failures = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.last_used = 0.0
+        self._recent = deque()
+
+    @property
+    def fingerprint(self) -> str:
+        """Masked form of the token, enough to tell tokens apart"""
+        return f"...{self.token[-4:]}" if len(self.token) > 8 else "..."
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until the token may be used again"""
+        wait = max(0.0, self.cooldown_until - now)
+        if self.bucket is not None:
+            wait = max(wait, self.bucket.wait_time(now))
+        return wait
+
+    def headroom(self, now: float) -> float:
+        """Spare capacity for ordering ready tokens; higher is better"""
+        return self.bucket.level(now) if self.bucket is not None else 1.0
+
+    def record(self, status: Optional[int], retry_after: Optional[float] = None, bench: bool = True) -> None:
+        """Record the outcome of a request made with this token.
+
+        Args:
+            status: HTTP status, None after a transport error
+            retry_after: Seconds the API asked to wait, for a 429
+            bench: Whether a 401/403 takes the token out of use for a while
+        """
+        now = time.monotonic()
+        if status == 429:
+            self.throttled += 1
+            self.throttle_streak += 1
+            if retry_after is None:
+                retry_after = min(MAX_COOLDOWN, DEFAULT_COOLDOWN * 2 ** (self.throttle_streak - 1))
+            self.cooldown_until = max(self.cooldown_until, now + retry_after)
+            self.refused = False
+            logger.info(f"Token {self.name} throttled, cooling down for {retry_after:.1f}s")
+        elif status in (401, 403):
+            self.auth_failures += 1
+            if bench:
+                self.cooldown_until = now + AUTH_FAILURE_COOLDOWN
+                self.refused = True
+                logger.warning(f"Token {self.name} ({self.fingerprint}) was refused with status {status}; "
+                               f"benched for {AUTH_FAILURE_COOLDOWN:.0f}s")
+        elif status is not None and status < 400:
+            self.successes += 1
+            self.throttle_streak = 0
+            self.refused = False
+        else:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > USAGE_WINDOW:
+            self._recent.popleft()
+        return {
+            "name": self.name,
+            "token": self.fingerprint,
+            "requests": self.requests,
+            "successes": self.successes,
+            "throttled": self.throttled,
+            "auth_failures": self.auth_failures,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "requests_last_minute": len(self._recent),
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 2),
+            "bucket_level": round(self.bucket.level(now), 3) if self.bucket is not None else None,
+            "last_used_seconds_ago": round(now - self.last_used, 1) if self.last_used else None,
+        }
+
+
+class CredentialPool:
+    """Spreads upstream calls across tokens, honouring each token's limits"""
+
+    def __init__(self, credentials: List[Credential], max_wait: float = None):
+        """Initialize the pool.
+
+        Args:
+            credentials: Tokens to use
+            max_wait: Longest wait in seconds for a token to become ready
+                (default: MCP_TOKEN_MAX_WAIT or 30)
+        """
+        self.credentials = credentials
+        self.max_wait = max_wait if max_wait is not None else float(
+            os.environ.get("MCP_TOKEN_MAX_WAIT", DEFAULT_MAX_WAIT))
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.exhausted = 0
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    def ready(self) -> bool:
+        """Whether a token could be used right now"""
+        now = time.monotonic()
+        return any(credential.wait_time(now) <= 0 for credential in self.credentials)
+
+    def wait_time(self) -> float:
+        """Seconds until the first token is ready"""
+        now = time.monotonic()
+        return min((credential.wait_time(now) for credential in self.credentials), default=0.0)
+
+    def try_acquire(self) -> Optional[Credential]:
+        """Take the ready token with the most headroom, None if none is ready.
+
+        Ties go to the token with fewest requests in flight, then to the
+        least recently used, so calls rotate through unpaced tokens.
+        """
+        now = time.monotonic()
+        ready = [credential for credential in self.credentials if credential.wait_time(now) <= 0]
+        if not ready:
+            return None
+        credential = max(ready, key=lambda c: (c.headroom(now), -c.in_flight, -c.last_used))
+        if credential.bucket is not None:
+            credential.bucket.take(now)
+        credential.requests += 1
+        credential.in_flight += 1
+        credential.last_used = now
+        credential._recent.append(now)
+        return credential
+
+    async def acquire(self) -> Credential:
+        """Take a token, waiting for one to become ready.
+
+        Raises:
+            CredentialsExhaustedError: If none is ready within max_wait
+        """
+        credential = self.try_acquire()
+        if credential is not None:
+            return credential
+
+        self.waits += 1
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self.wait_time()
+                waited = time.monotonic() - started
+                if waited + wait > self.max_wait:
+                    self.exhausted += 1
+                    if all(credential.refused for credential in self.credentials):
+                        raise CredentialsExhaustedError(
+                            f"Authentication failed: all {len(self.credentials)} Hugging Face tokens were "
+                            f"refused (401/403); check HF_TOKEN, HF_TOKENS and HF_TOKENS_FILE",
+                            refused=True
+                        )
+                    raise CredentialsExhaustedError(
+                        f"Rate limited: all {len(self.credentials)} Hugging Face tokens are rate limited "
+                        f"for another {wait:.0f}s"
+                    )
+                await asyncio.sleep(wait)
+                credential = self.try_acquire()
+                if credential is not None:
+                    return credential
+        finally:
+            self.wait_seconds += time.monotonic() - started
+
+    def release(self, credential: Credential, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        """Return a token with the outcome of its request (see :meth:`Credential.record`)"""
+        credential.in_flight -= 1
+        # With a single token there is nothing to fall back on; benching it
+        # would only turn its auth errors into waits
+        credential.record(status, retry_after, bench=len(self.credentials) > 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the pool's waits and per-token usage"""
+        return {
+            "tokens": len(self.credentials),
+            "ready": sum(1 for credential in self.credentials if credential.wait_time(time.monotonic()) <= 0),
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "exhausted": self.exhausted,
+            "credentials": [credential.stats() for credential in self.credentials],
+        }
+
+
+def _read_tokens(text: str) -> List[str]:
+    """Split a token list on commas and whitespace, skipping # comments"""
+    tokens = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0]
+        tokens.extend(token for token in line.replace(",", " ").split() if token)
+    return tokens
+
+
+def load_credential_pool(hf_token: str = None) -> CredentialPool:
+    """Build the token pool from the environment.
+
+    Args:
+        hf_token: Token given directly (e.g. HF_TOKEN or --hf-token); it
+            comes first in the pool
+
+    Returns:
+        The pool, empty when no token is configured
+    """
+    tokens = [hf_token] if hf_token else []
+    tokens += _read_tokens(os.environ.get("HF_TOKENS", ""))
+    tokens_file = os.environ.get("HF_TOKENS_FILE")
+    if tokens_file:
+        try:
+            with open(tokens_file, encoding="utf-8") as f:
+                tokens += _read_tokens(f.read())
+        except OSError as e:
+            logger.error(f"Could not read HF_TOKENS_FILE: {str(e)}")
+    # The same token listed twice shares one rate limit upstream
+    tokens = list(dict.fromkeys(tokens))
+    names = [f"token-{index}" for index in range(len(tokens))]
+
+    rate = float(os.environ.get("MCP_TOKEN_RATE", DEFAULT_RATE))
+    burst = float(os.environ.get("MCP_TOKEN_BURST", DEFAULT_BURST))
+
+    # Worker processes split the tokens between them, or their rate
+    workers = int(os.environ.get("MCP_WORKERS", 1))
+    index = os.environ.get("MCP_WORKER_INDEX")
+    if workers > 1 and index is not None and tokens:
+        if len(tokens) >= workers:
+            tokens = tokens[int(index)::workers]
+            names = names[int(index)::workers]
+        else:
+            rate /= workers
+            burst = max(1.0, burst / workers)
+
+    pool = CredentialPool([Credential(name, token, rate, burst) for name, token in zip(names, tokens)])
+    if len(pool) > 1:
+        pacing = f"{rate:g} requests/s each" if rate > 0 else "no local rate limit"
+        logger.info(f"Using {len(pool)} Hugging Face tokens ({pacing})")
+    return pool
@@ -0,0 +1,230 @@
+"""
+Precomputed image derivatives for Do Anything MCP.
+
+Right after an image is generated, a background job decodes it once into
+shared memory and encodes the reduced versions that responses ask for again
+and again in parallel in the image process pool:
+
+- ``thumb``: 256 px JPEG within 32 KiB (the preview of reference responses)
+- ``preview``: 512 px JPEG within 128 KiB
+- ``inline``: the image fitted to the inline response budget (WebP when
+  available), only for originals too large to inline as they are
+
+Derivatives are stored next to the original in the work directory store
+under the id ``<image_id>.<name>``, so they are found with one index lookup
+and evicted together with the original. A derivative that is missing (old
+image, or still being built) is built on demand; a per-image lock makes such
+a request wait for the background job instead of repeating its work.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Sequence, Set
+
+from ..metrics import metrics
+from ..storage import WorkDirStorage, get_storage
+
+# Configure logging
+logger = logging.getLogger("ImageDerivatives")
+
+# Constants
+# Matches the tools' inline budget: ~1MB responses, less base64 overhead
+INLINE_MAX_BYTES = 750000 * 3 // 4
+DERIVATIVES = {
+    "thumb": {"size": 256, "max_bytes": 32 * 1024, "formats": ("jpeg",)},
+    "preview": {"size": 512, "max_bytes": 128 * 1024, "formats": ("jpeg",)},
+    "inline": {"size": None, "max_bytes": INLINE_MAX_BYTES, "formats": None},
+}
+EXTENSIONS = {"jpeg": "jpg", "png": "png", "webp": "webp"}
+
+
+class DerivativeBuilder:
+    """Builds, stores and looks up reduced versions of stored images"""
+
+    def __init__(self, storage: WorkDirStorage, enabled: bool = None):
+        """Initialize the builder.
+
+        Args:
+            storage: Store holding the originals and their derivatives
+            enabled: Whether derivatives are built in the background after
+                generation (default: MCP_DERIVATIVES or True); on-demand
+                lookups work either way
+        """
+        self.storage = storage
+        if enabled is None:
+            enabled = os.environ.get("MCP_DERIVATIVES", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+
+        self.hits = 0
+        self.built = 0
+        self.build_seconds = 0.0
+        self.failures = 0
+
+        # image id -> [lock, number of threads holding or waiting for it]
+        self._locks: Dict[str, list] = {}
+        self._locks_guard = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def derivative_id(image_id: str, name: str) -> str:
+        """Get the storage id of a derivative"""
+        return f"{image_id}.{name}"
+
+    def _lock_for(self, image_id: str) -> threading.Lock:
+        """Get the lock serializing builds for one image; pair with _release_lock"""
+        with self._locks_guard:
+            entry = self._locks.get(image_id)
+            if entry is None:
+                entry = self._locks[image_id] = [threading.Lock(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _release_lock(self, image_id: str) -> None:
+        """Forget an image's lock once nobody holds or waits for it"""
+        with self._locks_guard:
+            entry = self._locks[image_id]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[image_id]
+
+    def schedule(self, image_id: str, image_path: str) -> None:
+        """Build all derivatives of a new image in the background"""
+        if not self.enabled:
+            return
+        task = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(self.build, image_id, image_path)
+        )
+        # Keep a reference so the task isn't garbage collected mid-run
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get_path(self, image_id: str, name: str, source_path: str = None) -> Optional[str]:
+        """Get the path of a derivative, building it if needed.
+
+        Args:
+            image_id: Id of the original image
+            name: Derivative name (see DERIVATIVES)
+            source_path: Path of the original, if already known
+
+        Returns:
+            Path of the derivative (the original itself for "inline" when it
+            already fits), or None if the original is gone or can't be decoded
+        """
+        path = self.storage.get_path(self.derivative_id(image_id, name))
+        if path is not None:
+            self.hits += 1
+            return path
+
+        source_path = source_path or self.storage.get_path(image_id)
+        if source_path is None:
+            return None
+        if name == "inline" and os.path.getsize(source_path) <= INLINE_MAX_BYTES:
+            return source_path
+
+        self.build(image_id, source_path, names=(name,))
+        return self.storage.get_path(self.derivative_id(image_id, name))
+
+    def build(self, image_id: str, image_path: str, names: Sequence[str] = None) -> None:
+        """Decode an image once and write the derivatives it is missing.
+
+        Args:
+            image_id: Id of the original image
+            image_path: Path of the original
+            names: Derivatives to build (default: all)
+        """
+        lock = self._lock_for(image_id)
+        try:
+            with lock:
+                missing = [
+                    name for name in (names or DERIVATIVES)
+                    if self.storage.get_path(self.derivative_id(image_id, name)) is None
+                ]
+                if "inline" in missing and os.path.getsize(image_path) <= INLINE_MAX_BYTES:
+                    missing.remove("inline")
+                if not missing:
+                    return
+
+                start = time.perf_counter()
+                with metrics.phase("derivatives", command="derivatives"):
+                    self._build_missing(image_id, image_path, missing)
+                self.build_seconds += time.perf_counter() - start
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to build derivatives of {image_id}: {str(e)}")
+        finally:
+            self._release_lock(image_id)
+
+    def _build_missing(self, image_id: str, image_path: str, names: Sequence[str]) -> None:
+        """Encode and store the given derivatives in the image pool.
+
+        The original is decoded once into shared memory and the derivatives
+        are encoded from it in parallel, one worker each.
+        """
+        from .. import image_ops
+        from ..image_pool import get_image_pool
+
+        pool = get_image_pool()
+        specs = [(DERIVATIVES[name]["max_bytes"], DERIVATIVES[name]["formats"], DERIVATIVES[name]["size"]) for name in names]
+        if os.name == "posix" and len(names) > 1:
+            shared = pool.call(image_ops.decode_shared, image_path)
+            block = shared.adopt()
+            try:
+                results = pool.call_all(image_ops.encode_shared, [(shared, *spec) for spec in specs])
+            finally:
+                image_ops.release(block)
+        else:
+            # Nothing to share; each worker decodes the original itself
+            results = pool.call_all(image_ops.encode_file, [(image_path, *spec) for spec in specs])
+
+        for name, encoded in zip(names, results):
+            self._store(image_id, name, encoded.data, encoded.format)
+            metrics.add_bytes("derivatives", len(encoded.data), command="derivatives")
+
+    def _store(self, image_id: str, name: str, data: bytes, image_format: str) -> None:
+        """Write a derivative atomically and index it"""
+        derivative_id = self.derivative_id(image_id, name)
+        temp_path = self.storage.temp_path(f"{derivative_id}.part")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        path = self.storage.allocate_path(
+            derivative_id, f"flux_image_{image_id}_{name}.{EXTENSIONS.get(image_format, image_format)}"
+        )
+        os.replace(temp_path, path)
+        self.storage.add(derivative_id, path, kind=f"derivative_{name}")
+        self.built += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get build and lookup counters"""
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "built": self.built,
+            "failures": self.failures,
+            "pending": len(self._tasks),
+            "build_seconds": round(self.build_seconds, 3),
+        }
+
+
+# Lazily created builder for the default work directory
+_derivative_builder: Optional[DerivativeBuilder] = None
+
+
+def get_derivative_builder(work_dir: str = None) -> DerivativeBuilder:
+    """Get or create the derivative builder singleton.
+
+    Args:
+        work_dir: Work directory, used when the builder is first created
+            (default: MCP_WORK_DIR or ./mcp_data)
+    """
+    global _derivative_builder
+
+    if _derivative_builder is None:
+        from .registry import registry
+
+        _derivative_builder = DerivativeBuilder(get_storage(work_dir))
+        registry.add_stats_provider("derivatives", _derivative_builder.stats)
+
+    return _derivative_builder
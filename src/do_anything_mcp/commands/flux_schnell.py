@@ -2,18 +2,32 @@
 FLUX.1-schnell image generation command for Do Anything MCP.
 
 This module provides integration with the FLUX.1-schnell text-to-image model
-on Hugging Face Spaces.
+on Hugging Face and other inference backends (see backends.py and router.py).
 """
 
 import os
+import time
 import uuid
 import base64
+import hashlib
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
 
-import requests
-from PIL import Image
-from io import BytesIO
+import httpx
+
+from ..http_client import get_http_client, close_http_client
+from ..storage import get_storage
+from ..metrics import metrics
+from .result_cache import ResultCache, make_cache_key
+from .derivatives import get_derivative_builder
+from .single_flight import SingleFlight
+from .registry import registry
+from .scheduler import PRIORITY_BATCH, InferenceScheduler, SchedulerRejectedError
+from .resilience import RetryPolicy, CircuitOpenError
+from .backends import load_backends
+from .credentials import CredentialsExhaustedError, load_credential_pool
+from .router import BackendRouter, BackendState
 
 # Configure logging
 logger = logging.getLogger("FluxSchnellCommand")
@@ -24,6 +38,66 @@ DEFAULT_WIDTH = 1024
 DEFAULT_HEIGHT = 1024
 DEFAULT_INFERENCE_STEPS = 4
 
+# Leading bytes of the image formats the inference API may return
+IMAGE_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": "png",
+    b"\xff\xd8\xff": "jpeg",
+    b"GIF87a": "gif",
+    b"GIF89a": "gif",
+}
+IMAGE_EXTENSIONS = {"png": "png", "jpeg": "jpg", "gif": "gif", "webp": "webp"}
+EXTENSION_FORMATS = {extension: image_format for image_format, extension in IMAGE_EXTENSIONS.items()}
+
+# Upstream bodies are streamed to disk, up to this size
+MAX_IMAGE_BYTES = 64 * 1024 * 1024
+MAX_BATCH_SIZE = 32
+# Queueing parameters set by the server, never taken from batch items
+QUEUE_PARAMS = ("session_id", "priority", "session_priority")
+
+
+def sniff_image_format(data: bytes) -> Optional[str]:
+    """Detect an image format from its leading bytes.
+    
+    Args:
+        data: Beginning of the encoded image (at least 12 bytes)
+        
+    Returns:
+        Format name ("png", "jpeg", "gif" or "webp"), or None if unrecognized
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in IMAGE_SIGNATURES.items():
+        if data.startswith(signature):
+            return image_format
+    return None
+
+
+def read_image_size(image_path: str) -> Tuple[int, int]:
+    """Read image dimensions from the file header without decoding pixels.
+    
+    Args:
+        image_path: Path to the image file
+        
+    Returns:
+        Tuple of (width, height)
+    """
+    from PIL import Image as PILImage
+    
+    with PILImage.open(image_path) as image:
+        return image.size
+
+
+def _token_outcome(response: Optional[httpx.Response]) -> Tuple[Optional[int], Optional[float]]:
+    """Status and Retry-After seconds of a response, for the token that made it"""
+    if response is None:
+        return None, None
+    try:
+        retry_after = float(response.headers.get("retry-after", ""))
+    except ValueError:
+        retry_after = None
+    return response.status_code, retry_after
+
+
 class FluxSchnellCommand:
     """Command handler for FLUX.1-schnell image generation"""
     
@@ -32,7 +106,8 @@ class FluxSchnellCommand:
         
         Args:
             work_dir: Directory to save generated images
-            hf_token: Hugging Face token for accessing private spaces
+            hf_token: Hugging Face token for accessing private spaces; more
+                tokens are pooled from HF_TOKENS and HF_TOKENS_FILE
         """
         self.work_dir = work_dir or os.path.join(os.getcwd(), "mcp_data")
         self.hf_token = hf_token
@@ -40,15 +115,59 @@ class FluxSchnellCommand:
         # Create working directory if it doesn't exist
         os.makedirs(self.work_dir, exist_ok=True)
         
-        # Configure Hugging Face client headers
+        # Generated images live in the sharded, quota-managed store
+        self.storage = get_storage(self.work_dir)
+        
+        # Reduced versions are built in the background after each generation
+        self.derivatives = get_derivative_builder(self.work_dir)
+        
+        # Deterministic generations are served from disk when possible
+        self.cache = ResultCache(self.work_dir, storage=self.storage)
+        
+        # Concurrent identical deterministic requests share one upstream call
+        self.in_flight = SingleFlight()
+        
+        # Caps and orders the calls that actually reach the inference API
+        self.scheduler = InferenceScheduler()
+        
+        # Transient upstream failures are retried; a down backend fails fast
+        self.retry_policy = RetryPolicy()
+        self.retries = 0
+        
+        # Calls are spread across the Hugging Face tokens, within each one's rate limit
+        self.credentials = load_credential_pool(self.hf_token)
+        
+        # Calls go to the fastest healthy backend (MCP_BACKENDS), hedged when slow
+        self.router = BackendRouter(load_backends(credentials=self.credentials))
+        
         if self.hf_token:
-            self.headers = {"Authorization": f"Bearer {self.hf_token}"}
             logger.info(f"Hugging Face token provided (length: {len(self.hf_token)})")
+        elif len(self.credentials):
+            logger.info(f"Using {len(self.credentials)} Hugging Face tokens from HF_TOKENS/HF_TOKENS_FILE")
         else:
-            self.headers = {}
             logger.warning("No Hugging Face token provided. API calls may fail for protected models.")
     
     def generate_image(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate an image using FLUX.1-schnell from synchronous code.
+        
+        Runs :meth:`generate_image_async` on a private event loop. Callers that
+        already run inside an event loop must await the async version instead.
+        
+        Args:
+            params: Generation parameters, see :meth:`generate_image_async`
+            
+        Returns:
+            Dictionary with generation results
+        """
+        async def _run():
+            try:
+                return await self.generate_image_async(params)
+            finally:
+                await close_http_client()
+        
+        return asyncio.run(_run())
+    
+    async def generate_image_async(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Generate an image using FLUX.1-schnell.
         
         Args:
@@ -59,10 +178,15 @@ class FluxSchnellCommand:
                 - num_inference_steps: Number of diffusion steps (default: 4)
                 - seed: Random seed (default: 0)
                 - randomize_seed: Whether to randomize seed (default: True)
+                - session_id: Client session, used for fair queueing (default: "default")
+                - priority: Server-assigned queue priority, higher is served first (default: 0)
+                - session_priority: Client-requested priority among the session's own calls (default: 0)
                 
         Returns:
             Dictionary with generation results:
-                - image_path: Path to saved image
+                - image_path: Path to saved image, exactly as returned upstream
+                - format: Image format of the saved file (e.g. "jpeg" or "png")
+                - sha256: Hex digest of the image file (fresh generations only)
                 - success: Whether generation was successful
                 - message: Status or error message
         """
@@ -76,51 +200,193 @@ class FluxSchnellCommand:
         num_inference_steps = params.get("num_inference_steps", DEFAULT_INFERENCE_STEPS)
         seed = params.get("seed", 0)
         randomize_seed = params.get("randomize_seed", True)
+        session_id = params.get("session_id") or "default"
+        priority = params.get("priority", PRIORITY_BATCH)
+        session_priority = params.get("session_priority", 0)
         
         # Validate parameters
         if not isinstance(width, int) or not isinstance(height, int):
             return {"success": False, "message": "Width and height must be integers"}
         
-        # Define the API URL
-        api_url = f"https://api-inference.huggingface.co/models/{DEFAULT_SPACE}"
-        
-        # Prepare the request payload
-        payload = {
-            "inputs": prompt,
-            "parameters": {
+        # Fixed-seed generations are reproducible, so they can be cached
+        cache_key = None
+        if not randomize_seed:
+            cache_key = make_cache_key(DEFAULT_SPACE, {
+                "prompt": prompt,
                 "width": width,
                 "height": height,
                 "num_inference_steps": num_inference_steps,
-                "seed": seed if not randomize_seed else None
-            }
+                "seed": seed
+            })
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Serving cached image {cached['image_id']}")
+                extension = os.path.splitext(cached["image_path"])[1].lstrip(".")
+                return {
+                    "success": True,
+                    "message": "Image served from cache",
+                    "image_path": cached["image_path"],
+                    "image_id": cached["image_id"],
+                    "format": EXTENSION_FORMATS.get(extension),
+                    "prompt": prompt,
+                    "width": width,
+                    "height": height,
+                    "cached": True,
+                    "coalesced": False
+                }
+            
+            # Later identical requests wait on the first one's upstream call
+            result, shared = await self.in_flight.do(cache_key, lambda: self._request_image(
+                prompt, width, height, num_inference_steps, seed, randomize_seed,
+                cache_key=cache_key, session_id=session_id, priority=priority,
+                session_priority=session_priority
+            ))
+            return {**result, "coalesced": shared}
+        
+        result = await self._request_image(
+            prompt, width, height, num_inference_steps, seed, randomize_seed,
+            session_id=session_id, priority=priority, session_priority=session_priority
+        )
+        return {**result, "coalesced": False}
+    
+    async def generate_batch_async(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate several images concurrently.
+        
+        Every item goes through :meth:`generate_image_async`, so the batch
+        shares the upstream scheduler, result cache and in-flight coalescing
+        with single generations.
+        
+        Args:
+            params: Dictionary containing:
+                - items: Parameter sets, one per image (each at least a prompt)
+                - prompts: Alternatively, a list of prompt strings
+                - Any generation parameter (width, height, seed, ...) as the
+                  default for items that do not set it. With randomize_seed
+                  off, items without their own seed use seed + their index so
+                  the variants differ.
+                  Items cannot set the queueing parameters (session_id,
+                  priority, session_priority).
+                
+        Returns:
+            Dictionary with one generation result per item, in order, and
+            succeeded/failed counts
+        """
+        items = params.get("items")
+        if items is None:
+            items = [{"prompt": prompt} for prompt in params.get("prompts") or []]
+        if not items:
+            return {"success": False, "message": "At least one prompt is required"}
+        if len(items) > MAX_BATCH_SIZE:
+            return {"success": False, "message": f"Batches are limited to {MAX_BATCH_SIZE} images, got {len(items)}"}
+        if not all(isinstance(item, dict) for item in items):
+            return {"success": False, "message": "Each item must be a dictionary of generation parameters"}
+        
+        defaults = {k: v for k, v in params.items() if k not in ("items", "prompts")}
+        base_seed = defaults.get("seed", 0)
+        
+        def item_params(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            merged = {**defaults, **{k: v for k, v in item.items() if k not in QUEUE_PARAMS}}
+            if not merged.get("randomize_seed", True) and "seed" not in item:
+                merged["seed"] = base_seed + index
+            return merged
+        
+        results = await asyncio.gather(
+            *(self.generate_image_async(item_params(i, item)) for i, item in enumerate(items)),
+            return_exceptions=True
+        )
+        results = [
+            r if not isinstance(r, BaseException) else {"success": False, "message": f"Error generating image: {str(r)}"}
+            for r in results
+        ]
+        
+        succeeded = sum(1 for r in results if r.get("success"))
+        return {
+            "success": succeeded > 0,
+            "message": f"Generated {succeeded} of {len(results)} images",
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
         }
+    
+    async def _request_image(
+        self,
+        prompt: str,
+        width: int,
+        height: int,
+        num_inference_steps: int,
+        seed: int,
+        randomize_seed: bool,
+        cache_key: str = None,
+        session_id: str = "default",
+        priority: int = PRIORITY_BATCH,
+        session_priority: int = 0
+    ) -> Dict[str, Any]:
+        """Call the inference API and store the generated image.
         
-        # Remove None values from payload
-        payload["parameters"] = {k: v for k, v in payload["parameters"].items() if v is not None}
+        Args:
+            prompt: Text prompt for image generation
+            width: Image width
+            height: Image height
+            num_inference_steps: Number of diffusion steps
+            seed: Random seed, ignored when randomize_seed is set
+            randomize_seed: Whether to let the backend pick the seed
+            cache_key: Result cache key to store the image under, if any
+            session_id: Client session the call is queued for
+            priority: Server-assigned queue priority, higher is served first
+            session_priority: Client-requested priority among the session's own calls
+            
+        Returns:
+            Dictionary with generation results
+        """
+        # Backends translate these into their own request format
+        request = {
+            "prompt": prompt,
+            "width": width,
+            "height": height,
+            "num_inference_steps": num_inference_steps,
+            "seed": seed if not randomize_seed else None
+        }
         
+        download = None
         try:
-            # Make the API request
-            response = requests.post(api_url, headers=self.headers, json=payload)
+            response, download, backend, credential = await self._call_upstream(
+                request, session_id, priority, session_priority)
             
             # Check for errors
             if response.status_code != 200:
-                error_msg = f"API request failed with status {response.status_code}: {response.text}"
+                error_msg = f"API request to {backend.name} failed with status {response.status_code}: {response.text}"
                 
                 if response.status_code == 401:
-                    error_msg = "Authentication failed: Invalid or missing Hugging Face token. Please check your HF_TOKEN environment variable."
-                    logger.error(f"HF Token authentication error. Token length: {len(self.hf_token) if self.hf_token else 0}")
+                    error_msg = f"Authentication failed for backend {backend.name}: Invalid or missing token. Please check your HF_TOKEN/HF_TOKENS environment variables or the backend's token_env."
+                    token = f"pooled token {credential}" if credential else f"token length {len(backend.token or '')}"
+                    logger.error(f"Authentication error on {backend.name} ({token})")
                 
                 logger.error(error_msg)
                 return {"success": False, "message": error_msg}
             
-            # Generate a unique filename
+            # Keep the upstream encoding instead of decoding and re-saving it
+            image_format = sniff_image_format(download["head"])
+            if image_format is None:
+                error_msg = f"API returned an unrecognized image ({response.headers.get('content-type', 'unknown type')})"
+                logger.error(error_msg)
+                return {"success": False, "message": error_msg}
+            
+            # Validate the dimensions from the header only, without a full decode
+            with metrics.phase("decode"):
+                actual_width, actual_height = await asyncio.to_thread(read_image_size, download["path"])
+            if (actual_width, actual_height) != (width, height):
+                logger.warning(f"Requested {width}x{height} but received {actual_width}x{actual_height}")
+            
+            # Generate a unique filename and move the finished download into its shard
             image_id = uuid.uuid4().hex
-            image_filename = f"flux_image_{image_id}.png"
-            image_path = os.path.join(self.work_dir, image_filename)
+            image_filename = f"flux_image_{image_id}.{IMAGE_EXTENSIONS[image_format]}"
+            image_path = await asyncio.to_thread(self._store, image_id, image_filename, download["path"])
+            download_sha256, download_size = download["sha256"], download["size"]
+            download = None
             
-            # Save the image
-            image = Image.open(BytesIO(response.content))
-            image.save(image_path)
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, cache_key, image_id, image_path)
+            self.derivatives.schedule(image_id, image_path)
             
             # Return the result
             return {
@@ -128,15 +394,260 @@ class FluxSchnellCommand:
                 "message": "Image generated successfully",
                 "image_path": image_path,
                 "image_id": image_id,
+                "format": image_format,
+                "sha256": download_sha256,
+                "size": download_size,
                 "prompt": prompt,
-                "width": width,
-                "height": height
+                "width": actual_width,
+                "height": actual_height,
+                "backend": backend.name,
+                "cached": False
             }
             
+        except SchedulerRejectedError as e:
+            logger.warning(f"Rejected generation request: {str(e)}")
+            return {"success": False, "message": f"Server busy: {str(e)}"}
+            
+        except CircuitOpenError as e:
+            logger.warning(f"Failing fast: {str(e)}")
+            return {"success": False, "message": str(e)}
+            
+        except CredentialsExhaustedError as e:
+            if e.refused:
+                logger.error(str(e))
+            else:
+                logger.warning(f"Out of upstream capacity: {str(e)}")
+            return {"success": False, "message": str(e)}
+            
         except Exception as e:
             error_msg = f"Error generating image: {str(e)}"
             logger.error(error_msg)
             return {"success": False, "message": error_msg}
+            
+        finally:
+            # Never leave partial or rejected downloads behind
+            if download is not None:
+                self._discard(download["path"])
+    
+    async def _call_upstream(
+        self,
+        request: Dict[str, Any],
+        session_id: str,
+        priority: int,
+        session_priority: int
+    ) -> Tuple[httpx.Response, Optional[Dict[str, Any]], Any, Optional[str]]:
+        """Send a generation to the best backend, retrying transient failures.
+        
+        Model-loading 503s and 429s wait as long as the backend asks; other
+        transient failures back off exponentially with jitter. A 429 or an
+        auth failure on a pooled token is retried at once when another
+        token is ready. Each attempt is routed afresh, so a retry may go to
+        another backend, and a slow attempt may be hedged on a second
+        backend. Retries stop when the next one could not finish within the
+        tool timeout. A successful image is streamed to a temporary file
+        rather than buffered.
+        
+        Args:
+            request: Generation parameters (prompt, width, height,
+                num_inference_steps, seed)
+            session_id: Client session the call is queued for
+            priority: Server-assigned queue priority, higher is served first
+            session_priority: Client-requested priority among the session's own calls
+            
+        Returns:
+            The last response, successful or not, for a 200 the download
+            (see :meth:`_download`), the backend that answered and the name
+            of the pooled token it was sent with, if any
+            
+        Raises:
+            CircuitOpenError: If every backend is considered down
+            CredentialsExhaustedError: If no pooled token became ready in time
+            SchedulerRejectedError: If the upstream queue rejects the call
+            httpx.TransportError: If the final attempt failed to connect
+        """
+        start = time.monotonic()
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            
+            # Wait for an upstream slot; a hedged attempt shares its slot
+            queued = time.perf_counter()
+            async with self.scheduler.slot(session_id, priority, session_priority):
+                metrics.record_phase("queue", time.perf_counter() - queued)
+                with metrics.phase("upstream"):
+                    outcome = await self.router.call(
+                        lambda state: self._attempt(state, request),
+                        is_success=lambda outcome: outcome["download"] is not None,
+                        discard=lambda outcome: self._discard(outcome["download"]["path"])
+                    )
+            
+            response, status, body = outcome["response"], outcome["status"], outcome["body"]
+            credentials = outcome["backend"].backend.credentials
+            other_token = (status in (401, 403, 429) and credentials is not None
+                           and len(credentials) > 1 and credentials.ready())
+            if not (self.retry_policy.is_retryable(status) or other_token) or attempt >= self.retry_policy.max_attempts:
+                break
+            
+            if other_token:
+                delay = 0.0
+            else:
+                delay = self.retry_policy.next_delay(
+                    attempt, status, response.headers if response is not None else None, body
+                )
+            if time.monotonic() - start + delay >= self.retry_policy.deadline:
+                break
+            
+            reason = f"status {status}" if status is not None else str(outcome["error"])
+            logger.warning(f"Upstream attempt {attempt} on {outcome['backend'].name} failed ({reason}), retrying in {delay:.1f}s")
+            self.retries += 1
+            await asyncio.sleep(delay)
+        
+        if response is None:
+            raise outcome["error"]
+        return response, outcome["download"], outcome["backend"].backend, outcome["credential"]
+    
+    async def _attempt(self, state: BackendState, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Make one call to one backend and record its outcome.
+        
+        Args:
+            state: Backend to call, with its breaker and statistics
+            request: Generation parameters
+            
+        Returns:
+            Dictionary with the backend, response (None after a transport
+            error), status, decoded JSON body of a 503, the download for a
+            200 and the transport error, if any
+            
+        Raises:
+            CircuitOpenError: If the backend is considered down
+            CredentialsExhaustedError: If none of its pooled tokens became ready in time
+        """
+        backend = state.backend
+        state.breaker.before_call()
+        url, payload = backend.request(request)
+        response = None
+        download = None
+        error = None
+        
+        # Borrow the pooled token with the most headroom, waiting if all are throttled
+        credential = None
+        if backend.credentials is not None:
+            try:
+                credential = await backend.credentials.acquire()
+            except BaseException:
+                state.breaker.release()
+                raise
+        
+        state.in_flight += 1
+        started = time.perf_counter()
+        try:
+            client = get_http_client()
+            async with client.stream("POST", url, headers=backend.headers(credential), json=payload) as response:
+                if response.status_code == 200:
+                    download = await backend.read_image(client, response, self._download)
+                else:
+                    await response.aread()
+        except httpx.TransportError as e:
+            # A body cut off mid-stream is as transient as a failed connect
+            response = None
+            error = e
+        except asyncio.CancelledError:
+            # Lost a hedging race, or the whole call was abandoned
+            state.breaker.release()
+            state.record_cancelled(time.perf_counter() - started)
+            raise
+        except BaseException:
+            state.breaker.release()
+            state.record(time.perf_counter() - started, ok=False)
+            raise
+        finally:
+            state.in_flight -= 1
+            if credential is not None:
+                backend.credentials.release(credential, *_token_outcome(response))
+        elapsed = time.perf_counter() - started
+        
+        status = response.status_code if response is not None else None
+        body = None
+        if status == 503:
+            try:
+                body = response.json()
+            except ValueError:
+                pass
+        
+        # Throttling and model loading say nothing about backend health,
+        # but they do make the backend a poor choice for now
+        if status == 429 or (status == 503 and isinstance(body, dict) and "estimated_time" in body):
+            state.breaker.release()
+            state.record(elapsed, ok=False)
+        elif status is None or status >= 500:
+            state.breaker.record_failure()
+            state.record(elapsed, ok=False)
+        elif status >= 400:
+            # The backend is up but refuses the call (bad token, unknown
+            # model): not an outage, but not a backend to send calls to
+            state.breaker.release()
+            state.record(elapsed, ok=False)
+        else:
+            state.breaker.record_success()
+            state.record(elapsed, ok=True)
+        
+        return {"backend": state, "credential": credential.name if credential is not None else None,
+                "response": response, "status": status, "body": body,
+                "download": download, "error": error}
+    
+    async def _download(self, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Stream an image body to a temporary file, hashing it as it arrives.
+        
+        Args:
+            chunks: The body, e.g. a 200 response's ``aiter_bytes()``
+            
+        Returns:
+            Dictionary with the temporary file path, sha256 digest, size and
+            the first bytes of the body (for format detection)
+        """
+        temp_path = self.storage.temp_path(f"flux_{uuid.uuid4().hex}.part")
+        hasher = hashlib.sha256()
+        size = 0
+        head = b""
+        
+        temp_file = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                hasher.update(chunk)
+                await asyncio.to_thread(temp_file.write, chunk)
+        except BaseException:
+            temp_file.close()
+            self._discard(temp_path)
+            raise
+        await asyncio.to_thread(temp_file.close)
+        metrics.add_bytes("upstream", size)
+        
+        return {"path": temp_path, "sha256": hasher.hexdigest(), "size": size, "head": head}
+    
+    def backend_stats(self) -> Dict[str, Any]:
+        """Get retry, routing and per-backend statistics"""
+        return {"retries": self.retries, **self.router.stats()}
+    
+    def _store(self, image_id: str, image_filename: str, temp_path: str) -> str:
+        """Atomically move a finished download into the store and index it."""
+        image_path = self.storage.allocate_path(image_id, image_filename)
+        os.replace(temp_path, image_path)
+        self.storage.add(image_id, image_path, kind="flux_image")
+        return image_path
+    
+    @staticmethod
+    def _discard(path: str) -> None:
+        """Remove a temporary file, ignoring errors."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
     
     def get_image_base64(self, image_path: str) -> str:
         """Get the base64 encoded content of an image.
@@ -155,12 +666,44 @@ class FluxSchnellCommand:
             logger.error(f"Error encoding image: {str(e)}")
             return ""
 
-# Create a singleton instance of the command
-hf_token = os.environ.get("HF_TOKEN")
-if not hf_token:
-    logger.warning("HF_TOKEN environment variable not set. API calls may fail for protected models.")
+# Singleton instance of the command, created on first use
+_flux_schnell_command = None
+
+def get_flux_schnell_command() -> FluxSchnellCommand:
+    """Get or create the FLUX.1-schnell command singleton"""
+    global _flux_schnell_command
+    
+    if _flux_schnell_command is None:
+        hf_token = os.environ.get("HF_TOKEN")
+        if not hf_token and not (os.environ.get("HF_TOKENS") or os.environ.get("HF_TOKENS_FILE")):
+            logger.warning("HF_TOKEN environment variable not set. API calls may fail for protected models.")
+        
+        _flux_schnell_command = FluxSchnellCommand(
+            work_dir=os.environ.get("MCP_WORK_DIR"),
+            hf_token=hf_token
+        )
+        
+        registry.add_stats_provider("flux_cache", _flux_schnell_command.cache.stats)
+        registry.add_stats_provider("flux_in_flight", _flux_schnell_command.in_flight.stats)
+        registry.add_stats_provider("flux_scheduler", _flux_schnell_command.scheduler.stats)
+        registry.add_stats_provider("flux_backend", _flux_schnell_command.backend_stats)
+        registry.add_stats_provider("flux_tokens", _flux_schnell_command.credentials.stats)
+    
+    return _flux_schnell_command
+
+
+def __getattr__(name):
+    """Keep ``flux_schnell_command`` importable without building it at import time"""
+    if name == "flux_schnell_command":
+        return get_flux_schnell_command()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def flux_generate_image(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for flux_generate_image"""
+    return await get_flux_schnell_command().generate_image_async(params)
+
 
-flux_schnell_command = FluxSchnellCommand(
-    work_dir=os.environ.get("MCP_WORK_DIR"),
-    hf_token=hf_token
-)
+async def flux_generate_batch(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for flux_generate_batch"""
+    return await get_flux_schnell_command().generate_batch_async(params)
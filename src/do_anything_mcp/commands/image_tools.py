@@ -0,0 +1,131 @@
+"""
+Image post-processing commands: resize, crop, format conversion and compositing.
+
+Each command works on images in the work directory store (generated
+images, uploads or earlier outputs, by id) and runs its PIL work in the
+image process pool, so several calls use several cores and none of them
+holds up the server. Outputs are stored under the SHA-256 of their encoded
+bytes, like uploads, so repeating an operation finds the stored result
+instead of keeping a second copy.
+"""
+
+import os
+import uuid
+import logging
+from typing import Any, Dict, List
+
+from .derivatives import EXTENSIONS
+from ..storage import get_storage
+
+# Configure logging
+logger = logging.getLogger("ImageTools")
+
+# Constants
+MIN_QUALITY = 1
+MAX_QUALITY = 100
+
+
+def _transform(operation: str, image_ids: List[str], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Run an image operation in the pool and store its output"""
+    from .. import image_ops
+    from ..image_pool import get_image_pool
+    from ..metrics import metrics
+
+    if not all(image_ids):
+        return {"success": False, "message": "Image id is required"}
+    storage = get_storage()
+    paths = []
+    for image_id in image_ids:
+        path = storage.get_path(image_id)
+        if path is None:
+            return {"success": False, "message": f"Unknown image: {image_id}"}
+        paths.append(path)
+
+    output_format = params.get("format")
+    if output_format == "jpg":
+        output_format = "jpeg"
+    if output_format is not None and output_format not in image_ops.OUTPUT_FORMATS:
+        return {"success": False, "message": f"Unsupported output format: {output_format}"}
+    quality = params.get("quality", image_ops.DEFAULT_QUALITY)
+    if not isinstance(quality, int) or not MIN_QUALITY <= quality <= MAX_QUALITY:
+        return {"success": False, "message": f"Quality must be between {MIN_QUALITY} and {MAX_QUALITY}"}
+
+    temp_path = storage.temp_path(f"image_{uuid.uuid4().hex}.part")
+    try:
+        with metrics.phase("transform"):
+            info = get_image_pool().call(image_ops.transform_file, operation, paths, params, temp_path, output_format, quality)
+    except ValueError as e:
+        _discard(temp_path)
+        return {"success": False, "message": str(e)}
+    except Exception as e:
+        _discard(temp_path)
+        logger.error(f"Error in image {operation}: {str(e)}")
+        return {"success": False, "message": f"Failed to {operation} image: {str(e)}"}
+    metrics.add_bytes("transform", info["size"])
+
+    # Identical output is stored once
+    image_id = info["sha256"]
+    image_path = storage.get_path(image_id)
+    deduplicated = image_path is not None
+    if deduplicated:
+        _discard(temp_path)
+    else:
+        image_path = storage.allocate_path(image_id, f"image_{image_id}.{EXTENSIONS[info['format']]}")
+        os.replace(temp_path, image_path)
+        storage.add(image_id, image_path, kind=f"image_{operation}")
+
+    return {
+        "success": True,
+        "message": f"Image {operation} complete",
+        "image_id": image_id,
+        "image_path": image_path,
+        "format": info["format"],
+        "width": info["width"],
+        "height": info["height"],
+        "size": info["size"],
+        "deduplicated": deduplicated,
+    }
+
+
+def _discard(path: str) -> None:
+    """Remove a temporary file, ignoring errors"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _option(params: Dict[str, Any], *names: str) -> Dict[str, Any]:
+    """Pick the operation parameters that were given"""
+    return {name: params[name] for name in names if params.get(name) is not None}
+
+
+def image_resize(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Resize an image to fit a width and/or height (exactly, with keep_aspect false)"""
+    return _transform("resize", [params.get("image_id")], {
+        **_option(params, "width", "height", "keep_aspect"),
+        **_option(params, "format", "quality"),
+    })
+
+
+def image_crop(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Crop an image to a pixel box (left, top, right, bottom)"""
+    return _transform("crop", [params.get("image_id")], {
+        **_option(params, "left", "top", "right", "bottom"),
+        **_option(params, "format", "quality"),
+    })
+
+
+def image_convert(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-encode an image as png, jpeg or webp"""
+    if not params.get("format"):
+        return {"success": False, "message": "Format is required"}
+    return _transform("convert", [params.get("image_id")], _option(params, "format", "quality"))
+
+
+def image_composite(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Draw one image over another at a position, with optional opacity and scaling"""
+    return _transform("composite", [params.get("image_id"), params.get("overlay_id")], {
+        **_option(params, "x", "y", "opacity", "overlay_width"),
+        **_option(params, "format", "quality"),
+    })
@@ -0,0 +1,340 @@
+"""
+Background jobs for long-running commands.
+
+A job runs a command in the background and is tracked by id, so a client
+can submit a generation, do other work and come back for the result
+instead of holding a tool call open until it times out. Jobs are recorded
+in an SQLite database in the working directory as they are submitted and
+finish, so finished results survive a reconnect or restart. Jobs that were
+still running in a process that has since exited are reported as
+interrupted. Finished jobs are forgotten after MCP_JOB_MAX_AGE.
+
+The database can be busy with other server processes, so the event loop
+never touches it: submissions and job updates go through a worker thread
+and the status commands are registered as blocking.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+# Configure logging
+logger = logging.getLogger("JobManager")
+
+# Constants
+INDEX_FILENAME = "jobs.sqlite3"
+DEFAULT_MAX_ACTIVE = 64
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60  # 7 days
+PURGE_INTERVAL = 60 * 60
+# Commands that must not be run as jobs themselves
+JOB_COMMANDS = {"job_submit", "job_status", "job_result"}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+FINISHED_STATES = (SUCCEEDED, FAILED, INTERRUPTED)
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this id exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class JobManager:
+    """Runs commands as background jobs and keeps their outcomes"""
+
+    def __init__(self, work_dir: str, max_active: int = None, max_age: float = None):
+        """Initialize the job manager.
+
+        Args:
+            work_dir: Directory holding the job database
+            max_active: Jobs queued or running at once before new ones are rejected
+                (default: MCP_MAX_JOBS or 64)
+            max_age: Seconds a finished job is kept (default: MCP_JOB_MAX_AGE or 7 days)
+        """
+        self.work_dir = work_dir
+        self.max_active = max_active or int(os.environ.get("MCP_MAX_JOBS", DEFAULT_MAX_ACTIVE))
+        self.max_age = max_age if max_age is not None else float(
+            os.environ.get("MCP_JOB_MAX_AGE", DEFAULT_MAX_AGE))
+
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Submissions between the capacity check and their task starting
+        self._reserved = 0
+        self._lock = threading.Lock()
+        self._db = None
+        self._last_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the job database on first use"""
+        if self._db is None:
+            os.makedirs(self.work_dir, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(self.work_dir, INDEX_FILENAME),
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            # WAL lets several server processes share one work directory
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " command TEXT NOT NULL,"
+                " params TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " owner_pid INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " started REAL,"
+                " finished REAL,"
+                " message TEXT,"
+                " result TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)")
+        return self._db
+
+    async def submit(self, connection, command: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Start a command in the background.
+
+        Args:
+            connection: Connection the command is executed through
+            command: Registered command name
+            params: Parameters for the command
+
+        Returns:
+            Dictionary with the job id and status
+        """
+        from .registry import registry
+
+        if command in JOB_COMMANDS:
+            return {"success": False, "message": f"{command} cannot run as a job"}
+        if command not in registry.names():
+            return {"success": False, "message": f"Command not implemented: {command}"}
+        active = len(self._tasks) + self._reserved
+        if active >= self.max_active:
+            self.rejected += 1
+            return {"success": False, "message": f"Too many active jobs ({active}), try again later"}
+
+        job_id = uuid.uuid4().hex
+        self._reserved += 1
+        try:
+            await asyncio.to_thread(self._insert, job_id, command, params)
+        finally:
+            self._reserved -= 1
+
+        task = asyncio.get_running_loop().create_task(self._run(connection, job_id, command, params))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        self.submitted += 1
+        logger.info(f"Submitted job {job_id} ({command})")
+
+        return {"success": True, "message": "Job submitted", "job_id": job_id, "command": command, "status": QUEUED}
+
+    def _insert(self, job_id: str, command: str, params: Dict[str, Any]) -> None:
+        """Record a new job, purging expired ones first"""
+        self._purge_expired()
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs (id, command, params, status, owner_pid, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, command, json.dumps(params, default=str), QUEUED, os.getpid(), time.time())
+            )
+
+    async def _run(self, connection, job_id: str, command: str, params: Dict[str, Any]) -> None:
+        """Execute a job's command and record its outcome"""
+        from .registry import registry
+
+        try:
+            await asyncio.to_thread(self._update, job_id, status=RUNNING, started=time.time())
+            result = await registry.execute_async(connection, command, params)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self._update, job_id, status=INTERRUPTED, finished=time.time(),
+                                    message="Server shut down before the job finished")
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.failed += 1
+            await asyncio.to_thread(self._update, job_id, status=FAILED, finished=time.time(),
+                                    message=f"Error running {command}: {str(e)}")
+            return
+
+        succeeded = not isinstance(result, dict) or result.get("success", True) is not False
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        message = result.get("message") if isinstance(result, dict) else None
+        await asyncio.to_thread(
+            self._update,
+            job_id,
+            status=SUCCEEDED if succeeded else FAILED,
+            finished=time.time(),
+            message=message,
+            result=json.dumps(result, default=str)
+        )
+
+    def _update(self, job_id: str, **fields) -> None:
+        """Write changed job fields"""
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connect().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Read a job, settling it as interrupted if its process is gone"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, command, status, owner_pid, created, started, finished, message, result"
+                " FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        job = dict(zip(("job_id", "command", "status", "owner_pid", "created", "started", "finished", "message", "result"), row))
+        if job["status"] not in FINISHED_STATES and job_id not in self._tasks:
+            owner = job["owner_pid"]
+            if owner == os.getpid() or not _pid_alive(owner):
+                job.update(status=INTERRUPTED, finished=time.time(), message="The server restarted before the job finished")
+                self._update(job_id, status=INTERRUPTED, finished=job["finished"], message=job["message"])
+        return job
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """Get the state of a job.
+
+        Args:
+            job_id: Id returned by :meth:`submit`
+
+        Returns:
+            Dictionary with the job's status, timestamps and message
+        """
+        job = self._load(job_id)
+        if job is None:
+            return {"success": False, "message": f"Unknown job: {job_id}"}
+
+        end = job["finished"] or time.time()
+        return {
+            "success": True,
+            "job_id": job_id,
+            "command": job["command"],
+            "status": job["status"],
+            "done": job["status"] in FINISHED_STATES,
+            "created": job["created"],
+            "started": job["started"],
+            "finished": job["finished"],
+            "elapsed_seconds": round(end - (job["started"] or job["created"]), 3),
+            "message": job["message"] or f"Job is {job['status']}",
+        }
+
+    def result(self, job_id: str) -> Dict[str, Any]:
+        """Get the result of a finished job.
+
+        Args:
+            job_id: Id returned by :meth:`submit`
+
+        Returns:
+            The status (see :meth:`status`) with the command's result under
+            "result" once the job has finished
+        """
+        status = self.status(job_id)
+        if not status["success"] or not status["done"]:
+            return status
+        job = self._load(job_id)
+        status["result"] = json.loads(job["result"]) if job["result"] else None
+        return status
+
+    def _purge_expired(self) -> None:
+        """Forget finished jobs past their maximum age, at most once per PURGE_INTERVAL"""
+        now = time.time()
+        if not self.max_age or now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        with self._lock:
+            deleted = self._connect().execute(
+                "DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (now - self.max_age,)
+            ).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} expired jobs")
+
+    async def close(self) -> None:
+        """Cancel the running jobs, recording them as interrupted"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get job counters"""
+        return {
+            "active": len(self._tasks),
+            "max_active": self.max_active,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+# Lazily created manager for the default work directory
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager(work_dir: str = None) -> JobManager:
+    """Get or create the job manager singleton.
+
+    Args:
+        work_dir: Work directory, used when the manager is first created
+            (default: MCP_WORK_DIR or ./mcp_data)
+    """
+    global _job_manager
+
+    if _job_manager is None:
+        from .registry import registry
+
+        _job_manager = JobManager(
+            work_dir or os.environ.get("MCP_WORK_DIR", os.path.join(os.getcwd(), "mcp_data"))
+        )
+        registry.add_stats_provider("jobs", _job_manager.stats)
+
+    return _job_manager
+
+
+async def close_job_manager() -> None:
+    """Interrupt the running jobs, if the job manager was ever used"""
+    if _job_manager is not None:
+        await _job_manager.close()
+
+
+async def job_submit(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for job_submit"""
+    command = params.get("command")
+    if not command:
+        return {"success": False, "message": "Command is required"}
+    return await get_job_manager().submit(connection, command, params.get("params") or {})
+
+
+def job_status(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for job_status"""
+    return get_job_manager().status(params.get("job_id", ""))
+
+
+def job_result(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for job_result"""
+    return get_job_manager().result(params.get("job_id", ""))
@@ -0,0 +1,373 @@
+"""
+Pool of sandboxed Python worker processes for execute_python_code.
+
+Workers (see ``sandbox_worker.py``) are started ahead of time with common
+modules already imported, so a call only pays for running its code. Each
+worker runs under a memory limit (RLIMIT_AS) and a hard CPU time limit
+(RLIMIT_CPU) covering all of its runs; each run also gets a CPU allowance
+through the soft limit, and the pool enforces a wall-time limit by killing
+the worker. Workers are pinned round-robin to CPU cores where the platform
+allows it, and recycled after a number of runs or as soon as a run hits a
+limit or crashes.
+
+This is process isolation with resource limits, not a security boundary:
+the code runs as the server's user, with a scrubbed environment and its
+own working directory, and can read and write whatever that user can.
+Code execution is therefore off unless MCP_SANDBOX_WORKERS is set.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import weakref
+from typing import Any, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger("PythonSandbox")
+
+# Constants
+WORKER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sandbox_worker.py")
+DEFAULT_MAX_RUNS = 50
+DEFAULT_CPU_SECONDS = 10.0
+DEFAULT_MEMORY_MB = 512
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_PRELOAD = "json,math,re,random,statistics,datetime,collections,itertools,functools,decimal,fractions"
+SPAWN_TIMEOUT = 30.0
+# Seconds to wait for a killed worker to be reaped
+KILL_TIMEOUT = 5.0
+RESPAWN_DELAY = 1.0
+# Longest response line read from a worker; workers truncate their output to fit
+MAX_RESPONSE_BYTES = 1024 * 1024
+
+
+class SandboxError(Exception):
+    """Raised when a sandbox worker cannot be started or talked to"""
+
+
+class _Worker:
+    """A running worker process"""
+
+    def __init__(self, index: int, process: asyncio.subprocess.Process, work_dir: str):
+        self.index = index
+        self.process = process
+        self.work_dir = work_dir
+        self.runs = 0
+
+    async def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request and wait for its response"""
+        self.runs += 1
+        self.process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+        await self.process.stdin.drain()
+        line = await self.process.stdout.readline()
+        if not line:
+            raise SandboxError("Worker exited")
+        return json.loads(line)
+
+    def kill(self) -> None:
+        """Stop the worker immediately"""
+        if self.process.returncode is None:
+            try:
+                self.process.kill()
+            except ProcessLookupError:
+                pass
+
+
+class SandboxPool:
+    """Pre-started worker processes with resource limits and recycling"""
+
+    def __init__(
+        self,
+        size: int = None,
+        max_runs: int = None,
+        cpu_seconds: float = None,
+        memory_mb: int = None,
+        timeout: float = None,
+        max_queue: int = None,
+        preload: List[str] = None,
+        work_dir: str = None
+    ):
+        """Initialize the pool; workers are started by :meth:`start` or the first call.
+
+        Args:
+            size: Number of workers (default: MCP_SANDBOX_WORKERS or 0);
+                0 disables code execution
+            max_runs: Runs before a worker is replaced (default: MCP_SANDBOX_MAX_RUNS or 50)
+            cpu_seconds: CPU time allowed per run (default: MCP_SANDBOX_CPU_SECONDS or 10)
+            memory_mb: Address space limit per worker in MiB (default: MCP_SANDBOX_MEMORY_MB or 512)
+            timeout: Default wall time per run in seconds (default: MCP_SANDBOX_TIMEOUT or 30)
+            max_queue: Calls waiting for a worker before new ones are rejected (default: MCP_SANDBOX_MAX_QUEUE or 64)
+            preload: Modules imported when a worker starts (default: MCP_SANDBOX_PRELOAD or common stdlib modules)
+            work_dir: Parent of the workers' working directories (default: MCP_WORK_DIR/sandbox)
+        """
+        self.size = size if size is not None else int(os.environ.get("MCP_SANDBOX_WORKERS", 0))
+        self.max_runs = max_runs or int(os.environ.get("MCP_SANDBOX_MAX_RUNS", DEFAULT_MAX_RUNS))
+        self.cpu_seconds = cpu_seconds or float(os.environ.get("MCP_SANDBOX_CPU_SECONDS", DEFAULT_CPU_SECONDS))
+        self.memory_mb = memory_mb or int(os.environ.get("MCP_SANDBOX_MEMORY_MB", DEFAULT_MEMORY_MB))
+        self.timeout = timeout or float(os.environ.get("MCP_SANDBOX_TIMEOUT", DEFAULT_TIMEOUT))
+        self.max_queue = max_queue or int(os.environ.get("MCP_SANDBOX_MAX_QUEUE", DEFAULT_MAX_QUEUE))
+        if preload is None:
+            preload = [m.strip() for m in os.environ.get("MCP_SANDBOX_PRELOAD", DEFAULT_PRELOAD).split(",") if m.strip()]
+        self.preload = preload
+        self.work_dir = work_dir or os.path.join(
+            os.environ.get("MCP_WORK_DIR", os.path.join(os.getcwd(), "mcp_data")), "sandbox")
+
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._workers: Dict[int, _Worker] = {}
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        self._closed = False
+        self._tasks = set()
+
+        self.started_at = None
+        self.waiting = 0
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.limit_hits = {"cpu": 0, "memory": 0}
+        self.crashes = 0
+        self.recycled = 0
+        self.avg_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    async def start(self) -> None:
+        """Start all workers, if not started yet"""
+        async with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            self.started_at = time.monotonic()
+            results = await asyncio.gather(*(self._spawn(i) for i in range(self.size)), return_exceptions=True)
+            for index, result in enumerate(results):
+                if isinstance(result, BaseException):
+                    logger.error(f"Failed to start sandbox worker {index}: {str(result)}")
+                    self._respawn_later(index)
+            logger.info(f"Sandbox pool started with {len(self._workers)} of {self.size} workers")
+
+    async def _spawn(self, index: int) -> _Worker:
+        """Start a worker and make it available"""
+        work_dir = os.path.join(self.work_dir, f"worker-{index}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir, exist_ok=True)
+
+        config = {
+            "memory_bytes": self.memory_mb * 1024 * 1024,
+            # Worst case of every run using its full allowance; the worker is killed past it
+            "cpu_budget": self.max_runs * self.cpu_seconds,
+            "preload": self.preload,
+            # Leave room for the newline ending the response
+            "max_response_bytes": MAX_RESPONSE_BYTES - 1,
+        }
+        # Nothing from the server's environment (tokens in particular) reaches user code
+        env = {"PATH": os.environ.get("PATH", ""), "HOME": work_dir, "TMPDIR": work_dir, "LANG": "C.UTF-8"}
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-I", WORKER_PATH, json.dumps(config),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=work_dir,
+            env=env,
+            limit=MAX_RESPONSE_BYTES
+        )
+        worker = _Worker(index, process, work_dir)
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), SPAWN_TIMEOUT)
+            if not line or not json.loads(line).get("ready"):
+                raise SandboxError("Worker did not report ready")
+        except BaseException:
+            worker.kill()
+            raise
+
+        # Spread workers over the cores, continuing where the pools of
+        # lower-numbered server worker processes left off
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                cores = sorted(os.sched_getaffinity(0))
+                offset = int(os.environ.get("MCP_WORKER_INDEX", 0)) * self.size
+                os.sched_setaffinity(process.pid, {cores[(offset + index) % len(cores)]})
+            except OSError as e:
+                logger.debug(f"Could not pin sandbox worker {index}: {str(e)}")
+
+        self._workers[index] = worker
+        self._idle.put_nowait(worker)
+        return worker
+
+    def _respawn_later(self, index: int) -> None:
+        """Replace a worker in the background"""
+        if self._closed:
+            return
+
+        async def respawn():
+            delay = 0.0
+            while not self._closed:
+                await asyncio.sleep(delay)
+                try:
+                    await self._spawn(index)
+                    return
+                except Exception as e:
+                    logger.error(f"Failed to restart sandbox worker {index}: {str(e)}")
+                    delay = RESPAWN_DELAY
+
+        task = asyncio.get_running_loop().create_task(respawn())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _retire(self, worker: _Worker) -> None:
+        """Kill a worker and start its replacement"""
+        worker.kill()
+        self._workers.pop(worker.index, None)
+        self.recycled += 1
+        self._respawn_later(worker.index)
+
+    async def execute(self, code: str, timeout: float = None) -> Dict[str, Any]:
+        """Run code on an idle worker.
+
+        Args:
+            code: Python source to execute
+            timeout: Wall time limit in seconds (default: the pool's timeout)
+
+        Returns:
+            Dictionary with success, stdout, stderr, the repr of a trailing
+            expression as result, and error details on failure
+        """
+        if self.size <= 0:
+            return {"success": False, "message": "Python execution is disabled (MCP_SANDBOX_WORKERS=0)"}
+        if not self._started:
+            await self.start()
+        if self._closed:
+            return {"success": False, "message": "Sandbox pool is closed"}
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            return {"success": False, "message": f"Sandbox busy ({self.waiting} calls waiting)"}
+
+        timeout = min(timeout or self.timeout, self.timeout)
+        queued = time.monotonic()
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        self._record_wait(time.monotonic() - queued)
+
+        # A worker that died while idle is replaced and the call retried
+        if worker.process.returncode is not None:
+            self.crashes += 1
+            self._retire(worker)
+            return await self.execute(code, timeout)
+
+        self.busy += 1
+        started = time.monotonic()
+        recycle = True
+        try:
+            response = await asyncio.wait_for(worker.run({"code": code, "cpu_seconds": self.cpu_seconds}), timeout)
+            recycle = response.get("limit") is not None or worker.runs >= self.max_runs
+            if response.get("limit"):
+                self.limit_hits[response["limit"]] += 1
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            response = {"success": False, "error": f"Wall time limit of {timeout:.0f}s exceeded",
+                        "error_type": "TimeoutError", "limit": "wall"}
+        except (SandboxError, ConnectionError, ValueError) as e:
+            # Killed by the kernel (hard limits), otherwise gone, or sent an
+            # oversized response and may still be running
+            worker.kill()
+            try:
+                await asyncio.wait_for(worker.process.wait(), KILL_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Sandbox worker {worker.index} did not exit after being killed")
+            self.crashes += 1
+            response = {"success": False, "error": f"Worker crashed (exit code {worker.process.returncode}): {str(e)}",
+                        "error_type": "WorkerCrashed", "limit": None}
+        finally:
+            self.busy -= 1
+            self.busy_seconds += time.monotonic() - started
+            self.runs += 1
+            if recycle:
+                self._retire(worker)
+            else:
+                self._idle.put_nowait(worker)
+
+        if not response.get("success"):
+            self.failures += 1
+        response["message"] = "Code executed successfully" if response.get("success") else "Code execution failed"
+        response["wall_seconds"] = round(time.monotonic() - started, 4)
+        return response
+
+    def _record_wait(self, seconds: float) -> None:
+        """Update queue wait statistics"""
+        self.avg_wait_time += 0.2 * (seconds - self.avg_wait_time)
+        self.max_wait_time = max(self.max_wait_time, seconds)
+
+    async def close(self) -> None:
+        """Stop all workers"""
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        for worker in list(self._workers.values()):
+            worker.kill()
+        self._workers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get worker, queue and utilization statistics"""
+        uptime = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "workers": self.size,
+            "alive": len(self._workers),
+            "busy": self.busy,
+            "idle": self._idle.qsize(),
+            "waiting": self.waiting,
+            "utilization": round(self.busy_seconds / (uptime * self.size), 4) if uptime else 0.0,
+            "runs": self.runs,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "limit_hits": dict(self.limit_hits),
+            "crashes": self.crashes,
+            "recycled": self.recycled,
+            "avg_wait_seconds": round(self.avg_wait_time, 4),
+            "max_wait_seconds": round(self.max_wait_time, 4),
+            "limits": {
+                "cpu_seconds": self.cpu_seconds,
+                "memory_mb": self.memory_mb,
+                "timeout": self.timeout,
+                "max_runs": self.max_runs,
+            },
+        }
+
+
+# Pools are tied to the event loop their worker pipes were created on
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SandboxPool]" = weakref.WeakKeyDictionary()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Get or create the sandbox pool of the running event loop"""
+    from .registry import registry
+
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = SandboxPool()
+        registry.add_stats_provider("python_sandbox", pool.stats)
+    return pool
+
+
+async def close_sandbox_pool() -> None:
+    """Stop the workers of the running event loop's pool, if any"""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+async def execute_python(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for execute_python"""
+    code = params.get("code")
+    if not isinstance(code, str) or not code.strip():
+        return {"success": False, "message": "Code is required"}
+    return await get_sandbox_pool().execute(code, params.get("timeout"))
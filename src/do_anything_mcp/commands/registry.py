@@ -0,0 +1,258 @@
+"""
+Command registry for Do Anything MCP.
+
+Commands are looked up by name in a dictionary, so dispatch is a single
+hash lookup no matter how many commands exist. Handlers can be registered
+directly or as an import spec ("package.module:function") that is only
+imported the first time the command is executed, which keeps startup cheap
+as more commands are added.
+
+A handler takes the connection and the parameter dictionary and returns a
+result dictionary. It may be a plain function or a coroutine function.
+Built-in commands are registered by import spec in the package's
+``__init__``:
+
+    register_command("image_resize", ".image_tools:image_resize", blocking=True)
+
+Installed packages provide commands through the ``do_anything_mcp.commands``
+entry point group instead, where the entry point name is the command name
+and its value is the import spec of the handler; the ``blocking`` extra
+runs a sync handler in a worker thread:
+
+    [project.entry-points."do_anything_mcp.commands"]
+    tts_synthesize = "my_plugin.tts:synthesize"
+    stt_transcribe = "my_plugin.stt:transcribe [blocking]"
+
+Plugins should not import this module to register themselves: the server
+imports its own modules from the source tree, so an installed
+``do_anything_mcp`` package would hold a different registry.
+"""
+
+import asyncio
+import importlib
+import inspect
+import logging
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from ..metrics import metrics, profile_request, should_profile
+
+# Configure logging
+logger = logging.getLogger("CommandRegistry")
+
+# Constants
+ENTRY_POINT_GROUP = "do_anything_mcp.commands"
+
+Handler = Callable[[Any, Dict[str, Any]], Any]
+
+
+class CommandNotFoundError(Exception):
+    """Raised when no handler is registered for a command"""
+
+
+@dataclass
+class _Command:
+    """A registered command and its (possibly not yet imported) handler"""
+    name: str
+    spec: Optional[str] = None
+    handler: Optional[Handler] = None
+    is_async: bool = False
+    blocking: bool = False
+
+
+class CommandRegistry:
+    """Name to handler mapping with lazy handler loading"""
+
+    def __init__(self, package: str = None):
+        """Initialize the registry.
+
+        Args:
+            package: Package that relative import specs (".module:attr") resolve against
+        """
+        self.package = package
+        self._commands: Dict[str, _Command] = {}
+        self._stats_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._plugins_loaded = False
+
+    def register(
+        self,
+        name: str,
+        handler: Union[Handler, str, None] = None,
+        *,
+        blocking: bool = False,
+        replace: bool = False
+    ):
+        """Register a command handler.
+
+        Args:
+            name: Command name used for dispatch
+            handler: Handler function, or an import spec ("module:attr") loaded on first use.
+                When omitted, returns a decorator.
+            blocking: Whether a sync handler does blocking IO or CPU work and should be
+                run in a worker thread when executed from async code
+            replace: Allow overriding an existing registration
+
+        Returns:
+            The handler (or a decorator when no handler is given)
+        """
+        if handler is None:
+            def decorator(func: Handler) -> Handler:
+                self.register(name, func, blocking=blocking, replace=replace)
+                return func
+            return decorator
+
+        if name in self._commands and not replace:
+            raise ValueError(f"Command already registered: {name}")
+
+        if isinstance(handler, str):
+            self._commands[name] = _Command(name=name, spec=handler, blocking=blocking)
+        else:
+            self._commands[name] = _Command(
+                name=name,
+                handler=handler,
+                is_async=inspect.iscoroutinefunction(handler),
+                blocking=blocking
+            )
+        return handler
+
+    def unregister(self, name: str) -> None:
+        """Remove a command registration"""
+        self._commands.pop(name, None)
+
+    def names(self) -> List[str]:
+        """Get the names of all registered commands"""
+        self._load_plugins()
+        return sorted(self._commands)
+
+    def load_all(self) -> None:
+        """Import every registered handler, e.g. to warm up before serving"""
+        for name in self.names():
+            try:
+                self._resolve(name)
+            except Exception as e:
+                logger.warning(f"Failed to load command {name}: {str(e)}")
+
+    def add_stats_provider(self, name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+        """Register a callable whose result is reported under ``name`` by system_info.
+
+        Commands register their providers once they are loaded, so statistics of
+        commands that were never used do not force their import.
+        """
+        self._stats_providers[name] = provider
+
+    def collect_stats(self) -> Dict[str, Any]:
+        """Gather the statistics of all registered providers"""
+        stats = {}
+        # Providers may be added from other threads, e.g. the image pool by the derivative builder
+        for name, provider in list(self._stats_providers.items()):
+            try:
+                stats[name] = provider()
+            except Exception as e:
+                logger.warning(f"Failed to collect {name} stats: {str(e)}")
+                stats[name] = {"error": str(e)}
+        return stats
+
+    def _load_plugins(self) -> None:
+        """Register commands advertised through package entry points, once"""
+        if self._plugins_loaded:
+            return
+        self._plugins_loaded = True
+
+        from importlib.metadata import entry_points
+
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name in self._commands:
+                logger.warning(f"Ignoring plugin command {entry_point.name}: name already registered")
+                continue
+            self._commands[entry_point.name] = _Command(
+                name=entry_point.name,
+                spec=f"{entry_point.module}:{entry_point.attr}",
+                blocking="blocking" in entry_point.extras
+            )
+            logger.info(f"Registered plugin command {entry_point.name} ({entry_point.value})")
+
+    def _resolve(self, name: str) -> _Command:
+        """Get a command, importing its handler on first use"""
+        command = self._commands.get(name)
+        if command is None and not self._plugins_loaded:
+            self._load_plugins()
+            command = self._commands.get(name)
+        if command is None:
+            raise CommandNotFoundError(f"Command not implemented: {name}")
+
+        if command.handler is None:
+            module_name, _, attr = command.spec.partition(":")
+            module = importlib.import_module(module_name, package=self.package)
+            command.handler = getattr(module, attr)
+            command.is_async = inspect.iscoroutinefunction(command.handler)
+            logger.info(f"Loaded command {name} from {command.spec}")
+
+        return command
+
+    def execute(self, connection, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a command from synchronous code.
+
+        Coroutine handlers are run on a private event loop, so this must not be
+        called from inside a running loop; use :meth:`execute_async` there.
+        """
+        command = self._resolve(name)
+
+        async def _run():
+            from ..http_client import close_http_client
+            try:
+                return await command.handler(connection, params)
+            finally:
+                await close_http_client()
+
+        with metrics.command(name) as outcome:
+            with self._profiler(name, params) as profile:
+                result = asyncio.run(_run()) if command.is_async else command.handler(connection, params)
+            return self._finish(result, outcome, profile)
+
+    async def execute_async(self, connection, name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a command without blocking the event loop"""
+        command = self._resolve(name)
+        with metrics.command(name) as outcome:
+            if command.blocking and not command.is_async:
+                # Profile inside the worker thread, where the work happens
+                result, profile = await asyncio.to_thread(self._run_blocking, command, connection, params)
+            else:
+                with self._profiler(name, params) as profile:
+                    result = command.handler(connection, params)
+                    if command.is_async:
+                        result = await result
+            return self._finish(result, outcome, profile)
+
+    def _run_blocking(self, command: _Command, connection, params: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+        """Run a blocking handler in a worker thread"""
+        with self._profiler(command.name, params) as profile:
+            result = command.handler(connection, params)
+        return result, profile
+
+    @staticmethod
+    def _profiler(name: str, params: Dict[str, Any]):
+        """Profile this execution if it was asked for, otherwise do nothing"""
+        return profile_request(name) if should_profile(name, params) else nullcontext({})
+
+    @staticmethod
+    def _finish(result: Any, outcome: Dict[str, Any], profile: Dict[str, Any]) -> Any:
+        """Record a failed result and attach the profile location"""
+        if isinstance(result, dict):
+            if result.get("success") is False:
+                outcome["status"] = "error"
+            if "profile_path" in profile:
+                result["profile_path"] = profile["profile_path"]
+        return result
+
+
+# Registry used by the connection; relative specs resolve inside this package
+registry = CommandRegistry(package=__package__)
+
+
+def register_command(name: str, handler: Union[Handler, str, None] = None, *, blocking: bool = False, replace: bool = False):
+    """Register a command handler with the default registry.
+
+    See :meth:`CommandRegistry.register`.
+    """
+    return registry.register(name, handler, blocking=blocking, replace=replace)
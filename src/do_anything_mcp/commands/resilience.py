@@ -0,0 +1,171 @@
+"""
+Retry and circuit breaker policies for upstream inference calls.
+
+The Hugging Face inference API answers 503 with an ``estimated_time`` while
+a model is loading and 429 (often with ``Retry-After``) when throttling.
+Both are transient, so they are retried after the delay the backend asks
+for; other transient failures back off exponentially with jitter. All
+retries stay within the tool timeout. A circuit breaker tracks consecutive
+backend failures and fails calls fast while the backend is down.
+"""
+
+import os
+import time
+import random
+import logging
+from typing import Any, Dict, Optional
+
+# Configure logging
+logger = logging.getLogger("UpstreamResilience")
+
+# Constants
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_DEADLINE = 120.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# Statuses worth retrying; anything else is final
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the backend is considered down"""
+
+
+class RetryPolicy:
+    """Decides whether and when a failed upstream call is retried"""
+
+    def __init__(self, max_attempts: int = None, base_delay: float = None, max_delay: float = None, deadline: float = None):
+        """Initialize the retry policy.
+
+        Args:
+            max_attempts: Total attempts per call (default: MCP_RETRY_MAX_ATTEMPTS or 5)
+            base_delay: First backoff delay in seconds (default: MCP_RETRY_BASE_DELAY or 0.5)
+            max_delay: Largest single delay in seconds (default: 30)
+            deadline: Time budget for all attempts in seconds (default: MCP_TIMEOUT or 120)
+        """
+        self.max_attempts = max_attempts or int(os.environ.get("MCP_RETRY_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+        self.base_delay = base_delay if base_delay is not None else float(
+            os.environ.get("MCP_RETRY_BASE_DELAY", DEFAULT_BASE_DELAY))
+        self.max_delay = max_delay if max_delay is not None else DEFAULT_MAX_DELAY
+        self.deadline = deadline or float(os.environ.get("MCP_TIMEOUT", DEFAULT_DEADLINE))
+
+    def is_retryable(self, status_code: Optional[int]) -> bool:
+        """Whether a status (None for a transport error) is transient"""
+        return status_code is None or status_code in RETRYABLE_STATUSES
+
+    def next_delay(self, attempt: int, status_code: Optional[int] = None, headers=None, body: Any = None) -> float:
+        """Compute the delay before the next attempt.
+
+        Args:
+            attempt: Number of attempts made so far (1 after the first failure)
+            status_code: HTTP status of the failed attempt, None for a transport error
+            headers: Response headers of the failed attempt
+            body: Decoded JSON body of the failed attempt, if any
+
+        Returns:
+            Seconds to wait before retrying
+        """
+        # The backend knows best: model loading time or explicit Retry-After
+        if status_code == 503 and isinstance(body, dict) and "estimated_time" in body:
+            try:
+                return min(float(body["estimated_time"]), self.max_delay)
+            except (TypeError, ValueError):
+                pass
+
+        retry_after = headers.get("retry-after") if headers is not None else None
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.max_delay)
+            except ValueError:
+                pass
+
+        # Full jitter keeps concurrent retries from hitting the backend in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Fails calls fast after repeated backend failures, then probes for recovery"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        """Initialize the circuit breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit (default: MCP_BREAKER_THRESHOLD or 5)
+            reset_timeout: Seconds before a probe call is let through (default: MCP_BREAKER_RESET or 30)
+        """
+        self.failure_threshold = failure_threshold or int(
+            os.environ.get("MCP_BREAKER_THRESHOLD", DEFAULT_FAILURE_THRESHOLD))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(
+            os.environ.get("MCP_BREAKER_RESET", DEFAULT_RESET_TIMEOUT))
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._probing = False
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now"""
+        if self.state == self.OPEN:
+            return time.monotonic() >= self.opened_at + self.reset_timeout
+        return not (self.state == self.HALF_OPEN and self._probing)
+
+    def before_call(self) -> None:
+        """Check whether a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with a probe in flight
+        """
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(f"Backend unavailable, retrying in {remaining:.0f}s")
+            self.state = self.HALF_OPEN
+            logger.info("Circuit half-open, probing backend")
+
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError("Backend unavailable, recovery probe in progress")
+            self._probing = True
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call"""
+        if self.state != self.CLOSED:
+            logger.info("Circuit closed, backend recovered")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a backend failure and open the circuit past the threshold"""
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Let another probe through if one ended without an outcome (e.g. cancelled)"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the breaker state and counters"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
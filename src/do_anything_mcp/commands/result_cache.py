@@ -0,0 +1,203 @@
+"""
+On-disk result cache for deterministic image generations.
+
+Generations with a fixed seed are keyed by a hash of their parameters. The
+index lives in an SQLite database inside the working directory so it
+survives restarts, and entries are evicted least-recently-used first once
+the cache exceeds its byte budget or an entry exceeds its maximum age.
+Evicting an entry only forgets it: the image file stays until the storage
+manager evicts it, since its URI, derivatives and job results may still
+point at it. An entry whose file is gone is a miss.
+Lookups and stores block on SQLite, so async callers run them in a worker
+thread (``asyncio.to_thread``).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+# Configure logging
+logger = logging.getLogger("ResultCache")
+
+# Constants
+INDEX_FILENAME = "result_cache.sqlite3"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GiB
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60  # 7 days
+
+
+def make_cache_key(model: str, params: Dict[str, Any]) -> str:
+    """Build a stable hash for a set of generation parameters.
+
+    Args:
+        model: Identifier of the model that produced the image
+        params: Parameters that fully determine the output (prompt, size, steps, seed)
+
+    Returns:
+        Hex encoded SHA-256 digest
+    """
+    canonical = json.dumps({"model": model, **params}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Hashed index of generated images with size- and age-based LRU eviction"""
+
+    def __init__(self, work_dir: str, max_bytes: int = None, max_age: float = None, enabled: bool = None, storage=None):
+        """Initialize the result cache.
+
+        Args:
+            work_dir: Directory holding the generated images and the cache index
+            max_bytes: Total size of cached images before eviction (default: MCP_CACHE_MAX_BYTES or 1 GiB)
+            max_age: Maximum entry age in seconds (default: MCP_CACHE_MAX_AGE or 7 days)
+            enabled: Whether lookups and stores are performed (default: MCP_CACHE_ENABLED or True)
+            storage: Storage manager that owns the image files, if any; lookups
+                then resolve through its index
+        """
+        self.work_dir = work_dir
+        self.storage = storage
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.environ.get("MCP_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.max_age = max_age if max_age is not None else float(
+            os.environ.get("MCP_CACHE_MAX_AGE", DEFAULT_MAX_AGE))
+        if enabled is None:
+            enabled = os.environ.get("MCP_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the index database on first use"""
+        if self._db is None:
+            os.makedirs(self.work_dir, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(self.work_dir, INDEX_FILENAME),
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            # WAL lets several server processes share one work directory
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " image_id TEXT NOT NULL,"
+                " image_path TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        return self._db
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached image.
+
+        Args:
+            key: Cache key from :func:`make_cache_key`
+
+        Returns:
+            Dictionary with image_id and image_path, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT image_id, image_path, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None:
+                image_id, image_path, created = row
+                if self.storage is not None:
+                    # The store may have moved or evicted the file
+                    image_path = self.storage.get_path(image_id)
+                if image_path is None or now - created > self.max_age or not os.path.exists(image_path):
+                    # Stale or removed behind our back
+                    self._delete(db, key)
+                    row = None
+                else:
+                    db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return {"image_id": image_id, "image_path": image_path}
+
+    def put(self, key: str, image_id: str, image_path: str) -> None:
+        """Record a generated image and evict entries over budget.
+
+        Args:
+            key: Cache key from :func:`make_cache_key`
+            image_id: Identifier of the generated image
+            image_path: Path to the stored image file
+        """
+        if not self.enabled:
+            return
+
+        try:
+            size = os.path.getsize(image_path)
+        except OSError as e:
+            logger.warning(f"Not caching {image_path}: {str(e)}")
+            return
+
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, image_id, image_path, size, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, image_id, image_path, size, now, now),
+            )
+            self._evict(db, now)
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under budget"""
+        for (key,) in db.execute("SELECT key FROM entries WHERE created < ?", (now - self.max_age,)).fetchall():
+            self._delete(db, key)
+
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            self._delete(db, key)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def _delete(self, db: sqlite3.Connection, key: str) -> None:
+        """Forget an entry; its image file is left to the storage manager"""
+        db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current cache usage"""
+        result = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+        }
+        if self.enabled:
+            with self._lock:
+                entries, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+            result.update({"entries": entries, "bytes": total})
+        return result
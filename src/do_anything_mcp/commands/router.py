@@ -0,0 +1,241 @@
+"""
+Latency-aware routing across inference backends.
+
+Each backend has its own circuit breaker and a sliding window of recent
+latencies plus a moving error rate. Calls go to the available backend with
+the lowest expected latency (moving average latency of its successful
+answers divided by its success rate); backends without samples are tried
+first, backends that have only failed last, and a small share of calls
+explores the others so their numbers stay current. Failed answers do not
+count as latency samples, so a backend that fails fast, e.g. with a bad
+token, does not look fast.
+
+A call that is still running past its backend's p95 latency is hedged: the
+same request is sent to the next best backend and whichever answers first
+wins, the other is cancelled. This trims the latency tail at the cost of a
+few percent of duplicate upstream work.
+"""
+
+import os
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, TypeVar
+
+from .backends import InferenceBackend
+from .resilience import CircuitBreaker
+
+# Configure logging
+logger = logging.getLogger("BackendRouter")
+
+# Constants
+LATENCY_WINDOW = 200
+# Samples needed before a backend's p95 is trusted for hedging
+MIN_HEDGE_SAMPLES = 10
+DEFAULT_HEDGE_MIN_DELAY = 0.05
+# Share of calls sent to a random available backend
+EXPLORE_RATE = 0.05
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+T = TypeVar("T")
+
+
+class BackendState:
+    """Health and latency of one backend"""
+
+    def __init__(self, backend: InferenceBackend):
+        self.backend = backend
+        self.breaker = CircuitBreaker()
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.avg_latency = 0.0
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    def record(self, seconds: float, ok: bool) -> None:
+        """Record the outcome of a finished request"""
+        self.requests += 1
+        if ok:
+            self._observe(seconds)
+        else:
+            self.errors += 1
+        self.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def record_cancelled(self, seconds: float) -> None:
+        """Record a request abandoned for a faster one.
+
+        Its elapsed time is a lower bound of the real latency; dropping it
+        would make a slow backend look fast.
+        """
+        self._observe(seconds)
+
+    def _observe(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        if len(self.latencies) == 1:
+            self.avg_latency = seconds
+        else:
+            self.avg_latency += EWMA_ALPHA * (seconds - self.avg_latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Latency quantile over the recent window"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def score(self) -> float:
+        """Expected latency; lower is better"""
+        if not self.latencies:
+            # Untried backends go first, ones that have only failed last
+            return float("inf") if self.errors else 0.0
+        return self.avg_latency / max(1.0 - self.error_rate, 0.05)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.quantile(0.50), self.quantile(0.95)
+        return {
+            **self.backend.describe(),
+            "circuit": self.breaker.stats(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "in_flight": self.in_flight,
+            "avg_latency_seconds": round(self.avg_latency, 4),
+            "p50_seconds": round(p50, 4) if p50 is not None else None,
+            "p95_seconds": round(p95, 4) if p95 is not None else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class BackendRouter:
+    """Picks the fastest healthy backend and hedges slow calls"""
+
+    def __init__(self, backends: List[InferenceBackend], hedge: bool = None, hedge_min_delay: float = None):
+        """Initialize the router.
+
+        Args:
+            backends: Backends to route across, in order of preference for ties
+            hedge: Whether slow calls are duplicated to a second backend
+                (default: MCP_HEDGE or True; needs two or more backends)
+            hedge_min_delay: Shortest wait in seconds before hedging
+                (default: MCP_HEDGE_MIN_DELAY or 0.05)
+        """
+        if not backends:
+            raise ValueError("At least one backend is required")
+        self.states = [BackendState(backend) for backend in backends]
+        if hedge is None:
+            hedge = os.environ.get("MCP_HEDGE", "1").lower() not in ("0", "false", "no")
+        self.hedge = hedge and len(self.states) > 1
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else float(
+            os.environ.get("MCP_HEDGE_MIN_DELAY", DEFAULT_HEDGE_MIN_DELAY))
+
+    def select(self, exclude: Iterable[BackendState] = ()) -> Optional[BackendState]:
+        """Pick the backend for the next request.
+
+        Args:
+            exclude: Backends not to pick
+
+        Returns:
+            The best available backend, or None if every circuit is open
+        """
+        candidates = [
+            state for state in self.states
+            if state not in exclude and state.breaker.available()
+        ]
+        if not candidates:
+            return None
+        # Backends with a token ready beat ones that would wait for one
+        candidates = [state for state in candidates if state.backend.available()] or candidates
+        if len(candidates) > 1 and random.random() < EXPLORE_RATE:
+            return random.choice(candidates)
+        return min(candidates, key=BackendState.score)
+
+    def hedge_delay(self, state: BackendState) -> Optional[float]:
+        """Seconds to wait on a backend before hedging, None to not hedge"""
+        if not self.hedge or len(state.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        return max(state.quantile(0.95), self.hedge_min_delay)
+
+    async def call(
+        self,
+        attempt: Callable[[BackendState], Awaitable[T]],
+        is_success: Callable[[T], bool],
+        discard: Callable[[T], None]
+    ) -> T:
+        """Run a request on the best backend, hedging it if it runs long.
+
+        Args:
+            attempt: Sends the request to a backend and returns its outcome;
+                it is responsible for the backend's breaker and statistics
+            is_success: Whether an outcome is final and good
+            discard: Releases a successful outcome that lost the race
+
+        Returns:
+            The first successful outcome, or else the last one to finish
+
+        Raises:
+            Exception: Whatever the last attempt to finish raised, if no
+                attempt returned an outcome
+        """
+        primary = self.select()
+        if primary is None:
+            # Let the backend that recovers first raise its CircuitOpenError
+            primary = min(self.states, key=lambda state: state.breaker.opened_at)
+
+        loop = asyncio.get_running_loop()
+        tasks: Dict[asyncio.Task, BackendState] = {loop.create_task(attempt(primary)): primary}
+        result = None
+        try:
+            delay = self.hedge_delay(primary)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                backup = self.select(exclude=(primary,)) if not done else None
+                if backup is not None:
+                    logger.info(f"Hedging a call to {primary.name} after {delay:.2f}s with {backup.name}")
+                    primary.hedges += 1
+                    tasks[loop.create_task(attempt(backup))] = backup
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    result = task.result()
+                    if is_success(result):
+                        if tasks[task] is not primary:
+                            primary.hedge_wins += 1
+                        return result
+            if result is not None:
+                return result
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # A loser may have succeeded just before it was cancelled
+            for task in tasks:
+                if not task.cancelled() and task.exception() is None:
+                    outcome = task.result()
+                    if outcome is not result and is_success(outcome):
+                        discard(outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get routing settings and per-backend statistics"""
+        return {
+            "hedging": self.hedge,
+            "hedges": sum(state.hedges for state in self.states),
+            "hedge_wins": sum(state.hedge_wins for state in self.states),
+            "backends": {state.name: state.stats() for state in self.states},
+        }
@@ -0,0 +1,230 @@
+"""
+Scheduler for upstream inference calls.
+
+Caps the number of concurrent requests sent to the inference backend and
+queues the rest. Queued calls are served by priority (higher first) and,
+within a priority, round-robin across MCP sessions so one busy client cannot
+starve the others. Priorities are set by the server from the kind of call
+(interactive, batch or background job); the priority a client asks for only
+orders that session's own queued calls. Sessions are identified by a key the
+server assigns, so a client cannot take extra turns by changing its id. Calls
+whose expected queue wait would exceed the tool timeout are rejected
+immediately instead of timing out later.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, AsyncIterator
+
+# Configure logging
+logger = logging.getLogger("InferenceScheduler")
+
+# Constants
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_WAIT = 120.0
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+# Server-assigned priorities by kind of call
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BATCH = 0
+PRIORITY_BACKGROUND = -1
+# Range of the client-requested priority within a session
+MAX_SESSION_PRIORITY = 1
+
+
+class SchedulerRejectedError(Exception):
+    """Raised when a call is refused because the queue is full or too slow"""
+
+
+class _Waiter:
+    """A queued call waiting for a slot"""
+
+    def __init__(self, session_id: str, priority: int, session_priority: int):
+        self.session_id = session_id
+        self.priority = priority
+        self.session_priority = session_priority
+        self.enqueued = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class InferenceScheduler:
+    """Concurrency-limited priority queue with per-session fair sharing"""
+
+    def __init__(self, max_concurrency: int = None, max_queue: int = None, max_wait: float = None):
+        """Initialize the scheduler.
+
+        Args:
+            max_concurrency: Maximum concurrent upstream calls (default: MCP_MAX_UPSTREAM_CONCURRENCY or 4)
+            max_queue: Maximum number of queued calls (default: MCP_MAX_QUEUE or 256)
+            max_wait: Longest acceptable expected queue wait in seconds (default: MCP_TIMEOUT or 120)
+        """
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get("MCP_MAX_UPSTREAM_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self.max_queue = max_queue or int(os.environ.get("MCP_MAX_QUEUE", DEFAULT_MAX_QUEUE))
+        self.max_wait = max_wait or float(os.environ.get("MCP_TIMEOUT", DEFAULT_MAX_WAIT))
+
+        self._running = 0
+        self._queued = 0
+        # priority -> session -> waiters; sessions rotate for fairness
+        self._levels: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {}
+
+        self.admitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.avg_service_time = None
+        self.avg_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _expected_wait(self, priority: int) -> float:
+        """Estimate how long a new call at this priority would wait"""
+        if self.avg_service_time is None:
+            return 0.0
+        ahead = sum(
+            len(waiters)
+            for level, sessions in self._levels.items() if level >= priority
+            for waiters in sessions.values()
+        )
+        rounds = ahead // self.max_concurrency + 1
+        return rounds * self.avg_service_time
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        session_id: str = "default",
+        priority: int = PRIORITY_BATCH,
+        session_priority: int = 0
+    ) -> AsyncIterator[None]:
+        """Hold one upstream slot for the duration of the block.
+
+        Args:
+            session_id: Identity of the client session, used for fair sharing
+            priority: Server-assigned priority; higher values are served first
+            session_priority: Client-requested priority, clamped to
+                +/-MAX_SESSION_PRIORITY; it only orders calls of the same
+                session and priority
+
+        Raises:
+            SchedulerRejectedError: If the queue is full or the expected wait is too long
+        """
+        session_priority = max(-MAX_SESSION_PRIORITY, min(MAX_SESSION_PRIORITY, int(session_priority)))
+        await self._acquire(session_id, priority, session_priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_service(time.monotonic() - start)
+            self._release()
+
+    async def _acquire(self, session_id: str, priority: int, session_priority: int) -> None:
+        """Take a slot, queueing if all slots are busy"""
+        if self._running < self.max_concurrency and self._queued == 0:
+            self._running += 1
+            self.admitted += 1
+            self._record_wait(0.0)
+            return
+
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerRejectedError(f"Upstream queue is full ({self._queued} waiting)")
+
+        expected = self._expected_wait(priority)
+        if expected > self.max_wait:
+            self.rejected += 1
+            raise SchedulerRejectedError(
+                f"Expected queue wait of {expected:.1f}s exceeds the {self.max_wait:.1f}s timeout"
+            )
+
+        waiter = _Waiter(session_id, priority, session_priority)
+        sessions = self._levels.setdefault(priority, OrderedDict())
+        waiters = sessions.setdefault(session_id, deque())
+        # Queue behind the session's calls of equal or higher session priority
+        position = len(waiters)
+        while position > 0 and waiters[position - 1].session_priority < session_priority:
+            position -= 1
+        waiters.insert(position, waiter)
+        self._queued += 1
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                self._remove(waiter)
+            self.cancelled += 1
+            raise
+
+        self.admitted += 1
+        self._record_wait(time.monotonic() - waiter.enqueued)
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Drop a cancelled waiter from the queue"""
+        sessions = self._levels.get(waiter.priority)
+        waiters = sessions.get(waiter.session_id) if sessions else None
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del sessions[waiter.session_id]
+            if not sessions:
+                del self._levels[waiter.priority]
+
+    def _release(self) -> None:
+        """Hand the slot to the next waiter, or free it"""
+        for priority in sorted(self._levels, reverse=True):
+            sessions = self._levels[priority]
+            session_id, waiters = next(iter(sessions.items()))
+            waiter = waiters.popleft()
+            self._queued -= 1
+
+            # Rotate the session to the back so other sessions go next
+            if waiters:
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            if not sessions:
+                del self._levels[priority]
+
+            # The slot moves to the waiter without being freed
+            waiter.future.set_result(None)
+            return
+
+        self._running -= 1
+
+    def _record_service(self, seconds: float) -> None:
+        """Update the moving average of upstream call duration"""
+        if self.avg_service_time is None:
+            self.avg_service_time = seconds
+        else:
+            self.avg_service_time += EWMA_ALPHA * (seconds - self.avg_service_time)
+
+    def _record_wait(self, seconds: float) -> None:
+        """Update queue wait statistics"""
+        self.avg_wait_time += EWMA_ALPHA * (seconds - self.avg_wait_time)
+        self.max_wait_time = max(self.max_wait_time, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, utilization and wait time statistics"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": self._queued,
+            "queued_by_priority": {
+                str(priority): sum(len(w) for w in sessions.values())
+                for priority, sessions in sorted(self._levels.items(), reverse=True)
+            },
+            "queued_sessions": len({s for sessions in self._levels.values() for s in sessions}),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "avg_wait_seconds": round(self.avg_wait_time, 3),
+            "max_wait_seconds": round(self.max_wait_time, 3),
+            "avg_service_seconds": round(self.avg_service_time, 3) if self.avg_service_time is not None else None,
+        }
@@ -0,0 +1,73 @@
+"""
+In-flight deduplication of identical asynchronous calls.
+
+The first caller for a key starts the work; callers that arrive with the same
+key while it is still running wait on the same task and share its result.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+# Configure logging
+logger = logging.getLogger("SingleFlight")
+
+
+class _Call:
+    """A running call and the number of callers waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single execution"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run ``func`` once per key among concurrent callers.
+
+        The shared task is cancelled only once every caller waiting on it has
+        been cancelled, so one client giving up does not fail the others.
+
+        Args:
+            key: Identity of the call
+            func: Coroutine factory that performs the work
+
+        Returns:
+            Tuple of the result and whether it was shared with an earlier caller
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.coalesced += 1
+            logger.info(f"Joining in-flight call {key[:12]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        """Drop a finished call so later callers start fresh"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of running calls and coalesced callers"""
+        return {"in_flight": len(self._calls), "coalesced": self.coalesced}
@@ -0,0 +1,515 @@
+"""
+Chunked, deduplicating file uploads.
+
+A client uploads a file as a sequence of base64 chunks: ``upload_begin``
+opens an upload, ``upload_chunk`` appends to a temporary file in the work
+directory while hashing the bytes as they arrive, and ``upload_finish``
+moves the file into the store under its SHA-256 digest. Content that is
+already stored is kept once: a finished upload of known content is dropped
+in favour of the stored copy, and a client that sends the digest with
+``upload_begin`` is told right away that no bytes need to be sent. That
+shortcut only covers content the same session has uploaded before, so a
+digest is not confirmed as stored without sending the content. Stored files
+themselves are not private to a session: any client can look one up by id.
+
+At most one chunk is held in memory per call, and stored files are
+processed through memory maps (see :func:`map_file`) rather than read
+whole, so large media files do not grow the server's memory.
+
+Open uploads are kept in memory by the process that began them; uploads
+left idle for MCP_UPLOAD_TTL seconds are dropped along with their
+temporary files.
+"""
+
+import os
+import mmap
+import time
+import uuid
+import base64
+import hashlib
+import logging
+import binascii
+import threading
+import mimetypes
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set, Union
+
+from ..storage import WorkDirStorage, get_storage
+
+# Configure logging
+logger = logging.getLogger("FileUploads")
+
+# Constants
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GiB
+DEFAULT_MAX_CHUNK_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_UPLOADS = 32
+DEFAULT_TTL = 60 * 60
+# Sessions whose uploaded digests are remembered for the begin shortcut
+MAX_TRACKED_SESSIONS = 1024
+# Window used to scan mapped files, so only this much is copied at a time
+SCAN_WINDOW = 1024 * 1024
+# Leading bytes inspected to tell the file type
+SNIFF_BYTES = 8192
+FILE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"ID3", "audio/mpeg"),
+    (b"OggS", "audio/ogg"),
+    (b"fLaC", "audio/flac"),
+    (b"\x1aE\xdf\xa3", "video/webm"),
+)
+
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    """Detect a file type from its leading bytes.
+
+    Args:
+        head: Beginning of the file (at least 12 bytes where available)
+
+    Returns:
+        MIME type, or None if unrecognized
+    """
+    if head[:4] == b"RIFF":
+        return {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}.get(head[8:12])
+    if head[4:8] == b"ftyp":
+        return "video/mp4"
+    for signature, mime_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    return None
+
+
+@contextmanager
+def map_file(path: str) -> Iterator[Union[mmap.mmap, bytes]]:
+    """Map a file read-only into memory.
+
+    Pages are loaded by the OS as they are touched, so slicing or hashing
+    the map does not read the whole file into the process first.
+
+    Args:
+        path: Path of the file
+
+    Yields:
+        The mapped file (empty bytes for an empty file, which cannot be mapped)
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def _extension(filename: str) -> str:
+    """File extension to keep on the stored copy, if it is a plain one"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if 1 < len(extension) <= 10 and extension[1:].isalnum():
+        return extension
+    return ""
+
+
+class _Upload:
+    """An upload in progress"""
+
+    def __init__(self, upload_id: str, filename: str, temp_path: str, size: Optional[int], sha256: Optional[str],
+                 session_id: str):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.session_id = session_id
+        self.temp_path = temp_path
+        self.expected_size = size
+        self.expected_sha256 = sha256
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.last_activity = time.monotonic()
+        self.lock = threading.Lock()
+        self.file = open(temp_path, "wb")
+
+    def discard(self) -> None:
+        """Close and remove the temporary file"""
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+class UploadManager:
+    """Receives chunked uploads and stores each distinct content once"""
+
+    def __init__(self, work_dir: str, max_bytes: int = None, max_chunk_bytes: int = None,
+                 max_uploads: int = None, ttl: float = None):
+        """Initialize the upload manager.
+
+        Args:
+            work_dir: Work directory whose store receives the files
+            max_bytes: Largest accepted file (default: MCP_UPLOAD_MAX_BYTES or 2 GiB)
+            max_chunk_bytes: Largest accepted decoded chunk
+                (default: MCP_UPLOAD_MAX_CHUNK_BYTES or 8 MiB)
+            max_uploads: Uploads open at once before new ones are rejected
+                (default: MCP_MAX_UPLOADS or 32)
+            ttl: Seconds an idle upload is kept (default: MCP_UPLOAD_TTL or 1 hour)
+        """
+        self.storage: WorkDirStorage = get_storage(work_dir)
+        self.max_bytes = max_bytes or int(os.environ.get("MCP_UPLOAD_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.max_chunk_bytes = max_chunk_bytes or int(
+            os.environ.get("MCP_UPLOAD_MAX_CHUNK_BYTES", DEFAULT_MAX_CHUNK_BYTES))
+        self.max_uploads = max_uploads or int(os.environ.get("MCP_MAX_UPLOADS", DEFAULT_MAX_UPLOADS))
+        self.ttl = ttl or float(os.environ.get("MCP_UPLOAD_TTL", DEFAULT_TTL))
+
+        self.completed = 0
+        self.deduplicated = 0
+        self.expired = 0
+        self.rejected = 0
+        self.bytes_received = 0
+        self.bytes_deduplicated = 0
+
+        self._uploads: Dict[str, _Upload] = {}
+        # session -> digests it uploaded, least recently active session first
+        self._session_digests: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, filename: str, size: int = None, sha256: str = None,
+              session_id: str = "default") -> Dict[str, Any]:
+        """Open an upload.
+
+        Args:
+            filename: Name of the file, kept for its extension
+            size: Total size in bytes, checked when the upload finishes
+            sha256: Hex digest of the content, if the client knows it;
+                content this session already uploaded finishes at once
+                without sending any chunks
+            session_id: Client session the upload belongs to
+
+        Returns:
+            Dictionary with the upload id and the largest chunk accepted, or
+            the stored file when its content is already known
+        """
+        if size is not None and size > self.max_bytes:
+            self.rejected += 1
+            return {"success": False, "message": f"File exceeds the upload limit of {self.max_bytes} bytes"}
+        if sha256:
+            sha256 = sha256.lower()
+            with self._lock:
+                known = sha256 in self._session_digests.get(session_id, ())
+            path = self.storage.get_path(sha256) if known else None
+            if path is not None:
+                self.deduplicated += 1
+                self.bytes_deduplicated += os.path.getsize(path)
+                logger.info(f"Upload of {filename} matches stored file {sha256}")
+                return self._stored(sha256, path, filename, deduplicated=True)
+
+        self._expire_idle()
+        with self._lock:
+            if len(self._uploads) >= self.max_uploads:
+                self.rejected += 1
+                return {"success": False, "message": f"Too many open uploads ({len(self._uploads)}), try again later"}
+            upload_id = uuid.uuid4().hex
+            upload = _Upload(upload_id, filename, self.storage.temp_path(f"upload_{upload_id}.part"), size, sha256,
+                             session_id)
+            self._uploads[upload_id] = upload
+
+        return {
+            "success": True,
+            "message": "Upload started",
+            "upload_id": upload_id,
+            "max_chunk_bytes": self.max_chunk_bytes,
+            "deduplicated": False,
+        }
+
+    def chunk(self, upload_id: str, data: str, offset: int = None) -> Dict[str, Any]:
+        """Append a chunk to an upload.
+
+        Chunks must arrive in order. A chunk whose offset says it was already
+        received (a retry) is acknowledged without being written again.
+
+        Args:
+            upload_id: Id returned by :meth:`begin`
+            data: Base64 encoded chunk
+            offset: Position of the chunk in the file, checked when given
+
+        Returns:
+            Dictionary with the number of bytes received so far
+        """
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            return {"success": False, "message": f"Unknown upload: {upload_id}"}
+
+        try:
+            chunk = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError, TypeError):
+            return {"success": False, "message": "Chunk data must be base64 encoded"}
+        if len(chunk) > self.max_chunk_bytes:
+            return {"success": False, "message": f"Chunk exceeds {self.max_chunk_bytes} bytes"}
+
+        with upload.lock:
+            if upload_id not in self._uploads:
+                return {"success": False, "message": f"Upload {upload_id} is already finished"}
+            upload.last_activity = time.monotonic()
+            if offset is not None and offset != upload.received:
+                if offset + len(chunk) <= upload.received:
+                    return {"success": True, "message": "Chunk already received", "received": upload.received}
+                return {
+                    "success": False,
+                    "message": f"Expected a chunk at offset {upload.received}, got {offset}",
+                    "received": upload.received,
+                }
+            if upload.received + len(chunk) > self.max_bytes:
+                self._drop(upload)
+                self.rejected += 1
+                return {"success": False, "message": f"File exceeds the upload limit of {self.max_bytes} bytes"}
+
+            upload.hasher.update(chunk)
+            upload.file.write(chunk)
+            upload.received += len(chunk)
+            self.bytes_received += len(chunk)
+            return {"success": True, "message": "Chunk received", "received": upload.received}
+
+    def finish(self, upload_id: str) -> Dict[str, Any]:
+        """Complete an upload and store its file.
+
+        Args:
+            upload_id: Id returned by :meth:`begin`
+
+        Returns:
+            Dictionary with the file id (the content's SHA-256 digest), path,
+            size and whether the content was already stored
+        """
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            return {"success": False, "message": f"Unknown upload: {upload_id}"}
+
+        with upload.lock:
+            if upload_id not in self._uploads:
+                return {"success": False, "message": f"Upload {upload_id} is already finished"}
+            self._drop(upload, keep_file=True)
+            upload.file.close()
+            digest = upload.hasher.hexdigest()
+
+            if upload.expected_size is not None and upload.received != upload.expected_size:
+                upload.discard()
+                return {"success": False, "message": f"Received {upload.received} of {upload.expected_size} bytes"}
+            if upload.expected_sha256 and upload.expected_sha256 != digest:
+                upload.discard()
+                return {"success": False, "message": f"Content digest {digest} does not match {upload.expected_sha256}"}
+
+            with self._lock:
+                path = self.storage.get_path(digest)
+                deduplicated = path is not None
+                if deduplicated:
+                    upload.discard()
+                    self.deduplicated += 1
+                    self.bytes_deduplicated += upload.received
+                else:
+                    path = self.storage.allocate_path(digest, f"upload_{digest}{_extension(upload.filename)}")
+                    os.replace(upload.temp_path, path)
+                    self.storage.add(digest, path, kind="upload")
+                self._remember(upload.session_id, digest)
+            self.completed += 1
+
+        logger.info(f"Finished upload of {upload.filename} ({upload.received} bytes) as {digest}"
+                    + (", already stored" if deduplicated else ""))
+        return self._stored(digest, path, upload.filename, deduplicated)
+
+    def abort(self, upload_id: str) -> Dict[str, Any]:
+        """Cancel an upload and remove what was received"""
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            return {"success": False, "message": f"Unknown upload: {upload_id}"}
+        with upload.lock:
+            if upload_id not in self._uploads:
+                return {"success": False, "message": f"Upload {upload_id} is already finished"}
+            self._drop(upload)
+        return {"success": True, "message": "Upload cancelled"}
+
+    def _remember(self, session_id: str, digest: str) -> None:
+        """Record that a session has sent this content; call with the lock held"""
+        digests = self._session_digests.pop(session_id, None) or set()
+        digests.add(digest)
+        self._session_digests[session_id] = digests
+        while len(self._session_digests) > MAX_TRACKED_SESSIONS:
+            self._session_digests.popitem(last=False)
+
+    def _drop(self, upload: _Upload, keep_file: bool = False) -> None:
+        """Forget an upload, removing its temporary file unless asked to keep it"""
+        with self._lock:
+            self._uploads.pop(upload.upload_id, None)
+        if not keep_file:
+            upload.discard()
+
+    def _expire_idle(self) -> None:
+        """Drop uploads that have not received a chunk within the TTL"""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            idle = [upload for upload in self._uploads.values() if upload.last_activity < cutoff]
+        for upload in idle:
+            with upload.lock:
+                if upload.upload_id in self._uploads:
+                    self._drop(upload)
+                    self.expired += 1
+                    logger.info(f"Dropped idle upload {upload.upload_id} ({upload.filename})")
+
+    @staticmethod
+    def _stored(file_id: str, path: str, filename: str, deduplicated: bool) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "message": "File already stored" if deduplicated else "File stored",
+            "file_id": file_id,
+            "path": path,
+            "filename": filename,
+            "size": os.path.getsize(path),
+            "sha256": file_id,
+            "deduplicated": deduplicated,
+        }
+
+    def close(self) -> None:
+        """Drop the open uploads"""
+        with self._lock:
+            uploads = list(self._uploads.values())
+        for upload in uploads:
+            self._drop(upload)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get upload counters"""
+        return {
+            "open": len(self._uploads),
+            "max_open": self.max_uploads,
+            "completed": self.completed,
+            "deduplicated": self.deduplicated,
+            "expired": self.expired,
+            "rejected": self.rejected,
+            "bytes_received": self.bytes_received,
+            "bytes_deduplicated": self.bytes_deduplicated,
+        }
+
+
+def _looks_like_text(head: bytes, truncated: bool) -> bool:
+    """Whether the leading bytes of a file are UTF-8 text"""
+    if b"\0" in head:
+        return False
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character split at the end of the sniffed bytes is fine
+        return truncated and e.start >= len(head) - 3
+    return True
+
+
+def describe_file(path: str) -> Dict[str, Any]:
+    """Inspect a stored file through a memory map.
+
+    Detects the type from the leading bytes (falling back to the extension),
+    reads image dimensions from the header and counts the lines of text
+    files window by window, so no more than SCAN_WINDOW bytes are copied at
+    a time however large the file is.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        Dictionary with the size, MIME type and, where they apply, the image
+        dimensions or the text's line count
+    """
+    info: Dict[str, Any] = {"size": os.path.getsize(path)}
+    with map_file(path) as data:
+        head = data[:SNIFF_BYTES]
+        info["mime_type"] = sniff_mime_type(head) or mimetypes.guess_type(path)[0]
+
+        if info["mime_type"] is None and head and _looks_like_text(head, truncated=len(data) > len(head)):
+            info["mime_type"] = "text/plain"
+        if info["mime_type"] and info["mime_type"].startswith("text/"):
+            info["lines"] = sum(
+                data[start:start + SCAN_WINDOW].count(b"\n") for start in range(0, len(data), SCAN_WINDOW)
+            )
+            if data and data[-1:] != b"\n":
+                info["lines"] += 1
+
+    if info["mime_type"] and info["mime_type"].startswith("image/"):
+        try:
+            from .flux_schnell import read_image_size
+            info["width"], info["height"] = read_image_size(path)
+        except Exception as e:
+            logger.warning(f"Could not read image size of {path}: {str(e)}")
+    return info
+
+
+# Lazily created manager for the default work directory
+_upload_manager: Optional[UploadManager] = None
+_upload_manager_lock = threading.Lock()
+
+
+def get_upload_manager(work_dir: str = None) -> UploadManager:
+    """Get or create the upload manager singleton.
+
+    Args:
+        work_dir: Work directory, used when the manager is first created
+            (default: MCP_WORK_DIR or ./mcp_data)
+    """
+    global _upload_manager
+
+    with _upload_manager_lock:
+        if _upload_manager is None:
+            from .registry import registry
+
+            _upload_manager = UploadManager(
+                work_dir or os.environ.get("MCP_WORK_DIR", os.path.join(os.getcwd(), "mcp_data"))
+            )
+            registry.add_stats_provider("uploads", _upload_manager.stats)
+
+    return _upload_manager
+
+
+def close_upload_manager() -> None:
+    """Drop the open uploads, if the upload manager was ever used"""
+    if _upload_manager is not None:
+        _upload_manager.close()
+
+
+def upload_begin(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for upload_begin"""
+    filename = params.get("filename")
+    if not filename:
+        return {"success": False, "message": "Filename is required"}
+    return get_upload_manager().begin(
+        filename, params.get("size"), params.get("sha256"), params.get("session_id") or "default")
+
+
+def upload_chunk(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for upload_chunk"""
+    return get_upload_manager().chunk(params.get("upload_id", ""), params.get("data", ""), params.get("offset"))
+
+
+def upload_finish(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for upload_finish"""
+    return get_upload_manager().finish(params.get("upload_id", ""))
+
+
+def upload_abort(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Command handler for upload_abort"""
+    return get_upload_manager().abort(params.get("upload_id", ""))
+
+
+def file_info(connection, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Describe a stored file by id: size, type and image size or line count"""
+    file_id = params.get("file_id")
+    if not file_id:
+        return {"success": False, "message": "File id is required"}
+    path = get_storage().get_path(file_id)
+    if path is None:
+        return {"success": False, "message": f"Unknown file: {file_id}"}
+
+    try:
+        info = describe_file(path)
+    except Exception as e:
+        logger.error(f"Error inspecting {path}: {str(e)}")
+        return {"success": False, "message": f"Failed to inspect file: {str(e)}"}
+    return {"success": True, "message": "File inspected", "file_id": file_id, "path": path, **info}
@@ -1,8 +1,10 @@
+import asyncio
+import importlib
 import logging
 from dataclasses import dataclass
 from typing import Dict, Any, Optional
-import os
-import sys
+
+from .commands import execute_command, execute_command_async, registry
 
 # Configure logging
 logger = logging.getLogger("DoAnythingConnection")
@@ -20,6 +22,22 @@ class DoAnythingConnection:
             logger.error(f"Failed to connect to services: {str(e)}")
             return False
     
+    async def warm_up(self) -> None:
+        """Load commands and create shared resources ahead of the first tool call"""
+        from .commands.flux_schnell import get_flux_schnell_command
+        from .http_client import get_http_client
+        
+        # Imports and disk setup run in a worker thread to keep the loop responsive
+        await asyncio.to_thread(registry.load_all)
+        await asyncio.to_thread(get_flux_schnell_command)
+        await asyncio.to_thread(importlib.import_module, ".image_encoder", __package__)
+        get_http_client()
+        
+        # Start the image workers so the first image operation doesn't wait for them
+        from .image_pool import get_image_pool
+        await get_image_pool().start()
+        logger.info("Warm-up complete")
+    
     def execute_command(self, command_type: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Execute a command"""
         if params is None:
@@ -27,15 +45,24 @@ class DoAnythingConnection:
             
         try:
             logger.info(f"Executing command: {command_type} with params: {params}")
-            
-            # Import commands module directly without relative imports
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-            from src.do_anything_mcp.commands import execute_command
             return execute_command(self, command_type, params)
             
         except Exception as e:
             logger.error(f"Error executing command: {str(e)}")
             raise Exception(f"Error executing command {command_type}: {str(e)}")
+    
+    async def execute_command_async(self, command_type: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Execute a command from async code without blocking the event loop"""
+        if params is None:
+            params = {}
+            
+        try:
+            logger.info(f"Executing command: {command_type} with params: {params}")
+            return await execute_command_async(self, command_type, params)
+            
+        except Exception as e:
+            logger.error(f"Error executing command: {str(e)}")
+            raise Exception(f"Error executing command {command_type}: {str(e)}")
 
 # Global connection instance
 do_anything_connection = None
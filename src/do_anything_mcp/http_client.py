@@ -0,0 +1,75 @@
+"""
+Shared HTTP client pool for Do Anything MCP.
+
+All outbound HTTP traffic goes through one keep-alive connection pool per
+event loop, so concurrent tool calls reuse open TLS connections instead of
+opening a fresh one for every upstream request.
+"""
+
+import asyncio
+import logging
+import os
+import weakref
+
+import httpx
+
+# Configure logging
+logger = logging.getLogger("DoAnythingHTTPClient")
+
+# Constants
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 16
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+
+# httpx clients are bound to the event loop they were first used on
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_http_limits() -> httpx.Limits:
+    """Build the connection pool limits from the environment.
+
+    Environment variables:
+        MCP_HTTP_MAX_CONNECTIONS: Maximum number of open connections (default: 64)
+        MCP_HTTP_MAX_KEEPALIVE: Maximum number of idle keep-alive connections (default: 16)
+        MCP_HTTP_KEEPALIVE_EXPIRY: Seconds an idle connection is kept open (default: 30)
+    """
+    return httpx.Limits(
+        max_connections=int(os.environ.get("MCP_HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(os.environ.get("MCP_HTTP_MAX_KEEPALIVE", DEFAULT_MAX_KEEPALIVE_CONNECTIONS)),
+        keepalive_expiry=float(os.environ.get("MCP_HTTP_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)),
+    )
+
+
+def get_http_timeout() -> httpx.Timeout:
+    """Build the request timeout, bounded by the tool timeout (MCP_TIMEOUT)."""
+    read_timeout = float(os.environ.get("MCP_TIMEOUT", DEFAULT_READ_TIMEOUT))
+    return httpx.Timeout(read_timeout, connect=DEFAULT_CONNECT_TIMEOUT)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared HTTP client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None or client.is_closed:
+        limits = get_http_limits()
+        client = httpx.AsyncClient(limits=limits, timeout=get_http_timeout())
+        _clients[loop] = client
+        logger.info(
+            f"Created HTTP client pool (max_connections={limits.max_connections}, "
+            f"max_keepalive={limits.max_keepalive_connections})"
+        )
+
+    return client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client for the running event loop, if any."""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+
+    if client is not None and not client.is_closed:
+        await client.aclose()
+        logger.info("Closed HTTP client pool")
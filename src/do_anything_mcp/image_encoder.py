@@ -0,0 +1,288 @@
+"""
+Budget-aware image encoder for Do Anything MCP.
+
+Tool responses have a hard size limit, so images that are too large to be
+inlined have to be re-encoded. Instead of guessing a scale and hoping a PNG
+fits, this encoder picks a format and quality with a bounded search and only
+scales the image down when even the lowest acceptable quality is too large,
+predicting the scale from the measured bytes per pixel.
+
+It also provides the pieces of the reduced views used for batch responses:
+thumbnails and the layout and numbering of contact sheets. The image pool
+(``image_pool.py``) builds the views from them in parallel.
+"""
+
+import math
+import logging
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Sequence, Tuple, Union
+
+from PIL import Image as PILImage
+from PIL import features
+
+# Configure logging
+logger = logging.getLogger("ImageEncoder")
+
+# Constants
+DEFAULT_FORMATS = ("webp", "jpeg", "png")
+DEFAULT_MIN_QUALITY = 50
+DEFAULT_MAX_QUALITY = 90
+MAX_ENCODE_ATTEMPTS = 10
+QUALITY_SEARCH_STEPS = 3
+# Encoded size is not exactly proportional to pixel count, leave some headroom
+SCALE_SAFETY = 0.92
+DEFAULT_TILE_SIZE = 256
+TILE_PADDING = 4
+MISSING_TILE_COLOR = (64, 64, 64)
+
+# Encoder buffers are reused per thread to avoid reallocating on every attempt
+_local = threading.local()
+
+
+@dataclass
+class EncodedImage:
+    """An encoded image and the settings that produced it"""
+    data: bytes
+    format: str
+    width: int
+    height: int
+    quality: Optional[int] = None
+    attempts: int = 0
+
+
+def _get_buffer() -> BytesIO:
+    """Get the reusable encode buffer for the current thread"""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+
+def _supported(image_format: str) -> bool:
+    """Check whether PIL can write the given format"""
+    if image_format == "webp":
+        return features.check("webp")
+    return image_format in ("jpeg", "png")
+
+
+class BudgetImageEncoder:
+    """Encode images so they fit in a byte budget in as few passes as possible"""
+
+    def __init__(
+        self,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        min_quality: int = DEFAULT_MIN_QUALITY,
+        max_quality: int = DEFAULT_MAX_QUALITY,
+        max_attempts: int = MAX_ENCODE_ATTEMPTS
+    ):
+        """Initialize the encoder.
+
+        Args:
+            formats: Output formats in order of preference ("webp", "jpeg", "png");
+                the first one PIL supports that can represent the image is used
+            min_quality: Lowest lossy quality before the image is scaled down instead
+            max_quality: Quality tried first for lossy formats
+            max_attempts: Upper bound on encode passes per call
+        """
+        self.formats = [f for f in (fmt.lower() for fmt in formats) if _supported(f)]
+        if not self.formats:
+            raise ValueError(f"None of the requested formats are supported: {list(formats)}")
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.max_attempts = max_attempts
+
+    def encode(self, image: Union[bytes, PILImage.Image], max_bytes: int) -> EncodedImage:
+        """Encode an image within a byte budget.
+
+        Args:
+            image: Encoded image bytes or a PIL image
+            max_bytes: Maximum size of the encoded output
+
+        Returns:
+            The encoded image
+
+        Raises:
+            ValueError: If the image cannot be made to fit in the budget
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            image = PILImage.open(BytesIO(image))
+        image.load()
+
+        image_format = self._choose_format(image)
+        if image_format == "png":
+            return self._fit_png(image, max_bytes)
+        return self._fit_lossy(image, image_format, max_bytes)
+
+    def _choose_format(self, image: PILImage.Image) -> str:
+        """Pick the most preferred format that can represent the image"""
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        for image_format in self.formats:
+            if not has_alpha or image_format != "jpeg":
+                return image_format
+        # Only JPEG is allowed; the alpha channel is dropped
+        return self.formats[0]
+
+    def _encode(self, image: PILImage.Image, image_format: str, quality: Optional[int]) -> int:
+        """Encode into the reusable buffer and return the encoded size"""
+        buffer = _get_buffer()
+        if image_format == "png":
+            image.save(buffer, format="PNG", compress_level=6)
+        elif image_format == "webp":
+            image.save(buffer, format="WEBP", quality=quality, method=4)
+        else:
+            image.save(buffer, format="JPEG", quality=quality)
+        return buffer.tell()
+
+    def _result(self, image: PILImage.Image, image_format: str, quality: Optional[int], attempts: int) -> EncodedImage:
+        """Snapshot the buffer contents of the last encode"""
+        return EncodedImage(
+            data=_local.buffer.getvalue(),
+            format=image_format,
+            width=image.width,
+            height=image.height,
+            quality=quality,
+            attempts=attempts
+        )
+
+    def _fit_lossy(self, image: PILImage.Image, image_format: str, max_bytes: int) -> EncodedImage:
+        """Search quality first, then scale, until the image fits"""
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            source = image.convert("RGB")
+        elif image_format == "webp" and image.mode not in ("RGB", "RGBA"):
+            source = image.convert("RGBA" if "A" in image.mode or "transparency" in image.info else "RGB")
+        else:
+            source = image
+
+        current = source
+        attempts = 1
+        if self._encode(current, image_format, self.max_quality) <= max_bytes:
+            return self._result(current, image_format, self.max_quality, attempts)
+
+        while attempts < self.max_attempts:
+            attempts += 1
+            low_size = self._encode(current, image_format, self.min_quality)
+            if low_size <= max_bytes:
+                return self._search_quality(current, image_format, max_bytes, attempts)
+
+            # Even the lowest quality is too large: predict the scale from bytes per pixel
+            scale = (max_bytes / low_size) ** 0.5 * SCALE_SAFETY
+            new_size = (max(1, int(current.width * scale)), max(1, int(current.height * scale)))
+            current = source.resize(new_size, PILImage.LANCZOS, reducing_gap=2.0)
+
+        raise ValueError(f"Could not encode image within {max_bytes} bytes")
+
+    def _search_quality(self, image: PILImage.Image, image_format: str, max_bytes: int, attempts: int) -> EncodedImage:
+        """Binary search for the highest quality that fits, in a bounded number of steps.
+
+        Expects the buffer to hold the image encoded at ``min_quality``.
+        """
+        low, high = self.min_quality, self.max_quality
+        best = last = self.min_quality
+
+        for _ in range(QUALITY_SEARCH_STEPS):
+            if high - low <= 1 or attempts >= self.max_attempts:
+                break
+            quality = last = (low + high) // 2
+            attempts += 1
+            if self._encode(image, image_format, quality) <= max_bytes:
+                best, low = quality, quality
+            else:
+                high = quality
+
+        # Re-encode the best fit unless it is already in the buffer
+        if last != best:
+            attempts += 1
+            self._encode(image, image_format, best)
+        return self._result(image, image_format, best, attempts)
+
+    def _fit_png(self, image: PILImage.Image, max_bytes: int) -> EncodedImage:
+        """Scale a lossless PNG down until it fits"""
+        current = image
+        for attempts in range(1, self.max_attempts + 1):
+            size = self._encode(current, "png", None)
+            if size <= max_bytes:
+                return self._result(current, "png", None, attempts)
+
+            scale = (max_bytes / size) ** 0.5 * SCALE_SAFETY
+            new_size = (max(1, int(current.width * scale)), max(1, int(current.height * scale)))
+            current = image.resize(new_size, PILImage.LANCZOS, reducing_gap=2.0)
+
+        raise ValueError(f"Could not encode image within {max_bytes} bytes")
+
+
+# Shared default encoder instance
+default_encoder = BudgetImageEncoder()
+
+
+def encode_to_budget(image: Union[bytes, PILImage.Image], max_bytes: int, formats: Sequence[str] = None) -> EncodedImage:
+    """Encode an image within a byte budget using the default settings.
+
+    Args:
+        image: Encoded image bytes or a PIL image
+        max_bytes: Maximum size of the encoded output
+        formats: Output formats in order of preference (default: webp, jpeg, png)
+
+    Returns:
+        The encoded image
+    """
+    encoder = default_encoder if formats is None else BudgetImageEncoder(formats=formats)
+    return encoder.encode(image, max_bytes)
+
+
+def make_thumbnail(path: str, max_size: int) -> PILImage.Image:
+    """Load an image scaled to fit in a max_size square.
+
+    JPEGs are decoded at a reduced scale directly, so large originals are
+    never fully decoded.
+
+    Args:
+        path: Path of the image file
+        max_size: Longest side of the thumbnail
+
+    Returns:
+        The thumbnail as an RGB image
+    """
+    with PILImage.open(path) as image:
+        image.draft("RGB", (max_size, max_size))
+        image = image.convert("RGB")
+    image.thumbnail((max_size, max_size), PILImage.LANCZOS, reducing_gap=2.0)
+    return image
+
+
+def contact_sheet_layout(count: int, tile_size: int = DEFAULT_TILE_SIZE, columns: int = None) -> Tuple[int, int, List[Tuple[int, int]]]:
+    """Lay out a numbered grid of tiles.
+
+    Args:
+        count: Number of tiles
+        tile_size: Longest side of each tile
+        columns: Number of columns (default: a near-square grid)
+
+    Returns:
+        Tuple of (sheet width, sheet height, top-left corner of each tile)
+    """
+    columns = columns or max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / columns))
+    cell = tile_size + TILE_PADDING
+    origins = [
+        (TILE_PADDING + (index % columns) * cell, TILE_PADDING + (index // columns) * cell)
+        for index in range(count)
+    ]
+    return columns * cell + TILE_PADDING, rows * cell + TILE_PADDING, origins
+
+
+def annotate_contact_sheet(sheet: PILImage.Image, origins: Sequence[Tuple[int, int]], missing: Sequence[int],
+                           tile_size: int = DEFAULT_TILE_SIZE) -> None:
+    """Grey out the tiles of missing images and number every tile"""
+    from PIL import ImageDraw
+
+    draw = ImageDraw.Draw(sheet)
+    for index in missing:
+        left, top = origins[index]
+        draw.rectangle((left, top, left + tile_size - 1, top + tile_size - 1), fill=MISSING_TILE_COLOR)
+    for index, (left, top) in enumerate(origins):
+        draw.text((left + 4, top + 2), str(index), fill=(255, 255, 255))
+
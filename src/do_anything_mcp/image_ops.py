@@ -0,0 +1,320 @@
+"""
+Image operations run in the image process pool.
+
+Every function here is a top-level function of plain arguments, so it can
+be sent to a worker process by reference. Work on stored files takes paths
+and writes its output to disk, so nothing but small arguments and results
+crosses the process boundary. Where decoded pixels do have to be shared -
+one decode feeding several encodes, or several workers filling one canvas -
+they live in a shared memory block described by a :class:`SharedImage`,
+which is pickled as its name, mode and size instead of its pixels.
+"""
+
+import sys
+import hashlib
+from dataclasses import dataclass
+from io import BytesIO
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image as PILImage
+
+from .image_encoder import EncodedImage, annotate_contact_sheet, encode_to_budget, make_thumbnail
+
+# Constants
+OUTPUT_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+# Formats PIL reports for stored files that outputs keep by default
+PIL_FORMATS = {"PNG": "png", "JPEG": "jpeg", "WEBP": "webp"}
+DEFAULT_QUALITY = 90
+MAX_OUTPUT_SIDE = 8192
+# Modes whose raw pixels are copied into shared memory as they are
+SHARED_MODES = ("L", "RGB", "RGBA")
+FLATTEN_COLOR = (255, 255, 255)
+# Modes each output format stores without conversion
+SAVE_MODES = {
+    "png": ("1", "L", "LA", "P", "RGB", "RGBA"),
+    "webp": ("RGB", "RGBA"),
+}
+
+
+@dataclass(frozen=True)
+class SharedImage:
+    """A decoded image whose pixels are held in a shared memory block"""
+    name: str
+    mode: str
+    width: int
+    height: int
+
+    @property
+    def nbytes(self) -> int:
+        return self.width * self.height * len(self.mode)
+
+    @classmethod
+    def create(cls, image: PILImage.Image) -> Tuple["SharedImage", shared_memory.SharedMemory]:
+        """Copy an image's pixels into a new shared memory block.
+
+        The caller owns the returned block and must close and unlink it.
+        """
+        if image.mode not in SHARED_MODES:
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+        data = image.tobytes()
+        block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        block.buf[:len(data)] = data
+        return cls(block.name, image.mode, image.width, image.height), block
+
+    @classmethod
+    def allocate(cls, mode: str, width: int, height: int, color=0) -> Tuple["SharedImage", shared_memory.SharedMemory]:
+        """Create a shared image filled with one color, e.g. a canvas for workers to paste into"""
+        return cls.create(PILImage.new(mode, (width, height), color))
+
+    def adopt(self) -> shared_memory.SharedMemory:
+        """Take ownership of a block created in another process, to release it here"""
+        return shared_memory.SharedMemory(name=self.name)
+
+    def load(self) -> PILImage.Image:
+        """Read the pixels into a PIL image owned by this process"""
+        block = _attach(self.name)
+        try:
+            with block.buf[:self.nbytes] as view:
+                return PILImage.frombytes(self.mode, (self.width, self.height), view)
+        finally:
+            block.close()
+
+    def paste(self, image: PILImage.Image, left: int, top: int) -> None:
+        """Write an image into the shared pixels, row by row, clipped to the bounds"""
+        if image.mode != self.mode:
+            image = image.convert(self.mode)
+        right, bottom = min(self.width, left + image.width), min(self.height, top + image.height)
+        if right <= left or bottom <= top:
+            return
+        image = image.crop((0, 0, right - left, bottom - top))
+        data = image.tobytes()
+        bands = len(self.mode)
+        row_bytes = image.width * bands
+        block = _attach(self.name)
+        try:
+            for y in range(image.height):
+                offset = ((top + y) * self.width + left) * bands
+                block.buf[offset:offset + row_bytes] = data[y * row_bytes:(y + 1) * row_bytes]
+        finally:
+            block.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing shared memory block without taking ownership of it"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    block = shared_memory.SharedMemory(name=name)
+    # Before 3.13 attaching registers the block for cleanup at exit, which
+    # would unlink it under its owner
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+def release(block: shared_memory.SharedMemory) -> None:
+    """Close and unlink a shared memory block created by this process"""
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _fit_size(width: int, height: int, max_width: Optional[int], max_height: Optional[int]) -> Tuple[int, int]:
+    """Largest size with the same aspect ratio within the given bounds"""
+    scale = min(
+        max_width / width if max_width else float("inf"),
+        max_height / height if max_height else float("inf"),
+    )
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _check_size(width: int, height: int) -> None:
+    if not 0 < width <= MAX_OUTPUT_SIDE or not 0 < height <= MAX_OUTPUT_SIDE:
+        raise ValueError(f"Output size must be between 1 and {MAX_OUTPUT_SIDE} pixels per side, got {width}x{height}")
+
+
+def _prepare(image: PILImage.Image, image_format: str) -> PILImage.Image:
+    """Convert an image to a mode the output format can store"""
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    if image_format == "jpeg":
+        if has_alpha:
+            rgba = image.convert("RGBA")
+            flat = PILImage.new("RGB", rgba.size, FLATTEN_COLOR)
+            flat.paste(rgba, mask=rgba.getchannel("A"))
+            return flat
+        return image if image.mode in ("RGB", "L") else image.convert("RGB")
+    if image.mode not in SAVE_MODES[image_format]:
+        return image.convert("RGBA" if has_alpha else "RGB")
+    return image
+
+
+def _save(image: PILImage.Image, image_format: str, quality: int, output_path: str) -> Dict[str, Any]:
+    """Encode an image to a file, hashing the bytes on the way"""
+    buffer = BytesIO()
+    image = _prepare(image, image_format)
+    if image_format == "png":
+        image.save(buffer, format="PNG", compress_level=6)
+    elif image_format == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality)
+    data = buffer.getbuffer()
+    with open(output_path, "wb") as f:
+        f.write(data)
+    return {
+        "format": image_format,
+        "width": image.width,
+        "height": image.height,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+def transform_file(
+    operation: str,
+    paths: Sequence[str],
+    params: Dict[str, Any],
+    output_path: str,
+    output_format: Optional[str] = None,
+    quality: int = DEFAULT_QUALITY
+) -> Dict[str, Any]:
+    """Apply one operation to stored images and write the result.
+
+    Args:
+        operation: "resize", "crop", "convert" or "composite"
+        paths: Input files; composite takes the base image then the overlay
+        params: Parameters of the operation:
+            resize: width, height, keep_aspect (default True)
+            crop: left, top, right, bottom
+            composite: x, y, opacity (0-1), overlay_width
+        output_path: File the encoded result is written to
+        output_format: "png", "jpeg" or "webp" (default: the first input's
+            format when it is one of those, else PNG)
+        quality: Quality for lossy formats
+
+    Returns:
+        Dictionary with the output format, dimensions, size and SHA-256 digest
+
+    Raises:
+        ValueError: If the parameters do not fit the image
+    """
+    with PILImage.open(paths[0]) as source:
+        output_format = output_format or PIL_FORMATS.get(source.format, "png")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+
+        if operation == "resize":
+            width, height = params.get("width"), params.get("height")
+            if not width and not height:
+                raise ValueError("Width or height is required")
+            if params.get("keep_aspect", True):
+                width, height = _fit_size(source.width, source.height, width, height)
+            else:
+                width, height = width or source.width, height or source.height
+            _check_size(width, height)
+            # Let JPEG decode at a reduced scale when shrinking a lot
+            source.draft(source.mode, (width, height))
+            image = source
+            if image.mode in ("1", "P"):
+                # Palette images would only be resized with nearest neighbour
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            image = image.resize((width, height), PILImage.LANCZOS, reducing_gap=2.0)
+
+        elif operation == "crop":
+            box = tuple(int(params.get(key, 0)) for key in ("left", "top", "right", "bottom"))
+            if not (0 <= box[0] < box[2] <= source.width and 0 <= box[1] < box[3] <= source.height):
+                raise ValueError(f"Crop box {box} is not within the {source.width}x{source.height} image")
+            image = source.crop(box)
+
+        elif operation == "convert":
+            source.load()
+            image = source
+
+        elif operation == "composite":
+            if len(paths) != 2:
+                raise ValueError("Composite takes a base image and an overlay")
+            image = source.convert("RGBA")
+            with PILImage.open(paths[1]) as overlay_source:
+                overlay = overlay_source.convert("RGBA")
+            if params.get("overlay_width"):
+                size = _fit_size(overlay.width, overlay.height, params["overlay_width"], None)
+                _check_size(*size)
+                overlay = overlay.resize(size, PILImage.LANCZOS, reducing_gap=2.0)
+            opacity = float(params.get("opacity", 1.0))
+            if not 0.0 <= opacity <= 1.0:
+                raise ValueError("Opacity must be between 0 and 1")
+            if opacity < 1.0:
+                overlay.putalpha(overlay.getchannel("A").point(lambda a: round(a * opacity)))
+            image.alpha_composite(overlay, dest=(int(params.get("x", 0)), int(params.get("y", 0))))
+            if "A" not in source.getbands() and "transparency" not in source.info:
+                image = image.convert("RGB")
+
+        else:
+            raise ValueError(f"Unknown image operation: {operation}")
+
+        return _save(image, output_format, quality, output_path)
+
+
+def encode_file(path: str, max_bytes: int, formats: Sequence[str] = None, size: int = None) -> EncodedImage:
+    """Encode a stored image (or a thumbnail of it) within a byte budget.
+
+    Args:
+        path: Image file
+        max_bytes: Budget for the encoded output
+        formats: Output formats in order of preference (default: the encoder's)
+        size: Longest side of a thumbnail to encode instead of the full image
+
+    Returns:
+        The encoded image
+    """
+    if size is not None:
+        return encode_to_budget(make_thumbnail(path, size), max_bytes, formats=formats)
+    with PILImage.open(path) as image:
+        image.load()
+        return encode_to_budget(image, max_bytes, formats=formats)
+
+
+def decode_shared(path: str) -> SharedImage:
+    """Decode an image file into shared memory, for several workers to encode from.
+
+    The block outlives this call; the caller takes it over with
+    :meth:`SharedImage.adopt` and releases it. POSIX only, since elsewhere a
+    block disappears with the last open handle.
+    """
+    with PILImage.open(path) as image:
+        image.load()
+        shared, block = SharedImage.create(image)
+    block.close()
+    return shared
+
+
+def encode_shared(shared: SharedImage, max_bytes: int, formats: Sequence[str] = None, size: int = None) -> EncodedImage:
+    """Encode a shared image, or a thumbnail of it, within a byte budget"""
+    image = shared.load()
+    if size is not None:
+        image.thumbnail((size, size), PILImage.LANCZOS, reducing_gap=2.0)
+    return encode_to_budget(image, max_bytes, formats=formats)
+
+
+def paste_thumbnail(canvas: SharedImage, path: str, left: int, top: int, tile_size: int) -> bool:
+    """Decode a thumbnail of an image and paste it, centered, into a tile of a shared canvas.
+
+    Returns:
+        Whether the image could be read
+    """
+    try:
+        tile = make_thumbnail(path, tile_size)
+    except Exception:
+        return False
+    canvas.paste(tile, left + (tile_size - tile.width) // 2, top + (tile_size - tile.height) // 2)
+    return True
+
+
+def encode_contact_sheet(canvas: SharedImage, origins: List[Tuple[int, int]], missing: List[int],
+                         tile_size: int, max_bytes: int) -> EncodedImage:
+    """Number the tiles of a shared contact sheet canvas and encode it within a byte budget"""
+    sheet = canvas.load()
+    annotate_contact_sheet(sheet, origins, missing, tile_size)
+    return encode_to_budget(sheet, max_bytes)
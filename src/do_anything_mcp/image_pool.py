@@ -0,0 +1,314 @@
+"""
+Process pool for CPU-bound image work.
+
+Resampling and encoding with PIL hold the GIL for much of their run, so
+image work done in threads shares one core with everything else in the
+server. The image pool runs it in worker processes instead, one per core
+by default. Tasks are functions from :mod:`image_ops`; they take paths and
+shared memory descriptors rather than pixel data, so a task costs a few
+hundred bytes of pickling however large the image is.
+
+With MCP_IMAGE_WORKERS=0 the same tasks run inline in the calling thread.
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Configure logging
+logger = logging.getLogger("ImagePool")
+
+# Constants
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_TIMEOUT = 120.0
+
+
+class ImagePoolError(Exception):
+    """Raised when an image worker dies or a task runs past its timeout"""
+
+
+def _init_worker() -> None:
+    """Prepare a worker process: leave Ctrl+C to the server and preload PIL"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from . import image_ops  # noqa: F401
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _default_workers() -> int:
+    return min(DEFAULT_MAX_WORKERS, os.cpu_count() or 1)
+
+
+class ImagePool:
+    """Runs image operations in a pool of worker processes"""
+
+    def __init__(self, workers: int = None, timeout: float = None):
+        """Initialize the pool; workers are started on first use.
+
+        Args:
+            workers: Worker processes (default: MCP_IMAGE_WORKERS or
+                min(4, CPUs)); 0 runs tasks inline in the calling thread
+            timeout: Seconds to wait for a task (default: MCP_TIMEOUT or 120)
+        """
+        self.workers = workers if workers is not None else int(
+            os.environ.get("MCP_IMAGE_WORKERS", _default_workers()))
+        self.timeout = timeout or float(os.environ.get("MCP_TIMEOUT", DEFAULT_TIMEOUT))
+
+        self.tasks = 0
+        self.failures = 0
+        self.crashes = 0
+        self.timeouts = 0
+        self.busy = 0
+        self.max_busy = 0
+        self.total_seconds = 0.0
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the executor on first use, or again after a worker crashed"""
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded server is unsafe; start workers from a clean process
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_init_worker,
+                )
+                logger.info(f"Created image pool with {self.workers} workers ({method})")
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a broken executor so the next task starts fresh workers"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Start a task in a worker process.
+
+        Args:
+            fn: Top-level function from image_ops
+            *args: Its arguments, which must be picklable
+
+        Returns:
+            Future of the task's result
+        """
+        executor = self._get_executor()
+        self.tasks += 1
+        self.busy += 1
+        self.max_busy = max(self.max_busy, self.busy)
+        start = time.perf_counter()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self.busy -= 1
+            self._reset(executor)
+            raise
+
+        def finished(done: Future) -> None:
+            self.busy -= 1
+            self.total_seconds += time.perf_counter() - start
+            if done.cancelled():
+                return
+            error = done.exception()
+            if isinstance(error, BrokenProcessPool):
+                self.crashes += 1
+                logger.error(f"An image worker died running {fn.__name__}; restarting the pool")
+                self._reset(executor)
+            elif error is not None:
+                self.failures += 1
+
+        future.add_done_callback(finished)
+        return future
+
+    def call(self, fn: Callable, *args) -> Any:
+        """Run a task and wait for its result, from a thread that may block.
+
+        Raises:
+            ImagePoolError: If the worker died or the task timed out
+            Exception: Whatever the task raised
+        """
+        if self.workers <= 0:
+            return self._run_inline(fn, *args)
+        return self._wait(self.submit(fn, *args))
+
+    def call_all(self, fn: Callable, arg_lists: Sequence[Sequence[Any]]) -> List[Any]:
+        """Run a task once per argument list, in parallel, and wait for every result.
+
+        Raises:
+            ImagePoolError: If a worker died or a task timed out
+            Exception: Whatever a task raised
+        """
+        if self.workers <= 0:
+            return [self._run_inline(fn, *args) for args in arg_lists]
+        futures = [self.submit(fn, *args) for args in arg_lists]
+        try:
+            return [self._wait(future) for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _wait(self, future: Future) -> Any:
+        """Wait for a submitted task, translating pool failures"""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.timeouts += 1
+            raise ImagePoolError(f"Image operation timed out after {self.timeout:.0f}s")
+        except BrokenProcessPool:
+            raise ImagePoolError("The image worker died (the image may be too large to process)")
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run a task without blocking the event loop.
+
+        Raises:
+            ImagePoolError: If the worker died or the task timed out
+            Exception: Whatever the task raised
+        """
+        if self.workers <= 0:
+            return await asyncio.to_thread(self._run_inline, fn, *args)
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ImagePoolError(f"Image operation timed out after {self.timeout:.0f}s")
+        except BrokenProcessPool:
+            raise ImagePoolError("The image worker died (the image may be too large to process)")
+
+    def _run_inline(self, fn: Callable, *args) -> Any:
+        self.tasks += 1
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.total_seconds += time.perf_counter() - start
+
+    async def start(self) -> None:
+        """Start every worker ahead of the first task"""
+        if self.workers <= 0:
+            return
+        executor = self._get_executor()
+        # Workers are spawned as tasks arrive; one task per worker starts them all
+        pids = await asyncio.gather(*(
+            asyncio.wrap_future(executor.submit(_ready)) for _ in range(self.workers)
+        ), return_exceptions=True)
+        logger.info(f"Image pool ready ({len(set(p for p in pids if isinstance(p, int)))} workers)")
+
+    def close(self) -> None:
+        """Stop the workers, abandoning queued tasks"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            logger.info("Closed image pool")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get task counters"""
+        completed = self.tasks - self.busy
+        return {
+            "workers": self.workers,
+            "running": self._executor is not None,
+            "tasks": self.tasks,
+            "busy": self.busy,
+            "max_busy": self.max_busy,
+            "failures": self.failures,
+            "crashes": self.crashes,
+            "timeouts": self.timeouts,
+            "avg_seconds": round(self.total_seconds / completed, 4) if completed else None,
+        }
+
+
+# Lazily created pool shared by the whole process
+_image_pool: Optional[ImagePool] = None
+_image_pool_lock = threading.Lock()
+
+
+def get_image_pool() -> ImagePool:
+    """Get or create the image pool singleton"""
+    global _image_pool
+
+    with _image_pool_lock:
+        if _image_pool is None:
+            from .commands.registry import registry
+
+            _image_pool = ImagePool()
+            registry.add_stats_provider("image_pool", _image_pool.stats)
+
+    return _image_pool
+
+
+def close_image_pool() -> None:
+    """Stop the image workers, if the pool was ever used"""
+    if _image_pool is not None:
+        _image_pool.close()
+
+
+async def encode_contact_sheet(paths: Sequence[Optional[str]], max_bytes: int, tile_size: int = None):
+    """Tile images into a numbered grid, one worker per tile, and encode it.
+
+    The sheet is a shared memory canvas that each worker pastes its
+    thumbnail into, so no tile or sheet pixels are pickled.
+
+    Args:
+        paths: Image files in display order; None leaves a grey tile
+        max_bytes: Budget for the encoded sheet
+        tile_size: Longest side of each tile (default: the encoder's)
+
+    Returns:
+        The encoded sheet as an EncodedImage
+    """
+    from . import image_ops
+    from .image_encoder import DEFAULT_TILE_SIZE, contact_sheet_layout
+
+    pool = get_image_pool()
+    tile_size = tile_size or DEFAULT_TILE_SIZE
+    width, height, origins = contact_sheet_layout(len(paths), tile_size)
+    canvas, block = image_ops.SharedImage.allocate("RGB", width, height)
+    try:
+        pasted = await asyncio.gather(*(
+            pool.run(image_ops.paste_thumbnail, canvas, path, left, top, tile_size)
+            for path, (left, top) in zip(paths, origins) if path is not None
+        ))
+        present = iter(pasted)
+        missing = [index for index, path in enumerate(paths) if path is None or not next(present)]
+        return await pool.run(image_ops.encode_contact_sheet, canvas, origins, missing, tile_size, max_bytes)
+    finally:
+        image_ops.release(block)
+
+
+async def encode_thumbnails(paths: Sequence[str], max_bytes: int, tile_size: int = None) -> List[Any]:
+    """Encode a thumbnail of each image in parallel, splitting a byte budget between them.
+
+    Args:
+        paths: Image files to encode
+        max_bytes: Budget for all thumbnails together
+        tile_size: Longest side of each thumbnail before budget scaling (default: the encoder's)
+
+    Returns:
+        One EncodedImage per path
+    """
+    from . import image_ops
+    from .image_encoder import DEFAULT_TILE_SIZE
+
+    pool = get_image_pool()
+    per_image = max_bytes // max(1, len(paths))
+    return list(await asyncio.gather(*(
+        pool.run(image_ops.encode_file, path, per_image, None, tile_size or DEFAULT_TILE_SIZE) for path in paths
+    )))
@@ -0,0 +1,355 @@
+"""
+Latency and throughput metrics for Do Anything MCP.
+
+Every command executed through the registry is timed, and the expensive
+steps inside a command are timed as named phases (``queue``, ``upstream``,
+``decode``, ``encode``, ``base64``), along with the bytes each phase moves.
+Samples go into counters and fixed-bucket histograms: recording one is a
+clock read, a bisect and a few additions, so metrics stay on in production.
+
+The current command is tracked in a context variable, so phases recorded
+deep inside a handler (or in a worker thread started with
+``asyncio.to_thread``) are attributed to the command that caused them.
+
+Metrics are reported by the ``system_info`` command and can be exported in
+the Prometheus text format to a file (``MCP_METRICS_FILE``) or over HTTP
+(``MCP_METRICS_PORT``). Single requests can be profiled with cProfile by
+passing ``"_profile": True`` in the command parameters or listing the
+command in ``MCP_PROFILE_COMMANDS``.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger("Metrics")
+
+# Constants
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+DEFAULT_EXPORT_INTERVAL = 15.0
+
+# Command being executed in the current task or thread
+_current_command: contextvars.ContextVar[str] = contextvars.ContextVar("mcp_command", default="none")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one sample"""
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> Dict[str, Any]:
+        """Get count, mean and bucket-resolution percentiles"""
+        return {
+            "count": self.count,
+            "mean_seconds": round(self.sum / self.count, 4) if self.count else None,
+            "p50_seconds": self.quantile(0.50),
+            "p95_seconds": self.quantile(0.95),
+            "p99_seconds": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """Counters and latency histograms keyed by command and phase"""
+
+    def __init__(self, enabled: bool = None):
+        """Initialize the metrics store.
+
+        Args:
+            enabled: Whether samples are recorded (default: MCP_METRICS_ENABLED or True)
+        """
+        if enabled is None:
+            enabled = os.environ.get("MCP_METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.started = time.time()
+
+        # (command, status) -> count, (command, phase) -> histogram; "total" is the whole command
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        # (command, phase) -> bytes read, written or produced by the phase
+        self._bytes: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, command: str, phase: str, seconds: float) -> None:
+        """Record the duration of a phase of a command"""
+        if not self.enabled:
+            return
+        key = (command, phase)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        """Record the duration of a phase of the current command"""
+        self.observe(_current_command.get(), name, seconds)
+
+    def add_bytes(self, name: str, num_bytes: int, command: str = None) -> None:
+        """Count bytes moved by a phase of the current command"""
+        if not self.enabled:
+            return
+        key = (command or _current_command.get(), name)
+        with self._lock:
+            self._bytes[key] = self._bytes.get(key, 0) + num_bytes
+
+    def count(self, command: str, status: str) -> None:
+        """Count a finished command by outcome ("ok", "error" or "exception")"""
+        if not self.enabled:
+            return
+        key = (command, status)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    @contextmanager
+    def phase(self, name: str, command: str = None) -> Iterator[None]:
+        """Time the enclosed block as a phase of the current command.
+
+        Args:
+            name: Phase name, e.g. "upstream"
+            command: Command to attribute the phase to (default: the one being executed)
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(command or _current_command.get(), name, time.perf_counter() - start)
+
+    @contextmanager
+    def command(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Time a whole command and make it the current command for phases.
+
+        Yields a dictionary; set its "status" to "error" for a failed result.
+        An exception escaping the block is counted as "exception".
+        """
+        token = _current_command.set(name)
+        outcome = {"status": "ok"}
+        start = time.perf_counter()
+        try:
+            yield outcome
+        except BaseException:
+            outcome["status"] = "exception"
+            raise
+        finally:
+            self.observe(name, "total", time.perf_counter() - start)
+            self.count(name, outcome["status"])
+            _current_command.reset(token)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get per-command counts and phase latency summaries"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: histogram.summary() for key, histogram in self._histograms.items()}
+            byte_counts = dict(self._bytes)
+
+        commands: Dict[str, Dict[str, Any]] = {}
+        for (command, status), value in counters.items():
+            commands.setdefault(command, {"calls": {}, "phases": {}, "bytes": {}})["calls"][status] = value
+        for (command, phase), summary in histograms.items():
+            commands.setdefault(command, {"calls": {}, "phases": {}, "bytes": {}})["phases"][phase] = summary
+        for (command, phase), value in byte_counts.items():
+            commands.setdefault(command, {"calls": {}, "phases": {}, "bytes": {}})["bytes"][phase] = value
+
+        uptime = time.time() - self.started
+        for entry in commands.values():
+            total = sum(entry["calls"].values())
+            entry["throughput_per_second"] = round(total / uptime, 4) if uptime > 0 else None
+
+        return {"enabled": self.enabled, "uptime_seconds": round(uptime, 1), "commands": commands}
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(h.counts), h.count, h.sum) for key, h in self._histograms.items()
+            )
+            byte_counts = sorted(self._bytes.items())
+
+        lines: List[str] = [
+            "# HELP mcp_commands_total Commands executed, by outcome.",
+            "# TYPE mcp_commands_total counter",
+        ]
+        for (command, status), value in counters:
+            lines.append(f'mcp_commands_total{{command="{command}",status="{status}"}} {value}')
+
+        lines += [
+            "# HELP mcp_phase_duration_seconds Time spent per command phase (phase=\"total\" is the whole command).",
+            "# TYPE mcp_phase_duration_seconds histogram",
+        ]
+        for (command, phase), counts, count, total in histograms:
+            labels = f'command="{command}",phase="{phase}"'
+            cumulative = 0
+            for bound, bucket in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket
+                lines.append(f'mcp_phase_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'mcp_phase_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"mcp_phase_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"mcp_phase_duration_seconds_count{{{labels}}} {count}")
+
+        lines += [
+            "# HELP mcp_phase_bytes_total Bytes read, written or produced per command phase.",
+            "# TYPE mcp_phase_bytes_total counter",
+        ]
+        for (command, phase), value in byte_counts:
+            lines.append(f'mcp_phase_bytes_total{{command="{command}",phase="{phase}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Atomically write the Prometheus text to a file (e.g. for node_exporter's textfile collector)"""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temp_path, path)
+
+    async def run_file_exporter(self, path: str, interval: float = None) -> None:
+        """Rewrite the Prometheus file periodically until cancelled.
+
+        Args:
+            path: File to write
+            interval: Seconds between writes (default: MCP_METRICS_INTERVAL or 15)
+        """
+        interval = interval or float(os.environ.get("MCP_METRICS_INTERVAL", DEFAULT_EXPORT_INTERVAL))
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self.write_prometheus, path)
+                except OSError as e:
+                    logger.error(f"Failed to write metrics to {path}: {str(e)}")
+                await asyncio.sleep(interval)
+        finally:
+            # Leave the final numbers behind on shutdown
+            try:
+                self.write_prometheus(path)
+            except OSError:
+                pass
+
+    def start_http_exporter(self, host: str = "127.0.0.1", port: int = 9464):
+        """Serve ``GET /metrics`` on a background thread.
+
+        Returns:
+            The running server; call ``shutdown()`` to stop it
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+# Only one profiler can be active per interpreter
+_profile_lock = threading.Lock()
+
+
+def should_profile(command: str, params: Dict[str, Any]) -> bool:
+    """Whether a single execution of a command was asked to be profiled"""
+    if params and params.get("_profile"):
+        return True
+    selected = os.environ.get("MCP_PROFILE_COMMANDS")
+    if not selected:
+        return False
+    names = {name.strip() for name in selected.split(",")}
+    return "*" in names or command in names
+
+
+@contextmanager
+def profile_request(command: str) -> Iterator[Dict[str, Any]]:
+    """Profile the enclosed block with cProfile and save the stats.
+
+    The profiler sees everything that runs on this thread meanwhile, which
+    for async commands includes other tasks on the event loop. If another
+    request is already being profiled, this one runs unprofiled.
+
+    Yields a dictionary whose "profile_path" is set once the stats are saved
+    (load them with ``pstats`` or snakeviz).
+    """
+    info: Dict[str, Any] = {}
+    if not _profile_lock.acquire(blocking=False):
+        logger.info(f"Skipping profile of {command}: another profile is running")
+        yield info
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another tool (debugger, coverage) owns the profiling hooks
+            logger.warning(f"Cannot profile {command}: {str(e)}")
+            yield info
+            return
+        try:
+            yield info
+        finally:
+            profiler.disable()
+            profile_dir = os.environ.get("MCP_PROFILE_DIR") or os.path.join(
+                os.environ.get("MCP_WORK_DIR", os.path.join(os.getcwd(), "mcp_data")), "profiles")
+            try:
+                os.makedirs(profile_dir, exist_ok=True)
+                path = os.path.join(profile_dir, f"{command}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+                profiler.dump_stats(path)
+                info["profile_path"] = path
+                logger.info(f"Saved profile of {command} to {path}")
+            except OSError as e:
+                logger.error(f"Failed to save profile of {command}: {str(e)}")
+    finally:
+        _profile_lock.release()
+
+
+# Process-wide metrics
+metrics = Metrics()
@@ -0,0 +1,87 @@
+"""MCP resources for Do Anything MCP
+
+Generated images are exposed as resources read from MCP_WORK_DIR on demand,
+so a tool can answer with a reference and a small preview and the client
+fetches full-resolution bytes only when it needs them:
+
+    image://{image_id}.jpg           the stored image (also .png, .webp)
+    image://{image_id}/thumb/{size}  a JPEG thumbnail no larger than size pixels
+
+The extension is part of the URI because a template has a single MIME type.
+"""
+import logging
+import sys
+import os
+from typing import Optional
+
+# Configure logging
+logger = logging.getLogger("DoAnythingMCPResources")
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+# Import connection functionality using absolute imports
+from src.do_anything_mcp.connection import get_do_anything_connection
+
+# Stored image formats and the URI extension and MIME type each is served with
+IMAGE_RESOURCE_TYPES = {
+    "jpeg": ("jpg", "image/jpeg"),
+    "png": ("png", "image/png"),
+    "webp": ("webp", "image/webp"),
+}
+
+
+def image_uri(image_id: str, image_format: str) -> Optional[str]:
+    """Get the resource URI of a stored image.
+
+    Returns:
+        The URI, or None when the image is in a format without a resource
+        (e.g. a GIF upload); its thumbnail URI still works
+    """
+    if image_format not in IMAGE_RESOURCE_TYPES:
+        return None
+    extension, _ = IMAGE_RESOURCE_TYPES[image_format]
+    return f"image://{image_id}.{extension}"
+
+
+def thumbnail_uri(image_id: str, size: int) -> str:
+    """Get the resource URI of a thumbnail of a stored image"""
+    return f"image://{image_id}/thumb/{size}"
+
+
+async def _read_image(image_id: str, image_format: str) -> bytes:
+    """Read a stored image through the command layer"""
+    connection = get_do_anything_connection()
+    result = await connection.execute_command_async("flux_get_image", {"image_id": image_id, "encoding": "bytes"})
+    if not result.get("success", False):
+        raise ValueError(result.get("message", "Unknown error"))
+    if result.get("format") != image_format:
+        raise ValueError(f"Image {image_id} is stored as {result.get('format')}, not {image_format}")
+    return result["image_bytes"]
+
+
+def register_resources(mcp):
+    """Register all MCP resources with the FastMCP instance"""
+
+    # One template per format, since the MIME type belongs to the template
+    for image_format, (extension, mime_type) in IMAGE_RESOURCE_TYPES.items():
+        def make_reader(image_format):
+            async def read_image(image_id: str) -> bytes:
+                return await _read_image(image_id, image_format)
+            return read_image
+
+        mcp.resource(
+            f"image://{{image_id}}.{extension}",
+            name=f"image_{extension}",
+            description=f"A generated {image_format.upper()} image at full resolution",
+            mime_type=mime_type
+        )(make_reader(image_format))
+
+    @mcp.resource("image://{image_id}/thumb/{size}", name="image_thumbnail", mime_type="image/jpeg")
+    async def image_thumbnail(image_id: str, size: int) -> bytes:
+        """A JPEG thumbnail of a generated image, at most size pixels on its longest side"""
+        connection = get_do_anything_connection()
+        result = await connection.execute_command_async("image_thumbnail", {"image_id": image_id, "size": size})
+        if not result.get("success", False):
+            raise ValueError(result.get("message", "Unknown error"))
+        return result["image_bytes"]
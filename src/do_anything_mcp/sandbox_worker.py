@@ -0,0 +1,206 @@
+"""
+Sandbox worker process for execute_python_code.
+
+Started by the sandbox pool as ``python -I sandbox_worker.py <config>``; it
+imports nothing from the server so it stays small and cannot reach its
+state. At startup it applies the memory limit and a hard CPU time limit
+for its whole life, preloads the configured modules and reports ready,
+then runs one request at a time:
+
+    parent -> worker: {"code": "...", "cpu_seconds": 10}\\n
+    worker -> parent: {"success": true, "stdout": "...", ...}\\n
+
+The protocol uses private copies of the original stdin/stdout; file
+descriptors 0 and 1 are pointed at /dev/null so user code cannot corrupt it.
+Each run gets fresh globals (with the preloaded modules bound), captured
+output and a CPU time allowance. The allowance is the soft RLIMIT_CPU,
+which user code could raise again, but never past the hard limit, where
+the kernel kills the worker.
+"""
+
+import io
+import os
+import sys
+import ast
+import json
+import math
+import signal
+import traceback
+import importlib
+from contextlib import redirect_stdout, redirect_stderr
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; limits are then enforced by wall time only
+    resource = None
+
+# Constants
+MAX_OUTPUT_CHARS = 64 * 1024
+MAX_RESULT_CHARS = 16 * 1024
+DEFAULT_MAX_RESPONSE_BYTES = 1024 * 1024 - 1
+TRUNCATED = "\n[output truncated]"
+# Response fields cut when the encoded response is too long for the pool
+TEXT_FIELDS = ("stdout", "stderr", "error", "result")
+
+
+class CPUTimeExceeded(BaseException):
+    """Raised in user code when its CPU allowance runs out"""
+
+
+class _CappedWriter(io.TextIOBase):
+    """Text stream that keeps only the first max_chars characters"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        room = self.max_chars - self.size
+        if room <= 0:
+            self.truncated = True
+            return len(text)
+        if len(text) > room:
+            self.truncated = True
+        self.parts.append(text[:room])
+        self.size += min(len(text), room)
+        return len(text)
+
+    def getvalue(self) -> str:
+        value = "".join(self.parts)
+        return value + "\n[output truncated]" if self.truncated else value
+
+
+def _on_cpu_limit(signum, frame):
+    raise CPUTimeExceeded()
+
+
+def _cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _set_cpu_allowance(seconds: float) -> None:
+    """Let this process use seconds more CPU time before SIGXCPU"""
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = math.ceil(_cpu_time() + seconds)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _run(code: str, cpu_seconds: float, modules: dict) -> dict:
+    """Execute code like a script, returning the value of a trailing expression"""
+    stdout = _CappedWriter(MAX_OUTPUT_CHARS)
+    stderr = _CappedWriter(MAX_OUTPUT_CHARS)
+    response = {"success": True, "result": None, "error": None, "error_type": None, "limit": None}
+    cpu_start = _cpu_time() if resource else 0.0
+
+    try:
+        tree = ast.parse(code, "<code>", "exec")
+        # Like the REPL, report the value of a final expression
+        last = None
+        if tree.body and isinstance(tree.body[-1], ast.Expr):
+            last = ast.Expression(tree.body.pop().value)
+
+        namespace = {"__name__": "__main__", "__builtins__": __builtins__, **modules}
+        if resource:
+            _set_cpu_allowance(cpu_seconds)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exec(compile(tree, "<code>", "exec"), namespace)
+            if last is not None:
+                value = eval(compile(last, "<code>", "eval"), namespace)
+                if value is not None:
+                    response["result"] = repr(value)[:MAX_RESULT_CHARS]
+    except CPUTimeExceeded:
+        response.update(success=False, error=f"CPU time limit of {cpu_seconds}s exceeded",
+                        error_type="CPUTimeExceeded", limit="cpu")
+    except MemoryError:
+        response.update(success=False, error="Memory limit exceeded", error_type="MemoryError", limit="memory")
+    except SyntaxError as e:
+        response.update(success=False, error="".join(traceback.format_exception_only(type(e), e)),
+                        error_type=type(e).__name__)
+    except BaseException as e:
+        # SystemExit and KeyboardInterrupt from user code are ordinary failures here
+        lines = traceback.format_exception(type(e), e, e.__traceback__)
+        # Drop the frames of this worker from the traceback
+        lines = [line for line in lines if __file__ not in line]
+        response.update(success=False, error="".join(lines)[-MAX_OUTPUT_CHARS:], error_type=type(e).__name__)
+    finally:
+        if resource:
+            _set_cpu_allowance(3600)
+
+    response["stdout"] = stdout.getvalue()
+    response["stderr"] = stderr.getvalue()
+    if resource:
+        response["cpu_seconds"] = round(_cpu_time() - cpu_start, 4)
+        response["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return response
+
+
+def _encode(response: dict, max_bytes: int) -> str:
+    """Serialize a response, halving its longest text field until it fits.
+
+    The character caps are not enough on their own: JSON escapes control
+    characters to six bytes each, so capped output can still encode to
+    more than the pool reads in one line.
+    """
+    line = json.dumps(response)
+    while len(line) > max_bytes:
+        field = max(TEXT_FIELDS, key=lambda name: len(response.get(name) or ""))
+        text = response[field] or ""
+        if len(text) <= 2 * len(TRUNCATED):
+            break
+        response[field] = text[:len(text) // 2] + TRUNCATED
+        line = json.dumps(response)
+    return line
+
+
+def main():
+    config = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+    max_response_bytes = config.get("max_response_bytes", DEFAULT_MAX_RESPONSE_BYTES)
+
+    # Keep private handles for the protocol and detach fds 0 and 1 from it
+    protocol_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    protocol_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    if resource:
+        memory_bytes = config.get("memory_bytes")
+        if memory_bytes:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        cpu_budget = config.get("cpu_budget")
+        if cpu_budget:
+            # The hard limit cannot be raised again, by this process or user code
+            limit = math.ceil(_cpu_time() + cpu_budget)
+            resource.setrlimit(resource.RLIMIT_CPU, (limit, limit))
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    # Preloaded modules are also bound as globals of every run
+    modules = {}
+    for name in config.get("preload", []):
+        try:
+            importlib.import_module(name)
+            modules[name.partition(".")[0]] = sys.modules[name.partition(".")[0]]
+        except Exception:
+            pass
+
+    protocol_out.write(json.dumps({"ready": True, "pid": os.getpid(), "preloaded": sorted(modules)}) + "\n")
+    protocol_out.flush()
+
+    # Exit when the parent closes the pipe
+    for line in protocol_in:
+        request = json.loads(line)
+        response = _run(request.get("code", ""), float(request.get("cpu_seconds", 10)), modules)
+        protocol_out.write(_encode(response, max_response_bytes) + "\n")
+        protocol_out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,9 @@ functionality through a clean API.
 import logging
 import sys
 import os
+import asyncio
 import argparse
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from typing import AsyncIterator, Dict, Any
 
 from mcp.server.fastmcp import FastMCP
@@ -28,10 +29,27 @@ from src.do_anything_mcp.connection import (
 
 # Import tools registration
 from src.do_anything_mcp.tools import register_tools
+from src.do_anything_mcp.resources import register_resources
+from src.do_anything_mcp.http_client import close_http_client
+from src.do_anything_mcp.storage import get_storage
+from src.do_anything_mcp.metrics import metrics
+from src.do_anything_mcp.commands.python_sandbox import get_sandbox_pool, close_sandbox_pool
+from src.do_anything_mcp.commands.jobs import close_job_manager
+from src.do_anything_mcp.commands.uploads import close_upload_manager
+from src.do_anything_mcp.image_pool import close_image_pool
+from src.do_anything_mcp.transport import (
+    worker_index, serve_sse, run_workers, worker_command, is_loopback, SOCKET_DIRNAME
+)
 
-@asynccontextmanager
-async def server_lifespan(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
-    """Manage the lifecycle of the MCP server"""
+# Process-wide resources are shared by all sessions; see server_runtime
+_runtime_lock = asyncio.Lock()
+_runtime_users = 0
+_runtime_state: Dict[str, Any] = {}
+
+async def _start_runtime() -> None:
+    """Start the resources shared by every session of this process"""
+    state = _runtime_state
+    index = worker_index()
     
     # Initialize connection
     logger.info("Initializing Do Anything MCP connection")
@@ -45,12 +63,80 @@ async def server_lifespan(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
     os.makedirs(work_dir, exist_ok=True)
     logger.info(f"Using working directory: {work_dir}")
     
-    logger.info("Do Anything MCP Server started successfully")
+    # Keep the working directory within its quota; one worker does it for all
+    if not index:
+        state["eviction_task"] = asyncio.create_task(get_storage(work_dir).run_eviction_loop())
     
-    yield {"status": "running", "message": "Do Anything MCP Server is running"}
+    # Optionally export metrics in the Prometheus text format, per worker
+    if os.environ.get("MCP_METRICS_FILE"):
+        path = os.environ["MCP_METRICS_FILE"] + (f".{index}" if index is not None else "")
+        state["metrics_task"] = asyncio.create_task(metrics.run_file_exporter(path))
+    if os.environ.get("MCP_METRICS_PORT"):
+        state["metrics_server"] = metrics.start_http_exporter(
+            os.environ.get("MCP_METRICS_HOST", "127.0.0.1"), int(os.environ["MCP_METRICS_PORT"]) + (index or 0))
     
-    # Cleanup on shutdown
+    # Optionally load commands in the background so the handshake isn't delayed
+    if os.environ.get("MCP_WARMUP", "0").lower() in ("1", "true", "yes"):
+        state["warmup_task"] = asyncio.create_task(get_do_anything_connection().warm_up())
+    
+    # Start the Python sandbox workers so the first call doesn't wait for them
+    if get_sandbox_pool().size > 0:
+        state["sandbox_task"] = asyncio.create_task(get_sandbox_pool().start())
+    
+    logger.info("Do Anything MCP Server started successfully")
+
+async def _stop_runtime() -> None:
+    """Stop the process-wide resources"""
+    state = _runtime_state
     logger.info("Shutting down Do Anything MCP Server")
+    for name in ("warmup_task", "eviction_task", "sandbox_task"):
+        task = state.pop(name, None)
+        if task is not None and not task.done():
+            task.cancel()
+    # Record unfinished jobs as interrupted before what they use goes away
+    await close_job_manager()
+    await close_sandbox_pool()
+    close_upload_manager()
+    await asyncio.to_thread(close_image_pool)
+    metrics_task = state.pop("metrics_task", None)
+    if metrics_task is not None:
+        metrics_task.cancel()
+        # Let the exporter write the final numbers
+        with suppress(asyncio.CancelledError):
+            await metrics_task
+    metrics_server = state.pop("metrics_server", None)
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    await close_http_client()
+
+@asynccontextmanager
+async def server_runtime() -> AsyncIterator[None]:
+    """Hold the process-wide resources, starting them for the first holder
+    and stopping them when the last one lets go.
+    
+    Over stdio the only session holds them. The network transport holds
+    them for as long as it serves, so sessions come and go without
+    restarting pools or interrupting background jobs.
+    """
+    global _runtime_users
+    
+    async with _runtime_lock:
+        if _runtime_users == 0:
+            await _start_runtime()
+        _runtime_users += 1
+    try:
+        yield
+    finally:
+        async with _runtime_lock:
+            _runtime_users -= 1
+            if _runtime_users == 0:
+                await _stop_runtime()
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP) -> AsyncIterator[Dict[str, Any]]:
+    """Manage the lifecycle of an MCP session"""
+    async with server_runtime():
+        yield {"status": "running", "message": "Do Anything MCP Server is running"}
 
 # Get timeout from environment or use default (increased from default 10 seconds to 120 seconds)
 DEFAULT_TIMEOUT = 120  # 2 minutes
@@ -62,17 +148,26 @@ mcp = FastMCP(lifespan=server_lifespan, timeout=timeout)
 # Register all tools
 register_tools(mcp)
 
+# Register all resources
+register_resources(mcp)
+
 def main():
     """Run the MCP server"""
     parser = argparse.ArgumentParser(description="Do Anything MCP Server")
-    parser.add_argument("--host", default="localhost", help="Host to bind the server to")
-    parser.add_argument("--port", type=int, default=9877, help="Port to listen on")
+    parser.add_argument("--transport", choices=("stdio", "sse"), default=os.environ.get("MCP_TRANSPORT", "stdio"),
+                        help="stdio for a single local client, sse to serve clients over HTTP (default: stdio)")
+    parser.add_argument("--host", default="localhost", help="Host to bind the server to (sse)")
+    parser.add_argument("--port", type=int, default=9877, help="Port to listen on (sse)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("MCP_WORKERS", 1)),
+                        help="Worker processes serving sse clients (default: 1)")
     parser.add_argument("--work-dir", default=os.environ.get("MCP_WORK_DIR", os.path.join(os.getcwd(), "mcp_data")),
                         help="Working directory for file storage")
     parser.add_argument("--hf-token", default=os.environ.get("HF_TOKEN"),
                         help="Hugging Face token for accessing private spaces")
     parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
                         help=f"Timeout in seconds for tool operations (default: {DEFAULT_TIMEOUT})")
+    parser.add_argument("--warmup", action="store_true",
+                        help="Load commands and open the HTTP pool in the background at startup")
     
     args = parser.parse_args()
     
@@ -80,24 +175,55 @@ def main():
     os.environ["MCP_WORK_DIR"] = args.work_dir
     if args.hf_token:
         os.environ["HF_TOKEN"] = args.hf_token
+    if args.warmup:
+        os.environ["MCP_WARMUP"] = "1"
     
     # Set timeout globally
     os.environ["MCP_TIMEOUT"] = str(args.timeout)
     global timeout
     timeout = args.timeout
     
-    logger.info(f"Starting Do Anything MCP Server on {args.host}:{args.port}")
     logger.info(f"Using working directory: {args.work_dir}")
     logger.info(f"Tool operation timeout: {timeout} seconds")
     
-    # Note: FastMCP.run() doesn't accept host/port arguments
+    if args.transport == "sse":
+        # Anyone who can reach the port can use every tool
+        if not os.environ.get("MCP_AUTH_TOKEN") and not is_loopback(args.host):
+            logger.error(f"Refusing to serve on {args.host} without MCP_AUTH_TOKEN; "
+                         "set it or bind a loopback host")
+            sys.exit(1)
+        if int(os.environ.get("MCP_SANDBOX_WORKERS", 0)) > 0 and \
+                os.environ.get("MCP_SANDBOX_OVER_SSE", "0").lower() not in ("1", "true", "yes"):
+            logger.warning("Python execution is not served over sse unless MCP_SANDBOX_OVER_SSE=1; disabling it")
+            os.environ["MCP_SANDBOX_WORKERS"] = "0"
+    
     try:
-        mcp.run()
+        if args.transport == "stdio":
+            mcp.run()
+        elif args.workers > 1 and worker_index() is None:
+            # Forward the options; the workers get the rest through the environment
+            logger.info(f"Starting Do Anything MCP Server on {args.host}:{args.port} with {args.workers} workers")
+            worker_argv = worker_command() + [
+                "--transport", "sse", "--host", args.host, "--port", str(args.port),
+                "--work-dir", args.work_dir, "--timeout", str(args.timeout)
+            ]
+            sys.exit(run_workers(args.workers, args.host, args.port, worker_argv, _socket_dir(args.work_dir)))
+        else:
+            logger.info(f"Starting Do Anything MCP Server on {args.host}:{args.port}")
+            serve_sse(mcp, server_runtime, args.host, args.port)
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     except Exception as e:
         logger.error(f"Error starting server: {str(e)}")
         sys.exit(1)
 
+def _socket_dir(work_dir: str) -> str:
+    """Directory for the workers' Unix sockets, within the socket path length limit"""
+    socket_dir = os.path.join(os.path.abspath(work_dir), SOCKET_DIRNAME)
+    if len(socket_dir) > 80:
+        import tempfile
+        socket_dir = tempfile.mkdtemp(prefix="do-anything-mcp-")
+    return socket_dir
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,329 @@
+"""
+Work directory storage manager for Do Anything MCP.
+
+Files are stored in hash-sharded subdirectories (``objects/ab/cd/...``) so no
+single directory grows without bound, and every stored file is recorded in a
+compact SQLite index keyed by its id. Files derived from another one use
+ids of the form ``<id>.<name>``, share its shard and are removed with it.
+The index makes lookups by id a single query instead of a directory scan
+and drives LRU eviction against a byte quota and a maximum file age, which
+runs periodically on a background task.
+"""
+
+import os
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger("WorkDirStorage")
+
+# Constants
+INDEX_FILENAME = "storage.sqlite3"
+OBJECTS_DIRNAME = "objects"
+TEMP_DIRNAME = "tmp"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024 * 1024  # 10 GiB
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60  # 30 days
+DEFAULT_EVICT_INTERVAL = 300.0
+# Temporary files older than this are leftovers from interrupted writes
+STALE_TEMP_AGE = 60 * 60
+# Files written flat into the work directory before sharding was introduced
+LEGACY_PREFIXES = ("flux_image_",)
+
+
+class WorkDirStorage:
+    """Sharded file store with an id index, quota and age-based LRU eviction"""
+
+    def __init__(self, work_dir: str, max_bytes: int = None, max_age: float = None):
+        """Initialize the storage manager.
+
+        Args:
+            work_dir: Root of the working directory
+            max_bytes: Byte quota for all stored files (default: MCP_STORAGE_MAX_BYTES or 10 GiB, 0 for none)
+            max_age: Maximum file age in seconds (default: MCP_STORAGE_MAX_AGE or 30 days, 0 for none)
+        """
+        self.work_dir = work_dir
+        self.objects_dir = os.path.join(work_dir, OBJECTS_DIRNAME)
+        self.temp_dir = os.path.join(work_dir, TEMP_DIRNAME)
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.environ.get("MCP_STORAGE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.max_age = max_age if max_age is not None else float(
+            os.environ.get("MCP_STORAGE_MAX_AGE", DEFAULT_MAX_AGE))
+
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.last_eviction = None
+
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the index database on first use"""
+        if self._db is None:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.temp_dir, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(self.work_dir, INDEX_FILENAME),
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            # WAL lets several server processes share one work directory
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " id TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " kind TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return self._db
+
+    @property
+    def opened(self) -> bool:
+        """Whether the index has been opened in this process"""
+        return self._db is not None
+
+    def shard_dir(self, file_id: str) -> str:
+        """Get the directory a file id (and the files derived from it) is stored in"""
+        return os.path.join(self.objects_dir, file_id[:2], file_id[2:4])
+
+    def allocate_path(self, file_id: str, filename: str) -> str:
+        """Get the path a new file should be written to, creating its shard.
+
+        Args:
+            file_id: Identifier of the file (hex, so its prefix spreads evenly)
+            filename: Name of the file inside its shard
+
+        Returns:
+            Absolute path for the file
+        """
+        directory = self.shard_dir(file_id)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def temp_path(self, name: str) -> str:
+        """Get a path for a temporary file on the same filesystem as the store"""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        return os.path.join(self.temp_dir, name)
+
+    def add(self, file_id: str, path: str, kind: str = "file") -> None:
+        """Record a stored file in the index.
+
+        Args:
+            file_id: Identifier of the file
+            path: Path of the file
+            kind: Category of the file (e.g. "flux_image")
+        """
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO files (id, path, kind, size, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, os.path.relpath(path, self.work_dir), kind, size, now, now),
+            )
+
+    def get_path(self, file_id: str) -> Optional[str]:
+        """Look up a file by id and mark it as recently used.
+
+        Args:
+            file_id: Identifier of the file
+
+        Returns:
+            Absolute path of the file, or None if it is unknown or gone
+        """
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT path FROM files WHERE id = ?", (file_id,)).fetchone()
+            if row is None:
+                return None
+
+            path = os.path.join(self.work_dir, row[0])
+            if not os.path.exists(path):
+                db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                return None
+
+            db.execute("UPDATE files SET last_access = ? WHERE id = ?", (time.time(), file_id))
+            return path
+
+    def remove(self, file_id: str) -> bool:
+        """Delete a file and its index entry.
+
+        Returns:
+            Whether the file was known
+        """
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT path, size FROM files WHERE id = ?", (file_id,)).fetchone()
+            if row is None:
+                return False
+            self._delete(db, file_id, row[0], row[1])
+            return True
+
+    def _delete(self, db: sqlite3.Connection, file_id: str, rel_path: str, size: int) -> Tuple[int, int]:
+        """Remove a file and the files derived from it from disk and the index.
+
+        Returns:
+            Number of files and bytes removed, derived files included
+        """
+        if db.execute("DELETE FROM files WHERE id = ?", (file_id,)).rowcount == 0:
+            # Already removed along with the file it was derived from
+            return 0, 0
+        try:
+            os.remove(os.path.join(self.work_dir, rel_path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove {rel_path}: {str(e)}")
+        self.evicted += 1
+        self.evicted_bytes += size
+        files, freed = 1, size
+
+        # Derived ids sort between "<id>." and "<id>/", so this is an index range scan
+        for derived_id, derived_path, derived_size in db.execute(
+            "SELECT id, path, size FROM files WHERE id > ? AND id < ?", (f"{file_id}.", f"{file_id}/")
+        ).fetchall():
+            derived_files, derived_bytes = self._delete(db, derived_id, derived_path, derived_size)
+            files += derived_files
+            freed += derived_bytes
+        return files, freed
+
+    def evict(self) -> int:
+        """Remove expired files, then least recently used ones until under quota.
+
+        Returns:
+            Number of files removed
+        """
+        removed = 0
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+
+            if self.max_age:
+                for file_id, rel_path, size in db.execute(
+                    "SELECT id, path, size FROM files WHERE created < ?", (now - self.max_age,)
+                ).fetchall():
+                    removed += self._delete(db, file_id, rel_path, size)[0]
+
+            if self.max_bytes:
+                total = db.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+                if total > self.max_bytes:
+                    for file_id, rel_path, size in db.execute(
+                        "SELECT id, path, size FROM files ORDER BY last_access"
+                    ).fetchall():
+                        files, freed = self._delete(db, file_id, rel_path, size)
+                        removed += files
+                        total -= freed
+                        if total <= self.max_bytes:
+                            break
+
+        self._sweep_temp(now)
+        self.last_eviction = now
+        if removed:
+            logger.info(f"Evicted {removed} files from {self.work_dir}")
+        return removed
+
+    def _sweep_temp(self, now: float) -> None:
+        """Delete temporary files left behind by interrupted writes"""
+        try:
+            entries = list(os.scandir(self.temp_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime > STALE_TEMP_AGE:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def import_legacy_files(self) -> int:
+        """Index files written flat into the work directory by older versions, once.
+
+        The files stay where they are; indexing them brings them under the
+        quota and age limits.
+
+        Returns:
+            Number of files indexed
+        """
+        with self._lock:
+            db = self._connect()
+            if db.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+                return 0
+
+        imported = 0
+        for entry in os.scandir(self.work_dir):
+            if not entry.is_file() or not entry.name.startswith(LEGACY_PREFIXES):
+                continue
+            file_id = os.path.splitext(entry.name)[0].rsplit("_", 1)[-1]
+            stat = entry.stat()
+            with self._lock:
+                self._connect().execute(
+                    "INSERT OR IGNORE INTO files (id, path, kind, size, created, last_access)"
+                    " VALUES (?, ?, 'legacy', ?, ?, ?)",
+                    (file_id, entry.name, stat.st_size, stat.st_mtime, stat.st_atime),
+                )
+            imported += 1
+
+        with self._lock:
+            self._connect().execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '1')")
+        if imported:
+            logger.info(f"Indexed {imported} legacy files in {self.work_dir}")
+        return imported
+
+    async def run_eviction_loop(self, interval: float = None) -> None:
+        """Evict periodically until cancelled.
+
+        Args:
+            interval: Seconds between runs (default: MCP_STORAGE_EVICT_INTERVAL or 300)
+        """
+        interval = interval or float(os.environ.get("MCP_STORAGE_EVICT_INTERVAL", DEFAULT_EVICT_INTERVAL))
+        await asyncio.to_thread(self.import_legacy_files)
+        while True:
+            try:
+                await asyncio.to_thread(self.evict)
+            except Exception as e:
+                logger.error(f"Eviction failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get usage and eviction statistics"""
+        with self._lock:
+            files, total = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+        return {
+            "files": files,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "evicted": self.evicted,
+            "evicted_bytes": self.evicted_bytes,
+            "last_eviction": self.last_eviction,
+        }
+
+
+# Storage instances by work directory
+_storages: Dict[str, WorkDirStorage] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(work_dir: str = None) -> WorkDirStorage:
+    """Get or create the storage manager for a work directory.
+
+    Args:
+        work_dir: Work directory (default: MCP_WORK_DIR or ./mcp_data)
+    """
+    work_dir = os.path.abspath(work_dir or os.environ.get("MCP_WORK_DIR", os.path.join(os.getcwd(), "mcp_data")))
+    with _storages_lock:
+        storage = _storages.get(work_dir)
+        if storage is None:
+            storage = _storages[work_dir] = WorkDirStorage(work_dir)
+        return storage
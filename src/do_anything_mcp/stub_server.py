@@ -0,0 +1,232 @@
+"""
+Local stand-in for the Hugging Face inference API.
+
+Serves ``POST /models/<model>`` like the hosted API and returns generated
+images (and ``POST /v1/images/generations`` like an OpenAI-style server,
+with the image as ``b64_json``), with knobs to simulate the upstream behaviours the command layer has
+to cope with: latency, model loading (503 with ``estimated_time``),
+throttling (429 with ``Retry-After``, at random or past a per-token rate
+like the hosted API's) and random server errors.
+
+Point the server at it with ``HF_API_BASE_URL``:
+
+    python -m src.do_anything_mcp.stub_server --port 8910 --loading-for 5
+    HF_API_BASE_URL=http://127.0.0.1:8910/models do-anything-mcp
+"""
+
+import io
+import json
+import base64
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+# Configure logging
+logger = logging.getLogger("StubInferenceServer")
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub inference server"""
+    latency: float = 0.0
+    error_rate: float = 0.0
+    # Status of the simulated errors, e.g. 401 for a backend with a bad token
+    error_status: int = 500
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    loading_for: float = 0.0
+    image_format: str = "JPEG"
+    # Occasional slow answers, to exercise tail latency handling
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    # Requests per second allowed per bearer token (0: unlimited)
+    token_rate: float = 0.0
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Request handler; configuration and counters live on the server"""
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "Invalid JSON"})
+            return
+
+        with server.lock:
+            server.requests += 1
+        config = server.config
+
+        # The model is "loading" for the first seconds after startup
+        loading_left = server.started + config.loading_for - time.monotonic()
+        if loading_left > 0:
+            self._send_json(503, {"error": "Model is currently loading", "estimated_time": round(loading_left, 2)})
+            return
+
+        if config.token_rate:
+            wait = server.throttle(self.headers.get("Authorization", ""))
+            if wait:
+                self._send_json(429, {"error": "Rate limit reached"}, {"Retry-After": f"{wait:.2f}"})
+                return
+
+        if random.random() < config.throttle_rate:
+            self._send_json(429, {"error": "Rate limit reached"}, {"Retry-After": str(config.retry_after)})
+            return
+
+        if config.latency:
+            time.sleep(config.latency)
+        if config.slow_rate and random.random() < config.slow_rate:
+            time.sleep(config.slow_latency)
+
+        if random.random() < config.error_rate:
+            self._send_json(config.error_status, {"error": f"Simulated error {config.error_status}"})
+            return
+
+        if self.path.rstrip("/").endswith("/images/generations"):
+            try:
+                width, height = (int(v) for v in payload.get("size", "1024x1024").split("x"))
+            except ValueError:
+                self._send_json(400, {"error": "Invalid size"})
+                return
+            data = render_image(width, height, payload.get("prompt", ""), config.image_format)
+            self._send_json(200, {"created": int(time.time()), "data": [{"b64_json": base64.b64encode(data).decode("ascii")}]})
+            return
+
+        parameters = payload.get("parameters", {})
+        data = render_image(
+            parameters.get("width", 1024),
+            parameters.get("height", 1024),
+            payload.get("inputs", ""),
+            config.image_format
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", f"image/{config.image_format.lower()}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class _StubServer(ThreadingHTTPServer):
+    """Threaded server holding the stub's configuration and counters"""
+
+    daemon_threads = True
+
+    def throttle(self, authorization: str) -> float:
+        """Count a request against its token's rate; seconds to wait if it is over"""
+        now = time.monotonic()
+        with self.lock:
+            recent = self.token_requests[authorization]
+            while recent and now - recent[0] >= 1.0:
+                recent.popleft()
+            if len(recent) >= self.config.token_rate:
+                self.throttled += 1
+                return 1.0 - (now - recent[0])
+            recent.append(now)
+            return 0.0
+
+
+def render_image(width: int, height: int, prompt: str, image_format: str = "JPEG") -> bytes:
+    """Render a deterministic placeholder image for a prompt"""
+    from PIL import Image as PILImage
+    from PIL import ImageDraw
+
+    seed = sum(prompt.encode("utf-8")) % 256
+    image = PILImage.linear_gradient("L").resize((width, height))
+    image = PILImage.merge("RGB", (image, image.rotate(90), PILImage.new("L", (width, height), seed)))
+    ImageDraw.Draw(image).text((10, 10), prompt[:80], fill=(255, 255, 255))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, config: StubConfig = None) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub server on a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind, 0 picks a free one
+        config: Simulated upstream behaviour
+
+    Returns:
+        The running server (call ``shutdown()`` to stop it) and the base URL
+        to use as HF_API_BASE_URL
+    """
+    server = _StubServer((host, port), _StubHandler)
+    server.config = config or StubConfig()
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.throttled = 0
+    server.token_requests = defaultdict(deque)
+    server.started = time.monotonic()
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/models"
+    logger.info(f"Stub inference server listening on {base_url}")
+    return server, base_url
+
+
+def main():
+    """Run the stub server in the foreground"""
+    parser = argparse.ArgumentParser(description="Local stand-in for the HF inference API")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind to")
+    parser.add_argument("--port", type=int, default=8910, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=500, help="Status of the --error-rate answers")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429 responses")
+    parser.add_argument("--loading-for", type=float, default=0.0, help="Seconds the model reports loading (503)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="Extra seconds taken by slow requests")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Requests per second allowed per token (0: unlimited)")
+    parser.add_argument("--format", default="JPEG", help="Image format to return (JPEG, PNG or WEBP)")
+    parser.add_argument("--seed", type=int, help="Seed for the simulated failures, for reproducible runs")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = StubConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        loading_for=args.loading_for,
+        image_format=args.format.upper(),
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        token_rate=args.token_rate
+    )
+    server, _ = start_stub_server(args.host, args.port, config)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
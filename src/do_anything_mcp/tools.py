@@ -1,12 +1,15 @@
 import json
+import asyncio
 import logging
 import sys
 import os
-import base64
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
 from mcp.server.fastmcp import Context
 from mcp.server.fastmcp import Image
-from io import BytesIO
-from PIL import Image as PILImage
 
 # Configure logging
 logger = logging.getLogger("DoAnythingMCPTools")
@@ -16,12 +19,112 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 # Import connection functionality using absolute imports
 from src.do_anything_mcp.connection import get_do_anything_connection
+from src.do_anything_mcp.metrics import metrics
+from src.do_anything_mcp.resources import image_uri, thumbnail_uri
+from src.do_anything_mcp.commands.scheduler import PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND
+
+# The max response size is around 1MB, and base64 encoding adds ~33% overhead,
+# so inline images should stay around 750KB once base64 encoded
+MAX_INLINE_BASE64_SIZE = 750000
+MAX_INLINE_IMAGE_BYTES = MAX_INLINE_BASE64_SIZE * 3 // 4
+
+# Preview returned with a resource reference instead of the full image
+PREVIEW_SIZE = 256
+PREVIEW_MAX_BYTES = 32 * 1024
+
+# Seconds between progress notifications while waiting on the backend
+PROGRESS_INTERVAL = float(os.environ.get("MCP_PROGRESS_INTERVAL", 2.0))
+
+def _base64_size(num_bytes: int) -> int:
+    """Length of the base64 encoding of num_bytes bytes"""
+    return 4 * ((num_bytes + 2) // 3)
+
+# Server-assigned keys of the live MCP sessions
+_session_keys: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+
+def _session_key(ctx: Context) -> str:
+    """Identify the MCP session a tool call belongs to by a key the server assigns.
+
+    Unlike the client_id a client sends, it cannot be chosen or reused by
+    another client, so it is safe to scope per-session state with.
+    """
+    try:
+        session = ctx.session
+    except Exception:
+        return "default"
+    key = _session_keys.get(session)
+    if key is None:
+        key = _session_keys[session] = f"session-{uuid.uuid4().hex}"
+    return key
+
+@asynccontextmanager
+async def _progress_heartbeat(ctx: Context):
+    """Report elapsed time against the tool timeout until the block finishes"""
+    total = float(os.environ.get("MCP_TIMEOUT", 120))
+    start = time.monotonic()
+    
+    async def beat():
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            try:
+                await ctx.report_progress(min(time.monotonic() - start, total), total)
+            except Exception as e:
+                logger.debug(f"Stopping progress reports: {str(e)}")
+                return
+    
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+async def _reference_response(connection, result: Dict[str, Any]) -> list:
+    """Describe a generated image by its resource URIs, with a small inline preview"""
+    from mcp.types import TextContent
+    
+    preview = await connection.execute_command_async("image_thumbnail", {
+        "image_id": result["image_id"],
+        "size": PREVIEW_SIZE,
+        "max_bytes": PREVIEW_MAX_BYTES
+    })
+    
+    reference = json.dumps({
+        "uri": image_uri(result["image_id"], result.get("format")),
+        "thumbnail_uri": thumbnail_uri(result["image_id"], 512),
+        "image_id": result["image_id"],
+        "image_path": result.get("image_path"),
+        "format": result.get("format"),
+        "width": result.get("width"),
+        "height": result.get("height"),
+        "size": result.get("size")
+    }, indent=2)
+    
+    contents = [TextContent(type="text", text=reference)]
+    if preview.get("success", False):
+        with metrics.phase("base64"):
+            contents.append(Image(data=preview["image_bytes"], format=preview["format"]).to_image_content())
+    else:
+        logger.warning(f"No preview for {result['image_id']}: {preview.get('message')}")
+    return contents
+
+async def _image_tool(command: str, params: Dict[str, Any]) -> list:
+    """Run an image command and describe the stored result by its resource URIs"""
+    from mcp.types import TextContent
+    
+    try:
+        connection = get_do_anything_connection()
+        result = await connection.execute_command_async(command, params)
+        if not result.get("success", False):
+            return [TextContent(type="text", text=f"Error: {result.get('message', 'Unknown error')}")]
+        return await _reference_response(connection, result)
+    except Exception as e:
+        return [TextContent(type="text", text=f"Error: {str(e)}")]
 
 def register_tools(mcp):
     """Register all MCP tools with the FastMCP instance"""
     
     @mcp.tool()
-    def echo_message(ctx: Context, message: str = "Hello!") -> str:
+    async def echo_message(ctx: Context, message: str = "Hello!") -> str:
         """
         Echo a message back to the user
         
@@ -30,54 +133,55 @@ def register_tools(mcp):
         """
         try:
             connection = get_do_anything_connection()
-            result = connection.execute_command("echo", {"message": message})
+            result = await connection.execute_command_async("echo", {"message": message})
             return json.dumps(result, indent=2)
         except Exception as e:
             return f"Error: {str(e)}"
 
     @mcp.tool()
-    def get_system_info(ctx: Context) -> str:
+    async def get_system_info(ctx: Context) -> str:
         """
         Get information about the system
         """
         try:
             connection = get_do_anything_connection()
-            result = connection.execute_command("system_info")
+            result = await connection.execute_command_async("system_info")
             return json.dumps(result, indent=2)
         except Exception as e:
             return f"Error: {str(e)}"
 
     @mcp.tool()
-    def execute_python_code(ctx: Context, code: str) -> str:
+    async def execute_python_code(ctx: Context, code: str, timeout: float = 30) -> str:
         """
-        Execute arbitrary Python code
+        Execute Python code in a separate worker process, if the server enables it
+        
+        The code runs like a script with fresh globals; the value of a final
+        expression is returned as its repr, along with captured stdout and
+        stderr. Memory, CPU time and wall time are limited, but the code runs
+        as the server's user and is not sandboxed from its files or network.
         
         Args:
             code: The Python code to execute
+            timeout: Wall time limit in seconds (default: 30, capped by the server)
         """
         try:
-            # This is just a placeholder - in a real implementation,
-            # you would need to add security considerations
-            import ast
-            
-            # Try to parse the code to catch syntax errors
-            ast.parse(code)
-            
-            # Execute in a safe environment
-            result = {"output": "Code execution is not implemented for security reasons"}
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("execute_python", {"code": code, "timeout": timeout})
             return json.dumps(result, indent=2)
         except Exception as e:
             return f"Error: {str(e)}"
     
     @mcp.tool()
-    def FLUX_1_schnell_infer(
+    async def FLUX_1_schnell_infer(
         ctx: Context, 
         prompt: str,
         width: int = 1024,
         height: int = 1024,
         num_inference_steps: int = 4,
         seed: int = 0,
-        randomize_seed: bool = True
+        randomize_seed: bool = True,
+        priority: int = 0,
+        response: str = "inline"
     ) -> Image:
         """
         Call the FLUX.1-schnell endpoint /infer to generate an image
@@ -89,67 +193,500 @@ def register_tools(mcp):
             num_inference_steps: Number of inference steps (default: 4)
             seed: Seed for generation (default: 0)
             randomize_seed: Whether to randomize the seed (default: True)
+            priority: Order among your own queued calls when the server is busy, -1 to 1, higher runs first (default: 0)
+            response: "inline" returns the image itself, fitted to the response size limit;
+                "reference" returns its image:// resource URI and a small preview, and the
+                full-resolution image is read from the resource when needed (default: "inline")
+        """
+        # Time the whole tool call, including encoding the response
+        with metrics.command("FLUX_1_schnell_infer") as outcome:
+            try:
+                connection = get_do_anything_connection()
+                
+                # Keep the client informed while the backend works
+                async with _progress_heartbeat(ctx):
+                    result = await connection.execute_command_async("flux_generate_image", {
+                        "prompt": prompt,
+                        "width": width,
+                        "height": height,
+                        "num_inference_steps": num_inference_steps,
+                        "seed": seed,
+                        "randomize_seed": randomize_seed,
+                        "session_id": _session_key(ctx),
+                        "priority": PRIORITY_INTERACTIVE,
+                        "session_priority": priority
+                    })
+                
+                if not result.get("success", False):
+                    raise Exception(f"Error generating image: {result.get('message', 'Unknown error')}")
+                
+                if response == "reference":
+                    return await _reference_response(connection, result)
+                
+                # The image was streamed to disk; read the stored bytes once, or its
+                # precomputed reduced version when it is too large to inline
+                image_result = await connection.execute_command_async("flux_get_image", {
+                    "image_id": result.get("image_id"),
+                    "image_path": result.get("image_path"),
+                    "max_bytes": MAX_INLINE_IMAGE_BYTES,
+                    "encoding": "bytes"
+                })
+                
+                if not image_result.get("success", False):
+                    raise Exception(f"Error retrieving image: {image_result.get('message', 'Unknown error')}")
+                
+                image_data = image_result["image_bytes"]
+                image_format = image_result.get("format")
+                
+                # Only decode and re-encode when no reduced version could be served
+                if _base64_size(len(image_data)) > MAX_INLINE_BASE64_SIZE:
+                    # Encode from the stored file in the image pool, off the event loop and its core
+                    from src.do_anything_mcp import image_ops
+                    from src.do_anything_mcp.image_pool import get_image_pool
+                    with metrics.phase("encode"):
+                        encoded = await get_image_pool().run(
+                            image_ops.encode_file, result["image_path"], MAX_INLINE_IMAGE_BYTES)
+                    image_data, image_format = encoded.data, encoded.format
+                    metrics.add_bytes("encode", len(image_data))
+                
+                # Convert to image content here so the base64 step is measured
+                with metrics.phase("base64"):
+                    content = Image(data=image_data, format=image_format or "png").to_image_content()
+                metrics.add_bytes("base64", len(content.data))
+                return content
+                
+            except Exception as e:
+                logger.error(f"Error in FLUX_1_schnell_infer: {str(e)}")
+                outcome["status"] = "error"
+                # Create a TextContent object for the error
+                from mcp.types import TextContent
+                return TextContent(type="text", text=f"Error generating image: {str(e)}")
+    
+    @mcp.tool()
+    async def FLUX_1_schnell_batch_infer(
+        ctx: Context,
+        prompts: Optional[List[str]] = None,
+        variants: Optional[List[Dict[str, Any]]] = None,
+        width: int = 1024,
+        height: int = 1024,
+        num_inference_steps: int = 4,
+        seed: int = 0,
+        randomize_seed: bool = True,
+        layout: str = "contact_sheet",
+        priority: int = 0
+    ) -> list:
+        """
+        Generate up to 32 images with FLUX.1-schnell concurrently in one call
+        
+        Returns a JSON summary with the id and path of every full-resolution image
+        saved in the working directory, plus either one contact sheet with numbered
+        tiles or a thumbnail per image, sized to fit in the response.
+        
+        Args:
+            prompts: Text prompts, one image per prompt
+            variants: Instead of prompts, parameter sets such as
+                {"prompt": "...", "seed": 3, "width": 768}; missing values use the defaults below
+            width: Default image width (default: 1024)
+            height: Default image height (default: 1024)
+            num_inference_steps: Default number of inference steps (default: 4)
+            seed: Default seed; with randomize_seed off, variant i without a seed uses seed + i (default: 0)
+            randomize_seed: Whether to randomize seeds (default: True)
+            layout: "contact_sheet" for one tiled image or "thumbnails" for one image each (default: "contact_sheet")
+            priority: Order among your own queued calls when the server is busy, -1 to 1, higher runs first (default: 0)
+        """
+        from mcp.types import TextContent
+        
+        with metrics.command("FLUX_1_schnell_batch_infer") as outcome:
+            try:
+                if layout not in ("contact_sheet", "thumbnails"):
+                    raise Exception(f"Unknown layout: {layout}")
+                
+                connection = get_do_anything_connection()
+                
+                # Keep the client informed while the backend works
+                async with _progress_heartbeat(ctx):
+                    result = await connection.execute_command_async("flux_generate_batch", {
+                        "items": variants if variants else [{"prompt": p} for p in prompts or []],
+                        "width": width,
+                        "height": height,
+                        "num_inference_steps": num_inference_steps,
+                        "seed": seed,
+                        "randomize_seed": randomize_seed,
+                        "session_id": _session_key(ctx),
+                        "priority": PRIORITY_BATCH,
+                        "session_priority": priority
+                    })
+                
+                if not result.get("success", False):
+                    failures = [r.get("message") for r in result.get("results", [])]
+                    raise Exception(f"{result.get('message', 'Unknown error')} {failures if failures else ''}".strip())
+                
+                results = result["results"]
+                summary = json.dumps({
+                    "message": result["message"],
+                    "layout": layout,
+                    "images": [
+                        {
+                            "index": i,
+                            "success": True,
+                            "prompt": r.get("prompt"),
+                            "image_id": r.get("image_id"),
+                            "uri": image_uri(r.get("image_id"), r.get("format")),
+                            "image_path": r.get("image_path"),
+                            "width": r.get("width"),
+                            "height": r.get("height")
+                        } if r.get("success") else {"index": i, "success": False, "message": r.get("message")}
+                        for i, r in enumerate(results)
+                    ]
+                }, indent=2)
+                
+                # The images share what is left of the response budget after the summary
+                budget = max(0, MAX_INLINE_BASE64_SIZE - len(summary)) * 3 // 4
+                from src.do_anything_mcp import image_pool
+                with metrics.phase("encode"):
+                    # Tiles and thumbnails are made in parallel in the image pool
+                    if layout == "contact_sheet":
+                        paths = [r.get("image_path") if r.get("success") else None for r in results]
+                        encoded = [await image_pool.encode_contact_sheet(paths, budget)]
+                    else:
+                        paths = [r["image_path"] for r in results if r.get("success")]
+                        encoded = await image_pool.encode_thumbnails(paths, budget)
+                
+                contents = [TextContent(type="text", text=summary)]
+                with metrics.phase("base64"):
+                    contents += [Image(data=e.data, format=e.format).to_image_content() for e in encoded]
+                metrics.add_bytes("base64", sum(len(c.data) for c in contents[1:]))
+                
+                if result.get("failed"):
+                    outcome["status"] = "error"
+                return contents
+                
+            except Exception as e:
+                logger.error(f"Error in FLUX_1_schnell_batch_infer: {str(e)}")
+                outcome["status"] = "error"
+                return [TextContent(type="text", text=f"Error generating images: {str(e)}")]
+    
+    @mcp.tool()
+    async def submit_generation(
+        ctx: Context,
+        prompt: Optional[str] = None,
+        prompts: Optional[List[str]] = None,
+        width: int = 1024,
+        height: int = 1024,
+        num_inference_steps: int = 4,
+        seed: int = 0,
+        randomize_seed: bool = True,
+        priority: int = 0
+    ) -> str:
+        """
+        Start generating images with FLUX.1-schnell in the background and return a job ID
+        
+        Use this instead of FLUX_1_schnell_infer when you have other work to do meanwhile
+        or generations are slow. Poll with get_job_status and fetch the images with
+        get_job_result; finished jobs are kept, so results survive a reconnect.
+        
+        Args:
+            prompt: The text prompt describing the image to generate
+            prompts: Instead of prompt, several prompts to generate as one batch (up to 32)
+            width: Width of the generated images (default: 1024)
+            height: Height of the generated images (default: 1024)
+            num_inference_steps: Number of inference steps (default: 4)
+            seed: Seed for generation (default: 0)
+            randomize_seed: Whether to randomize the seed (default: True)
+            priority: Order among your own queued calls when the server is busy, -1 to 1, higher runs first (default: 0)
         """
         try:
-            connection = get_do_anything_connection()
-            result = connection.execute_command("flux_generate_image", {
-                "prompt": prompt,
+            params = {
                 "width": width,
                 "height": height,
                 "num_inference_steps": num_inference_steps,
                 "seed": seed,
-                "randomize_seed": randomize_seed
-            })
-            
-            if not result.get("success", False):
-                raise Exception(f"Error generating image: {result.get('message', 'Unknown error')}")
-                
-            # Get the image path
-            image_path = result.get("image_path")
-            
-            # Read the image data
-            image_result = connection.execute_command("flux_get_image", {"image_path": image_path})
-            
-            if not image_result.get("success", False):
-                raise Exception(f"Error retrieving image: {image_result.get('message', 'Unknown error')}")
-                
-            # Get the binary image data from the result
-            base64_data = image_result.get("image_data", "")
+                "randomize_seed": randomize_seed,
+                "session_id": _session_key(ctx),
+                "priority": PRIORITY_BACKGROUND,
+                "session_priority": priority
+            }
+            if prompts:
+                command, params["items"] = "flux_generate_batch", [{"prompt": p} for p in prompts]
+            elif prompt:
+                command, params["prompt"] = "flux_generate_image", prompt
+            else:
+                raise Exception("A prompt or a list of prompts is required")
             
-            # Resize the image if it's too large
-            # The max response size is around 1MB, and base64 encoding adds ~33% overhead
-            # So we should aim for an image that's around 750KB when base64 encoded
-            if len(base64_data) > 750000:
-                # Decode the base64 data
-                image_bytes = base64.b64decode(base64_data)
-                img = PILImage.open(BytesIO(image_bytes))
-                
-                # Calculate the resize factor needed
-                # We aim for ~750KB after base64 encoding
-                current_size = len(base64_data)
-                resize_factor = (750000 / current_size) ** 0.5  # Square root for 2D scaling
-                
-                # Resize the image
-                new_width = int(img.width * resize_factor)
-                new_height = int(img.height * resize_factor)
-                img = img.resize((new_width, new_height), PILImage.LANCZOS)
-                
-                # Convert back to base64
-                buffer = BytesIO()
-                img.save(buffer, format="PNG", optimize=True)
-                base64_data = base64.b64encode(buffer.getvalue()).decode("utf-8")
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("job_submit", {"command": command, "params": params})
+            return json.dumps(result, indent=2)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    @mcp.tool()
+    async def get_job_status(ctx: Context, job_id: str) -> str:
+        """
+        Get the status of a background job: queued, running, succeeded, failed or interrupted
+        
+        Args:
+            job_id: The job ID returned by submit_generation
+        """
+        try:
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("job_status", {"job_id": job_id})
+            return json.dumps(result, indent=2)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    @mcp.tool()
+    async def get_job_result(ctx: Context, job_id: str) -> list:
+        """
+        Get the result of a finished background job
+        
+        For a single image, returns its image:// resource URI and a small preview; for a
+        batch, the URI of every image. Read a URI for the full-resolution image. While
+        the job is still running, returns its status instead.
+        
+        Args:
+            job_id: The job ID returned by submit_generation
+        """
+        from mcp.types import TextContent
+        
+        try:
+            connection = get_do_anything_connection()
+            job = await connection.execute_command_async("job_result", {"job_id": job_id})
+            result = job.pop("result", None)
+            if job.get("status") != "succeeded" or not isinstance(result, dict):
+                return [TextContent(type="text", text=json.dumps(job, indent=2))]
             
-            # Create an Image object as expected by the MCP framework
-            # Convert base64 string to bytes for the data parameter
-            image_data = base64.b64decode(base64_data)
-            return Image(data=image_data, format="png")
+            if "image_id" in result:
+                return await _reference_response(connection, result)
             
+            # A batch: list every image by its resource URIs
+            summary = {
+                **job,
+                "images": [
+                    {
+                        "index": i,
+                        "success": True,
+                        "prompt": r.get("prompt"),
+                        "image_id": r.get("image_id"),
+                        "uri": image_uri(r.get("image_id"), r.get("format")),
+                        "thumbnail_uri": thumbnail_uri(r.get("image_id"), 512),
+                        "width": r.get("width"),
+                        "height": r.get("height")
+                    } if r.get("success") else {"index": i, "success": False, "message": r.get("message")}
+                    for i, r in enumerate(result.get("results", []))
+                ]
+            }
+            return [TextContent(type="text", text=json.dumps(summary, indent=2))]
         except Exception as e:
-            logger.error(f"Error in FLUX_1_schnell_infer: {str(e)}")
-            # Create a TextContent object for the error
-            from mcp.types import TextContent
-            return TextContent(type="text", text=f"Error generating image: {str(e)}")
-            
+            return [TextContent(type="text", text=f"Error: {str(e)}")]
+    
+    @mcp.tool()
+    async def resize_image(
+        ctx: Context,
+        image_id: str,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        keep_aspect: bool = True,
+        format: Optional[str] = None,
+        quality: int = 90
+    ) -> list:
+        """
+        Resize a stored image and store the result
+        
+        Returns the new image's ID, its image:// resource URI and a small preview.
+        
+        Args:
+            image_id: ID of a generated image, an uploaded file or an earlier result
+            width: Target width in pixels
+            height: Target height in pixels
+            keep_aspect: Fit within width and height keeping the aspect ratio (default: True);
+                when False, the image is stretched to exactly width x height
+            format: Output format: "png", "jpeg" or "webp" (default: the input's)
+            quality: Quality for jpeg and webp output, 1-100 (default: 90)
+        """
+        return await _image_tool("image_resize", {
+            "image_id": image_id, "width": width, "height": height, "keep_aspect": keep_aspect,
+            "format": format, "quality": quality
+        })
+    
+    @mcp.tool()
+    async def crop_image(
+        ctx: Context,
+        image_id: str,
+        left: int,
+        top: int,
+        right: int,
+        bottom: int,
+        format: Optional[str] = None,
+        quality: int = 90
+    ) -> list:
+        """
+        Crop a stored image to a pixel box and store the result
+        
+        Args:
+            image_id: ID of a generated image, an uploaded file or an earlier result
+            left: Left edge of the box in pixels
+            top: Top edge of the box in pixels
+            right: Right edge of the box in pixels (exclusive)
+            bottom: Bottom edge of the box in pixels (exclusive)
+            format: Output format: "png", "jpeg" or "webp" (default: the input's)
+            quality: Quality for jpeg and webp output, 1-100 (default: 90)
+        """
+        return await _image_tool("image_crop", {
+            "image_id": image_id, "left": left, "top": top, "right": right, "bottom": bottom,
+            "format": format, "quality": quality
+        })
+    
+    @mcp.tool()
+    async def convert_image(ctx: Context, image_id: str, format: str, quality: int = 90) -> list:
+        """
+        Convert a stored image to another format and store the result
+        
+        Transparency is flattened onto white when converting to jpeg.
+        
+        Args:
+            image_id: ID of a generated image, an uploaded file or an earlier result
+            format: Output format: "png", "jpeg" or "webp"
+            quality: Quality for jpeg and webp output, 1-100 (default: 90)
+        """
+        return await _image_tool("image_convert", {"image_id": image_id, "format": format, "quality": quality})
+    
+    @mcp.tool()
+    async def composite_images(
+        ctx: Context,
+        image_id: str,
+        overlay_id: str,
+        x: int = 0,
+        y: int = 0,
+        opacity: float = 1.0,
+        overlay_width: Optional[int] = None,
+        format: Optional[str] = None,
+        quality: int = 90
+    ) -> list:
+        """
+        Draw one stored image over another and store the result
+        
+        The overlay's transparency is respected, e.g. for logos and watermarks.
+        
+        Args:
+            image_id: ID of the base image
+            overlay_id: ID of the image drawn on top
+            x: Left position of the overlay on the base in pixels (default: 0)
+            y: Top position of the overlay on the base in pixels (default: 0)
+            opacity: Opacity of the overlay from 0 to 1 (default: 1)
+            overlay_width: Scale the overlay to this width first, keeping its aspect ratio
+            format: Output format: "png", "jpeg" or "webp" (default: the base image's)
+            quality: Quality for jpeg and webp output, 1-100 (default: 90)
+        """
+        return await _image_tool("image_composite", {
+            "image_id": image_id, "overlay_id": overlay_id, "x": x, "y": y, "opacity": opacity,
+            "overlay_width": overlay_width, "format": format, "quality": quality
+        })
+    
+    @mcp.tool()
+    async def upload_file_begin(
+        ctx: Context,
+        filename: str,
+        size: Optional[int] = None,
+        sha256: Optional[str] = None
+    ) -> str:
+        """
+        Start uploading a file to the server's working directory
+        
+        Send the content with upload_file_chunk and complete it with upload_file_finish.
+        Files are stored by content, so identical files are kept once: if you pass the
+        SHA-256 of a file you already uploaded in this session, it is returned at once
+        with "deduplicated": true and no chunks need to be sent.
+        
+        Args:
+            filename: Name of the file (its extension is kept)
+            size: Total size in bytes, checked when the upload finishes
+            sha256: Hex SHA-256 digest of the content, if known
+        """
+        try:
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("upload_begin", {
+                "filename": filename,
+                "size": size,
+                "sha256": sha256,
+                "session_id": _session_key(ctx)
+            })
+            return json.dumps(result, indent=2)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    @mcp.tool()
+    async def upload_file_chunk(ctx: Context, upload_id: str, data: str, offset: Optional[int] = None) -> str:
+        """
+        Send the next chunk of a file being uploaded
+        
+        Chunks must be sent in order and be at most max_chunk_bytes (from
+        upload_file_begin) once decoded; 1-4 MB chunks work well. Resending a chunk
+        that was already received is harmless when its offset is given.
+        
+        Args:
+            upload_id: The upload ID returned by upload_file_begin
+            data: The chunk, base64 encoded
+            offset: Position of the chunk in the file in bytes
+        """
+        try:
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("upload_chunk", {
+                "upload_id": upload_id,
+                "data": data,
+                "offset": offset
+            })
+            return json.dumps(result, indent=2)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    @mcp.tool()
+    async def upload_file_finish(ctx: Context, upload_id: str) -> str:
+        """
+        Complete an upload and store the file
+        
+        Returns the file ID (the SHA-256 of the content) and the file's path on the
+        server. Use the file ID with get_file_info.
+        
+        Args:
+            upload_id: The upload ID returned by upload_file_begin
+        """
+        try:
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("upload_finish", {"upload_id": upload_id})
+            return json.dumps(result, indent=2)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    @mcp.tool()
+    async def upload_file_abort(ctx: Context, upload_id: str) -> str:
+        """
+        Cancel an upload and discard the chunks received so far
+        
+        Args:
+            upload_id: The upload ID returned by upload_file_begin
+        """
+        try:
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("upload_abort", {"upload_id": upload_id})
+            return json.dumps(result, indent=2)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    @mcp.tool()
+    async def get_file_info(ctx: Context, file_id: str) -> str:
+        """
+        Describe a stored file: size, type, and image dimensions or line count
+        
+        Args:
+            file_id: The file ID returned by upload_file_finish, or an image ID
+        """
+        try:
+            connection = get_do_anything_connection()
+            result = await connection.execute_command_async("file_info", {"file_id": file_id})
+            return json.dumps(result, indent=2)
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
     # Additional tools can be added here
     
     @mcp.prompt()
@@ -163,8 +700,10 @@ def register_tools(mcp):
         
         1. Get system information with `get_system_info()`
         2. Echo messages with `echo_message(message="Your message")`
-        3. Execute Python code with `execute_python_code(code="your_code_here")`
-           (Note that code execution has safety limitations)
+        3. Execute Python code with `execute_python_code(code="your_code_here")` (when the server enables it)
+           (It runs in a separate process with CPU, memory and time limits and fresh
+           globals per call; json, math, re, random, collections and other common
+           stdlib modules are already imported)
         4. Generate images with `FLUX_1_schnell_infer(prompt="your image description")`
            Additional parameters:
            - width: Image width (default: 1024)
@@ -172,6 +711,25 @@ def register_tools(mcp):
            - num_inference_steps: Number of inference steps (default: 4)
            - seed: Random seed (default: 0)
            - randomize_seed: Whether to use random seed (default: True)
-        
+           - response: "reference" to get an image:// resource URI and a small preview
+             instead of the inline image; read the URI for full resolution
+        5. Generate several variants at once with
+           `FLUX_1_schnell_batch_infer(prompts=["...", "..."])` (up to 32); it returns
+           a contact sheet and the paths of the full-resolution images
+        6. For slow generations, `submit_generation(prompt="...")` returns a job ID at
+           once; check it with `get_job_status(job_id=...)` and fetch the images with
+           `get_job_result(job_id=...)` when it has succeeded
+        7. Upload a file with `upload_file_begin(filename="...")`, then
+           `upload_file_chunk(upload_id=..., data="<base64>", offset=...)` for each chunk
+           in order and `upload_file_finish(upload_id=...)`; pass `sha256` to
+           `upload_file_begin` to skip sending a file you already uploaded in this
+           session, and cancel an upload with `upload_file_abort(upload_id=...)`.
+           Inspect stored files with `get_file_info(file_id=...)`
+        8. Edit stored images (generated or uploaded, by ID) with
+           `resize_image(image_id=..., width=...)`, `crop_image(image_id=..., left=..., top=...,
+           right=..., bottom=...)`, `convert_image(image_id=..., format="webp")` and
+           `composite_images(image_id=..., overlay_id=..., x=..., y=...)`; each stores its
+           result as a new image and returns its ID and resource URI
+
         Additional capabilities can be added as needed for specific use cases.
         """
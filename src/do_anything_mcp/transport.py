@@ -0,0 +1,335 @@
+"""Networked transport for Do Anything MCP
+
+Serves MCP over SSE (the HTTP transport of mcp 1.3) so one deployment can
+handle many clients, optionally from several worker processes:
+
+    GET  /sse                      opens a session's event stream
+    POST /messages/{worker}/       delivers client messages to a session
+    GET  /health                   liveness of the worker that answers
+
+With ``--workers N`` a supervisor process binds the listening socket once
+and starts N workers that all accept on it, restarting any that die. A
+session lives in the worker that accepted its event stream, but the client
+posts its messages on separate connections that any worker may accept, so
+the message endpoint names the owning worker and other workers relay the
+request to it over a Unix socket in MCP_WORK_DIR/run. Workers share the
+work directory, whose indexes (files, result cache, jobs) are SQLite
+databases in WAL mode.
+
+With MCP_AUTH_TOKEN set, /sse and /messages/ require it as a bearer token.
+Without it the server only binds loopback interfaces, and then only
+answers requests addressed to a loopback host name, so a web page cannot
+reach it through DNS rebinding. Requests from a browser Origin other than
+a loopback one (or one listed in MCP_ALLOWED_ORIGINS) are refused.
+"""
+import os
+import sys
+import hmac
+import time
+import socket
+import signal
+import logging
+import ipaddress
+import subprocess
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# Configure logging
+logger = logging.getLogger("DoAnythingMCPTransport")
+
+# Constants
+MESSAGE_PATH = "/messages/"
+SOCKET_DIRNAME = "run"
+LISTEN_BACKLOG = 2048
+RESTART_DELAY = 1.0
+# Workers that keep dying this soon after starting are restarted more slowly
+MIN_WORKER_UPTIME = 10.0
+MAX_RESTART_DELAY = 30.0
+# Open event streams get this long to finish when a worker stops
+GRACEFUL_SHUTDOWN = 5
+SHUTDOWN_TIMEOUT = 10.0
+
+
+def worker_index() -> Optional[int]:
+    """Index of this worker process, None when not started by the supervisor"""
+    index = os.environ.get("MCP_WORKER_INDEX")
+    return int(index) if index is not None else None
+
+
+def _worker_socket_path(socket_dir: str, index: int) -> str:
+    return os.path.join(socket_dir, f"worker-{index}.sock")
+
+
+def is_loopback(host: str) -> bool:
+    """Whether a host name or address only reaches this machine"""
+    host = host.strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _host_name(value: str) -> str:
+    """Host name of a Host header or Origin, without port"""
+    return (urlsplit(value if "//" in value else f"//{value}").hostname or "").lower()
+
+
+def _guard(app, token: Optional[str], allowed_origins: List[str]):
+    """Wrap an ASGI app with the bearer token, Host and Origin checks.
+
+    Args:
+        app: The app serving MCP
+        token: Bearer token required on every request but /health, or None
+            to accept only requests addressed to a loopback host
+        allowed_origins: Browser origins accepted besides loopback ones
+    """
+    from starlette.responses import Response
+
+    expected = f"Bearer {token}".encode("latin-1") if token else None
+
+    async def guarded(scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/health":
+            await app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        origin = headers.get(b"origin", b"").decode("latin-1")
+        if origin and origin not in allowed_origins and not is_loopback(_host_name(origin)):
+            response = Response("Origin not allowed", status_code=403)
+        elif expected is None and not is_loopback(_host_name(headers.get(b"host", b"").decode("latin-1"))):
+            response = Response("Host not allowed", status_code=421)
+        elif expected is not None and not hmac.compare_digest(headers.get(b"authorization", b""), expected):
+            response = Response("Unauthorized", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+        else:
+            await app(scope, receive, send)
+            return
+        await response(scope, receive, send)
+
+    return guarded
+
+
+def create_sse_app(mcp, runtime: Callable, index: Optional[int] = None, socket_dir: str = None):
+    """Build the ASGI app serving MCP sessions over SSE.
+
+    Args:
+        mcp: The FastMCP server
+        runtime: Async context manager factory holding the process-wide
+            resources for as long as the app runs
+        index: Worker index, when running as one of several workers
+        socket_dir: Directory of the workers' Unix sockets, for relaying
+            messages to the worker that owns a session
+
+    Returns:
+        ASGI application
+    """
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Mount, Route
+    from mcp.server.sse import SseServerTransport
+
+    endpoint = f"{MESSAGE_PATH}{index}/" if index is not None else MESSAGE_PATH
+    sse = SseServerTransport(endpoint)
+    # Clients relaying to the other workers, opened on first use
+    peers = {}
+
+    async def handle_sse(request):
+        async with sse.connect_sse(request.scope, request.receive, request._send) as streams:
+            # FastMCP 1.3 has no public hook to run a session on our own app
+            server = mcp._mcp_server
+            await server.run(streams[0], streams[1], server.create_initialization_options())
+
+    async def handle_message(scope, receive, send):
+        # /messages/{worker}/?session_id=... when several workers serve
+        owner = scope["path"][len(MESSAGE_PATH):].strip("/")
+        if index is None or not owner or owner == str(index):
+            await sse.handle_post_message(scope, receive, send)
+            return
+        if not owner.isdigit() or socket_dir is None:
+            await Response("Unknown worker", status_code=404)(scope, receive, send)
+            return
+        await relay(scope, receive, send, int(owner))
+
+    async def relay(scope, receive, send, owner: int):
+        """Forward a message to the worker that owns its session"""
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        client = peers.get(owner)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(uds=_worker_socket_path(socket_dir, owner))
+            client = peers[owner] = httpx.AsyncClient(transport=transport, base_url="http://worker")
+        # The owner checks the request again, so it gets the headers the checks read
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]
+                   if k.lower() in (b"content-type", b"authorization", b"host", b"origin")}
+        url = scope["path"] + (f"?{scope['query_string'].decode('latin-1')}" if scope["query_string"] else "")
+        try:
+            upstream = await client.post(url, content=body, headers=headers)
+        except httpx.TransportError as e:
+            logger.warning(f"Could not relay message to worker {owner}: {str(e)}")
+            await Response("Session worker unavailable", status_code=503)(scope, receive, send)
+            return
+        await Response(upstream.content, status_code=upstream.status_code,
+                       media_type=upstream.headers.get("content-type"))(scope, receive, send)
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "worker": index, "pid": os.getpid()})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with runtime():
+            try:
+                yield
+            finally:
+                for client in peers.values():
+                    await client.aclose()
+
+    app = Starlette(
+        routes=[
+            Route("/sse", endpoint=handle_sse),
+            Route("/health", endpoint=health),
+            Mount(MESSAGE_PATH, app=handle_message),
+        ],
+        lifespan=lifespan,
+    )
+    allowed_origins = [o.strip() for o in os.environ.get("MCP_ALLOWED_ORIGINS", "").split(",") if o.strip()]
+    return _guard(app, os.environ.get("MCP_AUTH_TOKEN") or None, allowed_origins)
+
+
+def serve_sse(mcp, runtime: Callable, host: str, port: int, log_level: str = "info") -> None:
+    """Serve SSE in this process until interrupted.
+
+    Inside a worker started by :func:`run_workers` the listening socket is
+    inherited (MCP_LISTEN_FD) and a Unix socket is opened for relayed
+    messages; otherwise host and port are bound directly.
+
+    Args:
+        mcp: The FastMCP server
+        runtime: Async context manager factory for process-wide resources
+        host: Interface to bind
+        port: Port to bind
+        log_level: Uvicorn log level
+    """
+    import uvicorn
+
+    index = worker_index()
+    socket_dir = os.environ.get("MCP_WORKER_SOCKET_DIR")
+    app = create_sse_app(mcp, runtime, index, socket_dir)
+    config = uvicorn.Config(app, host=host, port=port, log_level=log_level,
+                            timeout_graceful_shutdown=GRACEFUL_SHUTDOWN)
+    server = uvicorn.Server(config)
+
+    if os.environ.get("MCP_LISTEN_FD") is None:
+        server.run()
+        return
+
+    sockets = [socket.socket(fileno=int(os.environ["MCP_LISTEN_FD"]))]
+    if index is not None and socket_dir:
+        path = _worker_socket_path(socket_dir, index)
+        if os.path.exists(path):
+            os.remove(path)
+        peer_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        peer_socket.bind(path)
+        peer_socket.listen(LISTEN_BACKLOG)
+        sockets.append(peer_socket)
+    logger.info(f"Worker {index} (pid {os.getpid()}) serving on {host}:{port}")
+    server.run(sockets=sockets)
+
+
+def run_workers(workers: int, host: str, port: int, worker_argv: List[str], socket_dir: str) -> int:
+    """Supervise worker processes sharing one listening socket.
+
+    Args:
+        workers: Number of worker processes
+        host: Interface to bind
+        port: Port to bind
+        worker_argv: Command line that starts a worker (MCP_WORKER_INDEX,
+            MCP_LISTEN_FD and MCP_WORKER_SOCKET_DIR are set in its environment)
+        socket_dir: Directory for the workers' Unix sockets
+
+    Returns:
+        Exit code
+    """
+    if os.name != "posix":
+        logger.error("Multiple workers need a POSIX system; run with --workers 1")
+        return 1
+
+    listener = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+    listener.set_inheritable(True)
+    os.makedirs(socket_dir, exist_ok=True)
+
+    processes = {}
+    started = {}
+    delays = {}
+
+    def spawn(index: int) -> None:
+        env = {
+            **os.environ,
+            "MCP_WORKER_INDEX": str(index),
+            "MCP_WORKERS": str(workers),
+            "MCP_LISTEN_FD": str(listener.fileno()),
+            "MCP_WORKER_SOCKET_DIR": socket_dir,
+        }
+        processes[index] = subprocess.Popen(worker_argv, env=env, pass_fds=(listener.fileno(),))
+        started[index] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {processes[index].pid})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info(f"Serving SSE on http://{host}:{port}/sse with {workers} workers")
+    for index in range(workers):
+        spawn(index)
+
+    restart_at = {}
+    while not stopping:
+        time.sleep(0.5)
+        now = time.monotonic()
+        for index, process in list(processes.items()):
+            if process.poll() is None or stopping:
+                continue
+            if index not in restart_at:
+                # Back off when a worker keeps crashing at startup
+                quick = now - started[index] < MIN_WORKER_UPTIME
+                delays[index] = min(delays.get(index, RESTART_DELAY) * 2, MAX_RESTART_DELAY) if quick else RESTART_DELAY
+                restart_at[index] = now + delays[index]
+                logger.warning(f"Worker {index} exited with code {process.returncode}, restarting in {delays[index]:.0f}s")
+            elif now >= restart_at[index]:
+                del restart_at[index]
+                spawn(index)
+
+    logger.info("Stopping workers")
+    for process in processes.values():
+        if process.poll() is None:
+            process.terminate()
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    for process in processes.values():
+        try:
+            process.wait(max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+    listener.close()
+    return 0
+
+
+def worker_command() -> List[str]:
+    """Command line that starts a worker from this source tree"""
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    bootstrap = (
+        "import sys; sys.path.insert(0, sys.argv.pop(1)); "
+        "from src.do_anything_mcp.server import main; main()"
+    )
+    return [sys.executable, "-c", bootstrap, project_root]
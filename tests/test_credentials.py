@@ -0,0 +1,95 @@
+"""
+Token pool pacing, cooldowns and exhaustion.
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.do_anything_mcp.commands.credentials import (
+    Credential, CredentialPool, CredentialsExhaustedError, TokenBucket, load_credential_pool
+)
+
+
+def test_token_bucket_allows_bursts_then_paces():
+    bucket = TokenBucket(rate=10.0, burst=2)
+    now = time.monotonic()
+    assert bucket.take(now) and bucket.take(now)
+    assert not bucket.take(now)
+    assert bucket.wait_time(now) == pytest.approx(0.1, abs=0.01)
+    assert bucket.take(now + 0.1)
+
+
+def test_pool_waits_for_a_paced_token():
+    pool = CredentialPool([Credential("token-0", "secret-0", rate=20.0, burst=1)], max_wait=1)
+
+    async def run():
+        first = await pool.acquire()
+        pool.release(first, 200)
+        start = time.monotonic()
+        second = await pool.acquire()
+        pool.release(second, 200)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.04
+    assert pool.waits == 1
+
+
+def test_exhausted_bucket_fails_fast_when_the_wait_is_too_long():
+    pool = CredentialPool([Credential("token-0", "secret-0", rate=0.1, burst=1)], max_wait=0.5)
+
+    async def run():
+        pool.release(await pool.acquire(), 200)
+        await pool.acquire()
+
+    start = time.monotonic()
+    with pytest.raises(CredentialsExhaustedError) as error:
+        asyncio.run(run())
+    assert time.monotonic() - start < 0.5
+    assert not error.value.refused
+    assert error.value.args[0].startswith("Rate limited")
+    assert pool.exhausted == 1
+
+
+def test_calls_spread_over_tokens_and_skip_throttled_ones():
+    pool = CredentialPool([Credential(f"token-{i}", f"secret-{i}") for i in range(3)], max_wait=0)
+    names = [pool.try_acquire().name for _ in range(3)]
+    assert sorted(names) == ["token-0", "token-1", "token-2"]
+
+    throttled = pool.credentials[0]
+    pool.release(throttled, 429, retry_after=60)
+    for credential in pool.credentials[1:]:
+        pool.release(credential, 200)
+    assert all(pool.try_acquire().name != "token-0" for _ in range(4))
+
+
+def test_refused_tokens_report_an_auth_failure():
+    pool = CredentialPool([Credential(f"token-{i}", f"secret-{i}") for i in range(2)], max_wait=0)
+    for _ in range(2):
+        pool.release(pool.try_acquire(), 401)
+
+    with pytest.raises(CredentialsExhaustedError) as error:
+        asyncio.run(pool.acquire())
+    assert error.value.refused
+    assert error.value.args[0].startswith("Authentication failed")
+
+
+def test_lone_token_is_never_benched():
+    pool = CredentialPool([Credential("token-0", "secret-0")], max_wait=0)
+    pool.release(pool.try_acquire(), 403)
+    assert pool.ready()
+    assert pool.credentials[0].auth_failures == 1
+
+
+def test_workers_split_the_tokens(monkeypatch):
+    monkeypatch.setenv("HF_TOKENS", "t1,t2 t3\nt4")
+    monkeypatch.delenv("HF_TOKENS_FILE", raising=False)
+    monkeypatch.setenv("MCP_WORKERS", "2")
+    monkeypatch.setenv("MCP_WORKER_INDEX", "1")
+    pool = load_credential_pool("t0")
+    assert [credential.token for credential in pool.credentials] == ["t1", "t3"]
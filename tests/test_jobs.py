@@ -0,0 +1,96 @@
+"""
+Background jobs: results, shutdown and restarts.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.do_anything_mcp.commands import register_command
+from src.do_anything_mcp.commands.jobs import INTERRUPTED, RUNNING, SUCCEEDED, JobManager
+
+
+async def _sleepy(connection, params):
+    await asyncio.sleep(params.get("seconds", 60))
+    return {"success": True, "message": "Slept"}
+
+
+register_command("test_sleep", _sleepy, replace=True)
+
+
+def test_job_result_survives_a_new_manager(tmp_path):
+    async def run():
+        manager = JobManager(str(tmp_path))
+        submitted = await manager.submit(None, "echo", {"message": "hi"})
+        await asyncio.gather(*manager._tasks.values())
+        return submitted["job_id"]
+
+    job_id = asyncio.run(run())
+    result = JobManager(str(tmp_path)).result(job_id)
+    assert result["status"] == SUCCEEDED
+    assert result["result"]["message"] == "hi"
+
+
+def test_shutdown_interrupts_running_jobs(tmp_path):
+    async def run():
+        manager = JobManager(str(tmp_path))
+        submitted = await manager.submit(None, "test_sleep", {"seconds": 60})
+        await asyncio.sleep(0.1)
+        assert (await asyncio.to_thread(manager.status, submitted["job_id"]))["status"] == RUNNING
+        await manager.close()
+        return submitted["job_id"]
+
+    job_id = asyncio.run(run())
+    status = JobManager(str(tmp_path)).status(job_id)
+    assert status["status"] == INTERRUPTED and status["done"]
+
+
+def test_job_of_an_exited_process_is_interrupted_on_restart(tmp_path):
+    manager = JobManager(str(tmp_path))
+    # A job left running by a server process that has since exited
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    with manager._lock:
+        manager._connect().execute(
+            "INSERT INTO jobs (id, command, params, status, owner_pid, created, started)"
+            " VALUES ('orphan', 'test_sleep', '{}', ?, ?, ?, ?)",
+            (RUNNING, dead.pid, time.time(), time.time())
+        )
+
+    restarted = JobManager(str(tmp_path))
+    status = restarted.status("orphan")
+    assert status["status"] == INTERRUPTED
+    assert "restarted" in status["message"]
+    # The outcome is written back, not just reported
+    assert JobManager(str(tmp_path)).status("orphan")["status"] == INTERRUPTED
+
+
+def test_job_of_a_live_process_is_left_alone(tmp_path):
+    manager = JobManager(str(tmp_path))
+    owner = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        with manager._lock:
+            manager._connect().execute(
+                "INSERT INTO jobs (id, command, params, status, owner_pid, created)"
+                " VALUES ('elsewhere', 'test_sleep', '{}', ?, ?, ?)",
+                (RUNNING, owner.pid, time.time())
+            )
+        assert JobManager(str(tmp_path)).status("elsewhere")["status"] == RUNNING
+    finally:
+        owner.kill()
+        owner.wait()
+
+
+def test_jobs_cannot_submit_jobs_or_unknown_commands(tmp_path):
+    async def run():
+        manager = JobManager(str(tmp_path))
+        return [
+            await manager.submit(None, "job_submit", {}),
+            await manager.submit(None, "no_such_command", {}),
+        ]
+
+    assert not any(result["success"] for result in asyncio.run(run()))
@@ -0,0 +1,49 @@
+"""
+Routing across inference backends, against local stub servers.
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.do_anything_mcp.stub_server import StubConfig, start_stub_server
+from src.do_anything_mcp.http_client import close_http_client
+from src.do_anything_mcp.commands.flux_schnell import FluxSchnellCommand
+
+
+def test_fast_failing_backend_does_not_take_the_traffic(tmp_path, monkeypatch):
+    """A backend answering 401 at once must not win on latency"""
+    good, good_url = start_stub_server(config=StubConfig(latency=0.2))
+    bad, bad_url = start_stub_server(config=StubConfig(error_rate=1.0, error_status=401))
+    monkeypatch.setenv("MCP_BACKENDS", json.dumps([
+        {"name": "badtoken", "type": "stub", "url": bad_url},
+        {"name": "good", "type": "stub", "url": good_url},
+    ]))
+    monkeypatch.setenv("MCP_DERIVATIVES", "0")
+    monkeypatch.setenv("MCP_HEDGE", "0")
+    command = FluxSchnellCommand(work_dir=str(tmp_path))
+
+    async def generate():
+        try:
+            return [
+                await command.generate_image_async({"prompt": f"prompt {i}", "width": 64, "height": 64})
+                for i in range(20)
+            ]
+        finally:
+            await close_http_client()
+
+    try:
+        results = asyncio.run(generate())
+    finally:
+        good.shutdown()
+        bad.shutdown()
+
+    backends = command.router.stats()["backends"]
+    assert backends["badtoken"]["errors"] == backends["badtoken"]["requests"]
+    # One failure marks it; afterwards only exploration reaches it
+    assert backends["badtoken"]["requests"] <= 5
+    assert sum(result["success"] for result in results) >= 15
+    assert all(result["backend"] == "good" for result in results if result["success"])
@@ -0,0 +1,81 @@
+"""
+Limits and failure handling of the Python sandbox pool.
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.do_anything_mcp.commands.python_sandbox import MAX_RESPONSE_BYTES, SandboxPool
+
+
+def _run(tmp_path, *codes, **limits):
+    """Run code snippets one after another on a one-worker pool"""
+    pool = SandboxPool(size=1, work_dir=str(tmp_path), **{"timeout": 5, "cpu_seconds": 1, **limits})
+
+    async def run():
+        try:
+            return [await asyncio.wait_for(pool.execute(code), 30) for code in codes], pool.stats()
+        finally:
+            await pool.close()
+
+    return asyncio.run(run())
+
+
+def test_disabled_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("MCP_SANDBOX_WORKERS", raising=False)
+    result = asyncio.run(SandboxPool(work_dir=str(tmp_path)).execute("1 + 1"))
+    assert not result["success"]
+    assert "disabled" in result["message"]
+
+
+def test_runs_code_and_reports_trailing_expression(tmp_path):
+    (result,), _ = _run(tmp_path, "print('hi')\nmath.sqrt(16)")
+    assert result["success"]
+    assert result["stdout"] == "hi\n"
+    assert result["result"] == "4.0"
+
+
+def test_cpu_limit_stops_a_busy_loop(tmp_path):
+    (result, after), stats = _run(tmp_path, "while True: pass", "2 + 2")
+    assert result["limit"] == "cpu"
+    assert stats["limit_hits"]["cpu"] == 1
+    # The worker is replaced and the pool keeps serving
+    assert after["success"] and after["result"] == "4"
+
+
+def test_wall_time_limit_stops_a_sleeping_run(tmp_path):
+    (result,), stats = _run(tmp_path, "import time\ntime.sleep(60)", timeout=1)
+    assert result["limit"] == "wall"
+    assert stats["timeouts"] == 1
+
+
+def test_worker_crash_is_reported(tmp_path):
+    (result, after), stats = _run(tmp_path, "import os\nos._exit(3)", "'still here'")
+    assert result["error_type"] == "WorkerCrashed"
+    assert stats["crashes"] == 1
+    assert after["success"]
+
+
+def test_escaped_output_is_truncated_to_fit(tmp_path):
+    """Control characters escape to six bytes each in JSON"""
+    code = 'import sys\nprint("\\x01" * 70000)\nsys.stderr.write("\\x01" * 70000)\nraise Exception("\\x01" * 70000)'
+    start = time.monotonic()
+    (result,), _ = _run(tmp_path, code)
+    assert time.monotonic() - start < 10
+    assert result["error_type"] == "Exception"
+    assert result["stdout"].endswith("[output truncated]")
+
+
+def test_oversized_response_line_does_not_hang(tmp_path):
+    """A worker writing past the reader limit is killed instead of awaited"""
+    # fd 4 is the worker's private copy of stdout; writing to it bypasses the truncation
+    code = f"import os, time\nos.write(4, b'x' * {2 * MAX_RESPONSE_BYTES})\ntime.sleep(60)"
+    start = time.monotonic()
+    (result, after), _ = _run(tmp_path, code, "'recovered'", timeout=20)
+    assert time.monotonic() - start < 15
+    assert result["error_type"] == "WorkerCrashed"
+    assert after["success"]
@@ -0,0 +1,107 @@
+"""
+Priority and fair sharing in the upstream scheduler.
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.do_anything_mcp.commands.scheduler import (
+    PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, InferenceScheduler, SchedulerRejectedError
+)
+
+
+def _serve(calls, max_concurrency=1, max_queue=100):
+    """Queue calls of (name, session, priority, session_priority) behind a busy slot; return the serving order"""
+    scheduler = InferenceScheduler(max_concurrency=max_concurrency, max_queue=max_queue, max_wait=1000)
+    order = []
+
+    async def call(name, session, priority, session_priority):
+        async with scheduler.slot(session, priority, session_priority):
+            order.append(name)
+            await asyncio.sleep(0.001)
+
+    async def run():
+        blocker = asyncio.create_task(call("blocker", "blocker", PRIORITY_BATCH, 0))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(call(*c)) for c in calls]
+        await asyncio.gather(blocker, *tasks)
+
+    asyncio.run(run())
+    return order[1:], scheduler
+
+
+def test_sessions_take_turns_within_a_priority():
+    order, _ = _serve([("a1", "a", 0, 0), ("a2", "a", 0, 0), ("a3", "a", 0, 0), ("b1", "b", 0, 0), ("c1", "c", 0, 0)])
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_server_priority_goes_first():
+    order, _ = _serve([
+        ("job", "a", PRIORITY_BACKGROUND, 0),
+        ("batch", "b", PRIORITY_BATCH, 0),
+        ("interactive", "c", PRIORITY_INTERACTIVE, 0),
+    ])
+    assert order == ["interactive", "batch", "job"]
+
+
+def test_client_priority_only_orders_its_own_session():
+    order, _ = _serve([
+        ("greedy1", "greedy", 0, 1000),
+        ("greedy2", "greedy", 0, 1000),
+        ("low", "other", 0, -1),
+        ("high", "other", 0, 1),
+    ])
+    # Turns still alternate; within "other" the higher priority goes first
+    assert order == ["greedy1", "high", "greedy2", "low"]
+
+
+def test_full_queue_rejects():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=1, max_wait=1000)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold()), asyncio.create_task(hold())]
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerRejectedError):
+            async with scheduler.slot("b"):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert scheduler.rejected == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=10, max_wait=1000)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        await holder
+
+    asyncio.run(run())
+    stats = scheduler.stats()
+    assert stats["queued"] == 0 and stats["running"] == 0
+    assert scheduler.cancelled == 1
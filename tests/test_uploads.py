@@ -0,0 +1,103 @@
+"""
+Chunked uploads: chunk and offset validation, limits and deduplication.
+"""
+
+import os
+import sys
+import base64
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.do_anything_mcp.commands.uploads import UploadManager
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _upload(manager, data: bytes, session_id: str = "a", chunk_size: int = 4):
+    upload_id = manager.begin("notes.txt", len(data), session_id=session_id)["upload_id"]
+    for offset in range(0, len(data), chunk_size):
+        assert manager.chunk(upload_id, _b64(data[offset:offset + chunk_size]), offset)["success"]
+    return manager.finish(upload_id)
+
+
+def test_upload_is_stored_under_its_digest(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    data = b"hello chunked world"
+    result = _upload(manager, data)
+    assert result["success"] and not result["deduplicated"]
+    assert result["file_id"] == hashlib.sha256(data).hexdigest()
+    with open(result["path"], "rb") as f:
+        assert f.read() == data
+
+
+def test_resent_chunk_is_acknowledged_and_gaps_are_refused(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    upload_id = manager.begin("notes.txt")["upload_id"]
+    assert manager.chunk(upload_id, _b64(b"abcd"), 0)["received"] == 4
+    # A retry of the same chunk is not written twice
+    retry = manager.chunk(upload_id, _b64(b"abcd"), 0)
+    assert retry["success"] and retry["received"] == 4
+    gap = manager.chunk(upload_id, _b64(b"efgh"), 8)
+    assert not gap["success"] and gap["received"] == 4
+    assert manager.chunk(upload_id, _b64(b"efgh"), 4)["received"] == 8
+    assert manager.finish(upload_id)["size"] == 8
+
+
+def test_invalid_chunks_are_refused(tmp_path):
+    manager = UploadManager(str(tmp_path), max_chunk_bytes=4)
+    upload_id = manager.begin("notes.txt")["upload_id"]
+    assert not manager.chunk(upload_id, "not base64!", 0)["success"]
+    assert not manager.chunk(upload_id, _b64(b"too long"), 0)["success"]
+    assert not manager.chunk("unknown", _b64(b"abcd"), 0)["success"]
+
+
+def test_size_and_digest_mismatches_fail(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    upload_id = manager.begin("notes.txt", size=10)["upload_id"]
+    manager.chunk(upload_id, _b64(b"abcd"), 0)
+    assert not manager.finish(upload_id)["success"]
+
+    upload_id = manager.begin("notes.txt", sha256="0" * 64)["upload_id"]
+    manager.chunk(upload_id, _b64(b"abcd"), 0)
+    assert "does not match" in manager.finish(upload_id)["message"]
+
+
+def test_upload_over_the_limit_is_rejected(tmp_path):
+    manager = UploadManager(str(tmp_path), max_bytes=6)
+    assert not manager.begin("big.bin", size=7)["success"]
+    upload_id = manager.begin("big.bin")["upload_id"]
+    manager.chunk(upload_id, _b64(b"abcd"), 0)
+    assert not manager.chunk(upload_id, _b64(b"efgh"), 4)["success"]
+    # The upload is dropped with its temporary file
+    assert not manager.chunk(upload_id, _b64(b"ef"), 4)["success"]
+    assert manager.stats()["open"] == 0
+
+
+def test_abort_removes_the_upload(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    upload_id = manager.begin("notes.txt")["upload_id"]
+    manager.chunk(upload_id, _b64(b"abcd"), 0)
+    assert manager.abort(upload_id)["success"]
+    assert not manager.finish(upload_id)["success"]
+    assert not os.listdir(manager.storage.temp_dir)
+
+
+def test_begin_shortcut_is_scoped_to_the_uploading_session(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    data = b"shared content"
+    digest = hashlib.sha256(data).hexdigest()
+    stored = _upload(manager, data, session_id="a")
+
+    same = manager.begin("copy.txt", sha256=digest, session_id="a")
+    assert same["deduplicated"] and same["path"] == stored["path"]
+
+    # Another session must send the bytes before learning the content is stored
+    other = manager.begin("copy.txt", sha256=digest, session_id="b")
+    assert not other["deduplicated"] and "path" not in other
+    manager.chunk(other["upload_id"], _b64(data), 0)
+    finished = manager.finish(other["upload_id"])
+    assert finished["deduplicated"] and finished["path"] == stored["path"]
+    assert manager.begin("copy.txt", sha256=digest, session_id="b")["deduplicated"]